@@ -39,7 +39,32 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
-python manage.py rqworker default &
+# Mails, thumbnails and the lowest rendition never wait behind a full encode; the
+# encode pool helps out with quick jobs whenever it is idle. Each pool restarts
+# crashed workers, recycles them after RQ_POOL_MAX_JOBS jobs and grows with the
+# backlog. Set RQ_POOL_IN_WEB=0 to run the pools in a container of their own, e.g.
+# `python manage.py rqpool encode quick`, and scale it apart from the web tier.
+pids=""
+if [ "${RQ_POOL_IN_WEB:-1}" = "1" ]; then
+  python manage.py rqpool mail quick default --max-workers 2 &
+  pids="$pids $!"
+  python manage.py rqpool encode quick &
+  pids="$pids $!"
+fi
 
+gunicorn core.wsgi:application --bind 0.0.0.0:8080 &
+web=$!
+pids="$pids $web"
 
-exec gunicorn core.wsgi:application --bind 0.0.0.0:8080
+# This shell stays PID 1, so the SIGTERM of `docker stop` reaches gunicorn and the
+# pools, whose workers finish their current job before they exit. The container
+# also stops when gunicorn exits on its own.
+stopping=0
+trap 'stopping=1; kill -TERM $pids 2>/dev/null || true' TERM INT
+status=0
+wait "$web" || status=$?
+if [ "$stopping" = "0" ]; then
+  kill -TERM $pids 2>/dev/null || true
+fi
+wait || true
+exit "$status"
@@ -49,6 +49,8 @@ SECURE_REFERRER_POLICY = "same-origin"
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 X_FRAME_OPTIONS = 'DENY'
 
+DOMAIN = os.environ.get("DOMAIN", default="http://127.0.0.1:8000")
+
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", default="localhost").split(",")
 CSRF_TRUSTED_ORIGINS = os.environ.get("CSRF_TRUSTED_ORIGINS", default="http://localhost:5500").split(",")
 CORS_ALLOWED_ORIGINS = os.environ.get("CORS_ALLOWED_ORIGINS", default="http://localhost:5500").split(",")
@@ -137,19 +139,84 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient"
         },
         "KEY_PREFIX": "videoflix"
-    }
+    },
+    # Per-process cache for small, hot values that may be a few seconds stale.
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "videoflix-local",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
 }
 
+RQ_CONNECTION = {
+    'HOST': os.environ.get("REDIS_HOST", default="redis"),
+    'PORT': os.environ.get("REDIS_PORT", default=6379),
+    'DB': os.environ.get("REDIS_DB", default=0),
+    'REDIS_CLIENT_KWARGS': {},
+}
+
+# Jobs are split by how long they run, so cheap, user-visible work never waits behind
+# a full encode: 'mail' for account mails, 'quick' for thumbnails and the lowest
+# rendition, 'encode' for the higher renditions and trickplay sprites.
 RQ_QUEUES = {
-    'default': {
-        'HOST': os.environ.get("REDIS_HOST", default="redis"),
-        'PORT': os.environ.get("REDIS_PORT", default=6379),
-        'DB': os.environ.get("REDIS_DB", default=0),
-        'DEFAULT_TIMEOUT': 900,
-        'REDIS_CLIENT_KWARGS': {},
-    },
+    'default': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 900},
+    'mail': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 60},
+    'quick': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': 30 * 60},
+    'encode': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': int(os.environ.get("RQ_ENCODE_TIMEOUT", default=6 * 60 * 60))},
 }
 
+# Workers of a `manage.py rqpool` are replaced after this many jobs; extra workers started
+# for a backlog exit after RQ_POOL_IDLE_TIMEOUT seconds without a job.
+RQ_POOL_MAX_JOBS = int(os.environ.get("RQ_POOL_MAX_JOBS", default=100))
+RQ_POOL_IDLE_TIMEOUT = int(os.environ.get("RQ_POOL_IDLE_TIMEOUT", default=120))
+
+VIDEO_UPLOAD_MAX_SIZE = int(os.environ.get("VIDEO_UPLOAD_MAX_SIZE", default=20 * 1024 ** 3))
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("VIDEO_UPLOAD_MAX_CHUNK_SIZE", default=64 * 1024 ** 2))
+# Seconds a chunk may take to arrive before another request may resume the upload.
+VIDEO_UPLOAD_CLAIM_TIMEOUT = int(os.environ.get("VIDEO_UPLOAD_CLAIM_TIMEOUT", default=15 * 60))
+
+# Form uploads, like those of the admin, are content-hashed while they are received.
+FILE_UPLOAD_HANDLERS = [
+    'video_app.uploadhandlers.ContentHashMemoryFileUploadHandler',
+    'video_app.uploadhandlers.ContentHashTemporaryFileUploadHandler',
+]
+
+# How manifests and segments are delivered: 'django' streams them through the worker,
+# 'x-accel-redirect' (nginx) and 'x-sendfile' hand the transfer to the front proxy.
+VIDEO_DELIVERY_MODE = os.environ.get("VIDEO_DELIVERY_MODE", default="django")
+VIDEO_DELIVERY_INTERNAL_PREFIX = os.environ.get("VIDEO_DELIVERY_INTERNAL_PREFIX", default="/protected-media/")
+# Finished segments never change, playlists can still be rewritten by a running transcode.
+VIDEO_SEGMENT_CACHE_CONTROL = os.environ.get("VIDEO_SEGMENT_CACHE_CONTROL", default="private, max-age=31536000, immutable")
+VIDEO_PLAYLIST_CACHE_CONTROL = os.environ.get("VIDEO_PLAYLIST_CACHE_CONTROL", default="private, max-age=10")
+# Lifetime of the HMAC-signed segment URLs handed out in rendition playlists, in seconds.
+VIDEO_SIGNED_URL_TTL = int(os.environ.get("VIDEO_SIGNED_URL_TTL", default=4 * 60 * 60))
+VIDEO_SIGNED_URL_BUCKET = int(os.environ.get("VIDEO_SIGNED_URL_BUCKET", default=10 * 60))
+# Playlists are cached in Redis until a signal invalidates them, and for a few seconds per process.
+VIDEO_PLAYLIST_CACHE_TIMEOUT = int(os.environ.get("VIDEO_PLAYLIST_CACHE_TIMEOUT", default=24 * 60 * 60))
+VIDEO_PLAYLIST_LOCAL_CACHE_TTL = int(os.environ.get("VIDEO_PLAYLIST_LOCAL_CACHE_TTL", default=30))
+VIDEO_PLAYLIST_LOCAL_CACHE_SIZE = int(os.environ.get("VIDEO_PLAYLIST_LOCAL_CACHE_SIZE", default=256))
+VIDEO_LIST_PAGE_SIZE = int(os.environ.get("VIDEO_LIST_PAGE_SIZE", default=50))
+VIDEO_LIST_MAX_PAGE_SIZE = int(os.environ.get("VIDEO_LIST_MAX_PAGE_SIZE", default=100))
+VIDEO_CATALOGUE_CACHE_TIMEOUT = int(os.environ.get("VIDEO_CATALOGUE_CACHE_TIMEOUT", default=60 * 60))
+# Live transcode progress is written to the cache at most once per interval, in seconds.
+VIDEO_PROGRESS_INTERVAL = int(os.environ.get("VIDEO_PROGRESS_INTERVAL", default=2))
+VIDEO_PROGRESS_TIMEOUT = int(os.environ.get("VIDEO_PROGRESS_TIMEOUT", default=24 * 60 * 60))
+# Sources at least this long are cut into chunks of VIDEO_CHUNK_SECONDS that are encoded
+# by separate jobs; a chunk length of 0 disables chunked transcoding.
+VIDEO_CHUNK_SECONDS = int(os.environ.get("VIDEO_CHUNK_SECONDS", default=120))
+VIDEO_CHUNKED_MIN_DURATION = int(os.environ.get("VIDEO_CHUNKED_MIN_DURATION", default=10 * 60))
+# Encodes running at the same time per host, whatever the number of workers. 0 allows
+# one per VIDEO_ENCODE_CPUS_PER_SLOT usable CPUs; each encode gets an equal share of them.
+VIDEO_ENCODE_SLOTS = int(os.environ.get("VIDEO_ENCODE_SLOTS", default=0))
+VIDEO_ENCODE_CPUS_PER_SLOT = int(os.environ.get("VIDEO_ENCODE_CPUS_PER_SLOT", default=4))
+# Slots of those reserved for the quick renditions, so they never wait behind a long encode.
+# A host with a single slot keeps one for the other encodes as well; all share the CPUs.
+VIDEO_QUICK_ENCODE_SLOTS = int(os.environ.get("VIDEO_QUICK_ENCODE_SLOTS", default=1))
+VIDEO_ENCODE_SLOT_LEASE = int(os.environ.get("VIDEO_ENCODE_SLOT_LEASE", default=60))
+VIDEO_ENCODE_SLOT_POLL = int(os.environ.get("VIDEO_ENCODE_SLOT_POLL", default=5))
+# Seconds the removal of a deleted video's files waits for its stopped encodes to exit.
+VIDEO_DELETE_JOB_WAIT = int(os.environ.get("VIDEO_DELETE_JOB_WAIT", default=60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -220,8 +287,15 @@ REST_FRAMEWORK = {
     ]
 }
 
+AUTHENTICATION_BACKENDS = [
+    'user_auth_app.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'BLACKLIST_AFTER_ROTATION': True,
-}
\ No newline at end of file
+}
+# How long the user behind an access token is cached per process, in seconds.
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get("AUTH_USER_CACHE_TIMEOUT", default=30))
\ No newline at end of file
@@ -1,9 +1,27 @@
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+def user_cache_key(validated_token):
+    """
+    Builds the cache key of the user behind a validated access token.
+
+    Args:
+        validated_token (Token): The validated access token.
+
+    Returns:
+        str: The cache key, unique per user and token.
+    """
+    return f"auth:user:{validated_token.get(api_settings.USER_ID_CLAIM)}:{validated_token.get(api_settings.JTI_CLAIM)}"
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
         """
         Authenticates a user based on the 'access_token' cookie in the request.
+        The token is verified once here; permission classes reuse it through request.auth.
         
         Args:
             request (HttpRequest): The HTTP request object.
@@ -19,4 +37,23 @@ class CookieJWTAuthentication(JWTAuthentication):
             validated_token = self.get_validated_token(access_token)
             return self.get_user(validated_token), validated_token
         except Exception as e:
-            return None
\ No newline at end of file
+            return None
+
+    def get_user(self, validated_token):
+        """
+        Returns the user of a validated token, cached per process for AUTH_USER_CACHE_TIMEOUT
+        seconds so repeated requests with the same token skip the users table.
+
+        Args:
+            validated_token (Token): The validated access token.
+
+        Returns:
+            User: The active user the token was issued to.
+        """
+        user_cache = caches['local']
+        key = user_cache_key(validated_token)
+        user = user_cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.contrib.auth.models import User
+from rest_framework_simplejwt.settings import api_settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User, update_last_login
+from django.db import IntegrityError
 from django.utils.crypto import get_random_string
 
 
@@ -41,7 +44,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
         """
         if data['password'] != data['confirmed_password']:
             raise serializers.ValidationError({'error': 'passwords do not match'})
-        if User.objects.filter(email=data['email']).exists():
+        if User.objects.filter(email__iexact=data['email']).exists():
             raise serializers.ValidationError({'error': 'This email is already in use'})
         return data
     
@@ -62,12 +65,15 @@ class RegistrationSerializer(serializers.ModelSerializer):
                     - 'token': The activation token for the user.
         """
         validated_data.pop('confirmed_password')
-        user = User.objects.create_user(
-            username=validated_data['email'],
-            email=validated_data['email'],
-            password=validated_data['password'],
-            is_active=False
-        )
+        try:
+            user = User.objects.create_user(
+                username=validated_data['email'],
+                email=validated_data['email'],
+                password=validated_data['password'],
+                is_active=False
+            )
+        except IntegrityError:
+            raise serializers.ValidationError({'error': 'This email is already in use'})
         activation_token = get_random_string(148)
         user.activation_token = activation_token
         user.save()
@@ -105,33 +111,33 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         """
         Validates the given attributes.
 
-        This method validates the email and password provided in the attributes.
-        It checks if the user with the given email exists and if the user's account is active.
-        If the email or password is missing, it raises a serializers.ValidationError.
-        If the password is incorrect, it raises a serializers.ValidationError.
-        If all the checks pass, it returns the validated data.
+        This method authenticates the email and password provided in the attributes
+        through the email backend, which looks the user up by the case-insensitive
+        email index and hashes the password once. The tokens are then issued for that
+        user directly instead of authenticating a second time by username.
 
         Args:
             attrs (dict): A dictionary containing the email and password.
 
         Returns:
-            dict: The validated data.
+            dict: The validated data with the refresh and access tokens.
 
         Raises:
-            serializers.ValidationError: If the email or password is missing
-                                        or if the password is incorrect.
+            serializers.ValidationError: If the email or password is missing, if the
+                                        account is inactive or if the credentials are invalid.
         """
         email = attrs.get('email')
         password = attrs.get('password')
-        try:
-            user = User.objects.get(email=email)
-            if not user.is_active:
-                raise serializers.ValidationError('User account is inactive.')
-        except User.DoesNotExist:
-            raise serializers.ValidationError('Invalid email or password.')
         if not email or not password:
             raise serializers.ValidationError('Email and password are required.')
-        if not user.check_password(password):
+        user = authenticate(self.context.get('request'), email=email, password=password)
+        if user is None:
+            if User.objects.filter(email__iexact=email, is_active=False).exists():
+                raise serializers.ValidationError('User account is inactive.')
             raise serializers.ValidationError('Invalid email or password.')
-        data = super().validate({"username": user.username, "password": password})
-        return data
\ No newline at end of file
+        self.user = user
+        refresh = self.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return data
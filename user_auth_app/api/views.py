@@ -35,7 +35,7 @@ class RegistrationView(APIView):
             token = default_token_generator.make_token(user)
             uid = urlsafe_base64_encode(force_bytes(user.id))
             domain =  request.META.get('HTTP_ORIGIN') or request.META.get('HTTP_REFERER')
-            queue = django_rq.get_queue('default', autocommit=True)
+            queue = django_rq.get_queue('mail', autocommit=True)
             queue.enqueue(send_activation_email, domain, uid, token, user.email, user.username)
             data = {'user': {'email': user.email, 'id': user.id}, 'token': token}
             return Response(data, status=status.HTTP_201_CREATED)
@@ -177,12 +177,12 @@ class PasswordResetView(APIView):
         if not email:
             return Response({'detail': 'Email is required.'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.get(email__iexact=email)
             uid = urlsafe_base64_encode(force_bytes(user.id))
             token = default_token_generator.make_token(user)
             domain = request.META.get('HTTP_ORIGIN') or request.META.get('HTTP_REFERER')
-            queue = django_rq.get_queue('default', autocommit=True)
-            queue.enqueue(send_password_reset_email, domain, uid, token, email)
+            queue = django_rq.get_queue('mail', autocommit=True)
+            queue.enqueue(send_password_reset_email, domain, uid, token, user.email)
         except User.DoesNotExist:
             return Response({'detail': 'email does not exist.'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'An email has been sent to reset your password.'}, status=status.HTTP_200_OK)
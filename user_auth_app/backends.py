@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        """
+        Authenticates a user by email address and password.
+
+        The user is looked up through the case-insensitive email index and the password
+        is hashed exactly once. For an unknown email the password is hashed anyway, so
+        the response time does not reveal whether an account exists.
+
+        Args:
+            request (HttpRequest): The current request, or None.
+            email (str): The email address of the user.
+            password (str): The password of the user.
+            **kwargs: Other credentials, which are ignored.
+
+        Returns:
+            User: The authenticated user, or None if the credentials are invalid or the
+            account is inactive.
+        """
+        if not email or password is None:
+            return None
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.get(email__iexact=email)
+        except UserModel.DoesNotExist:
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,82 @@
+import time
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from user_auth_app.api.serializers import CustomTokenObtainPairSerializer
+
+BENCHMARK_EMAIL = 'login-benchmark@example.invalid'
+BENCHMARK_PASSWORD = 'login-benchmark-password'
+
+
+def time_per_call(func, iterations):
+    """
+    Run a function repeatedly and measure it.
+
+    Args:
+        func (callable): The function to run, without arguments.
+        iterations (int): How many times to run it.
+
+    Returns:
+        float: The mean seconds per call.
+    """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def measure_login(iterations):
+    """
+    Measure the cost of a login with the configured password hasher, next to a single
+    password check and the earlier login path that checked the password itself and
+    then authenticated again by username.
+
+    A throwaway user is created for the run and rolled back afterwards.
+
+    Args:
+        iterations (int): How many logins to time per path.
+
+    Returns:
+        dict: The mean seconds of a password check, a login and the earlier login path.
+    """
+    with transaction.atomic():
+        user = User.objects.create_user(
+            username=BENCHMARK_EMAIL, email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD, is_active=True,
+        )
+
+        def login():
+            serializer = CustomTokenObtainPairSerializer(
+                data={'email': BENCHMARK_EMAIL.upper(), 'password': BENCHMARK_PASSWORD}
+            )
+            serializer.is_valid(raise_exception=True)
+
+        def earlier_login():
+            found = User.objects.get(email=BENCHMARK_EMAIL)
+            found.check_password(BENCHMARK_PASSWORD)
+            authenticate(None, username=found.username, password=BENCHMARK_PASSWORD)
+
+        report = {
+            'check_password': time_per_call(lambda: user.check_password(BENCHMARK_PASSWORD), iterations),
+            'login': time_per_call(login, iterations),
+            'earlier_login': time_per_call(earlier_login, iterations),
+        }
+        transaction.set_rollback(True)
+    return report
+
+
+class Command(BaseCommand):
+    help = 'Compare the CPU cost of a login with the cost of hashing the password once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Number of logins to time per path.')
+
+    def handle(self, *args, **options):
+        """
+        Time the login paths and print them in milliseconds and in password checks.
+        """
+        report = measure_login(options['iterations'])
+        check = report['check_password']
+        self.stdout.write(f"password check: {check * 1000:.1f} ms")
+        for name, label in [('login', 'login'), ('earlier_login', 'check, then authenticate by username')]:
+            self.stdout.write(f"{label}: {report[name] * 1000:.1f} ms, {report[name] / check:.2f} password checks")
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_case_insensitive_duplicates(apps, schema_editor):
+    """
+    Stop with a readable report if existing accounts share an email address in
+    different case, since registration used to compare addresses case-sensitively.
+    The unique index cannot be built until they are merged or changed.
+    """
+    User = apps.get_model('auth', 'User')
+    duplicates = (
+        User.objects.exclude(email='').annotate(email_upper=Upper('email'))
+        .values('email_upper').annotate(accounts=Count('id')).filter(accounts__gt=1)
+        .values_list('email_upper', flat=True)
+    )
+    groups = []
+    for email_upper in duplicates:
+        accounts = User.objects.annotate(email_upper=Upper('email')).filter(email_upper=email_upper).order_by('pk')
+        groups.append(', '.join(f'#{user.pk} {user.username} <{user.email}>' for user in accounts))
+    if groups:
+        raise RuntimeError(
+            'Email addresses must be unique regardless of case, but these accounts share one:\n  '
+            + '\n  '.join(groups)
+            + '\nChange or merge these accounts, then run migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Email addresses are unique regardless of case. The lookup index uses UPPER(),
+    which is the expression Django's email__iexact lookups compile to, so login,
+    registration and password reset hit it directly. Uniqueness is enforced by a
+    separate partial index, as accounts created without an email share ''.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('user_auth_app', '0011_userprofile_activation_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_insensitive_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS auth_user_email_upper_idx ON auth_user (UPPER(email));",
+            reverse_sql="DROP INDEX IF EXISTS auth_user_email_upper_idx;",
+        ),
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX IF NOT EXISTS auth_user_email_upper_uniq ON auth_user (UPPER(email)) WHERE email <> '';",
+            reverse_sql="DROP INDEX IF EXISTS auth_user_email_upper_uniq;",
+        ),
+    ]
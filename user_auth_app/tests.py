@@ -1,10 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.apps import apps
+from django.db import connection
+from importlib import import_module
 from django.urls import reverse
 from rest_framework.test import APITestCase
+from django.contrib.auth import base_user
 from django.contrib.auth.models import User
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from unittest import mock
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.tokens import RefreshToken
+from .api.authentication import CookieJWTAuthentication
+from .api.permissions import HasValidCookieJWT
+from .management.commands.login_benchmark import BENCHMARK_EMAIL, measure_login
 
 class UserAuthTests(APITestCase):
     def setUp(self):
@@ -73,6 +87,68 @@ class UserAuthTests(APITestCase):
         self.assertIn('access_token', response.cookies)
         self.assertIn('refresh_token', response.cookies)
 
+    def test_login_hashes_password_once(self):
+        """
+        Benchmarks the hashing cost of a login: one password check per request, where
+        the lookup by email and the token issue used to run one each. The email is
+        matched regardless of case.
+        """
+        url = reverse('login')
+        self.user.is_active = True
+        self.user.save()
+        with mock.patch.object(base_user, 'check_password', wraps=base_user.check_password) as check_password:
+            response = self.client.post(url, {'email': 'TestUser@Example.com', 'password': 'testpassword'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.cookies)
+        self.assertEqual(check_password.call_count, 1)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+    def test_login_benchmark_costs_one_password_check(self):
+        """
+        Tests that the login benchmark leaves no user behind, and that with the real password
+        hasher a login costs well under the two hashes of the earlier login path.
+        """
+        report = measure_login(1)
+        self.assertFalse(User.objects.filter(email=BENCHMARK_EMAIL).exists())
+        self.assertLess(report['login'], 1.5 * report['check_password'])
+        self.assertGreater(report['earlier_login'], 1.5 * report['check_password'])
+
+    def test_login_rejects_wrong_password_and_inactive_user(self):
+        """
+        Tests that a wrong password and an inactive account are refused with their messages.
+        """
+        url = reverse('login')
+        response = self.client.post(url, {'email': self.user.email, 'password': 'testpassword'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('User account is inactive.', str(response.data))
+        self.user.is_active = True
+        self.user.save()
+        response = self.client.post(url, {'email': self.user.email, 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid email or password.', str(response.data))
+
+    def test_registration_rejects_email_in_other_case(self):
+        """
+        Tests that an email already registered in a different case cannot register again.
+        """
+        data = {'email': 'TESTUSER@example.com', 'password': 'pw123456', 'confirmed_password': 'pw123456'}
+        response = self.client.post(reverse('register'), data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(email__iexact='testuser@example.com').count(), 1)
+
+    def test_migration_reports_case_insensitive_duplicates(self):
+        """
+        Tests that the migration adding the case-insensitive unique index stops with a list of
+        the accounts that share an email address in different case, and passes without them.
+        """
+        migration = import_module('user_auth_app.migrations.0012_user_email_ci_unique')
+        migration.check_case_insensitive_duplicates(apps, None)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX auth_user_email_upper_uniq')
+        duplicate = User.objects.create_user(username='second', email='TestUser@example.com', password='pw')
+        with self.assertRaisesMessage(RuntimeError, f'#{duplicate.pk} second <TestUser@example.com>'):
+            migration.check_case_insensitive_duplicates(apps, None)
+
     def test_logout(self):
         """
         Tests the logout endpoint.
@@ -126,3 +202,50 @@ class UserAuthTests(APITestCase):
         self.assertEqual(response.data['detail'], 'Your Password has been successfully reset.')
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password('newsecurepassword'))
+
+
+class CookieProtectedView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT]
+
+    def get(self, request):
+        return Response({'id': request.user.id})
+
+
+class CookieJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        """
+        Creates an active user and an access token for it.
+        """
+        caches['local'].clear()
+        self.user = User.objects.create_user(username='viewer@example.com', email='viewer@example.com', password='pw')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.factory = APIRequestFactory()
+
+    def get(self, token):
+        request = self.factory.get('/')
+        if token:
+            request.COOKIES['access_token'] = token
+        return CookieProtectedView.as_view()(request)
+
+    def test_token_verified_once_and_user_cached(self):
+        """
+        Tests that the cookie token is decoded once per request, with the permission reusing
+        request.auth, and that a repeated request with the same token skips the users table.
+        """
+        with mock.patch.object(TokenBackend, 'decode', autospec=True, side_effect=TokenBackend.decode) as decode:
+            with self.assertNumQueries(1):
+                response = self.get(self.token)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, {'id': self.user.id})
+            self.assertEqual(decode.call_count, 1)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.get(self.token).status_code, 200)
+            self.assertEqual(decode.call_count, 2)
+
+    def test_missing_or_invalid_token_rejected(self):
+        """
+        Tests that requests without a cookie or with a tampered token are refused.
+        """
+        self.assertEqual(self.get(None).status_code, 401)
+        self.assertEqual(self.get(self.token[:-2] + 'xx').status_code, 401)
@@ -2,7 +2,12 @@ from django.contrib import admin
 from .models import Video
 
 class VideoAdmin(admin.ModelAdmin):
-    exclude = ['m3u8_480p', 'm3u8_720p', 'm3u8_1080p', 'thumbnail']
+    exclude = ['m3u8_480p', 'm3u8_720p', 'm3u8_1080p', 'm3u8_master', 'trickplay', 'thumbnail', 'thumbnail_widths']
+    readonly_fields = [
+        'upload_status', 'processing_status', 'rendition_status', 'processing_error',
+        'duration', 'width', 'height', 'frame_rate', 'video_codec', 'audio_codec', 'bitrate',
+        'content_hash', 'shared_outputs_id',
+    ]
     
 
 admin.site.register(Video, VideoAdmin)
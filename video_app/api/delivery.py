@@ -0,0 +1,234 @@
+import hashlib
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+GZIP_RE = re.compile(r'\bgzip\b')
+BROTLI_RE = re.compile(r'\bbr\b')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def media_path(*parts):
+    """
+    Join path parts below MEDIA_ROOT and make sure the result does not escape it.
+
+    Args:
+        *parts (str): The path components relative to MEDIA_ROOT.
+
+    Returns:
+        str: The absolute path of the media file.
+
+    Raises:
+        Http404: If the path points outside MEDIA_ROOT or the file does not exist.
+    """
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(media_root, *parts))
+    if os.path.commonpath([media_root, path]) != media_root or not os.path.isfile(path):
+        raise Http404("Video not found.")
+    return path
+
+
+def file_etag(stat):
+    """
+    Build a strong ETag from the size and modification time of a file.
+
+    Args:
+        stat (os.stat_result): The stat result of the file.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range 'Range' header.
+
+    Args:
+        header (str): The raw header value.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        tuple: The inclusive (start, end) byte positions, or None if the header is absent
+            or uses a form that is answered with the full file (multiple ranges, other units).
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError('Unsatisfiable range.')
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range.')
+    return start, end
+
+
+def iter_file_range(path, start, length):
+    """
+    Yield a byte range of a file in blocks.
+
+    Args:
+        path (str): The path of the file.
+        start (int): The first byte to send.
+        length (int): The number of bytes to send.
+
+    Yields:
+        bytes: The next block of the range.
+    """
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            block = source.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def serve_content(request, content, content_type, cache_control):
+    """
+    Build the response for a small in-memory payload such as a rewritten playlist.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        content (bytes): The response body.
+        content_type (str): The MIME type of the body.
+        cache_control (str): The Cache-Control header value.
+
+    Returns:
+        HttpResponse: A 200 response, or 304 if the client already has this content.
+    """
+    response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = f'"{hashlib.md5(content, usedforsecurity=False).hexdigest()}"'
+    response['Cache-Control'] = cache_control
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def serve_precompressed(request, entry, content_type, cache_control):
+    """
+    Answer a request from a precompressed cache entry.
+
+    The variant is picked from Accept-Encoding (brotli, then gzip, then identity),
+    and a matching If-None-Match is answered with 304 without sending a body.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        entry (dict): A cache entry with 'etag', 'identity', 'gzip' and 'br' bodies.
+        content_type (str): The MIME type of the body.
+        cache_control (str): The Cache-Control header value.
+
+    Returns:
+        HttpResponse: A 200 response with the best encoding, or 304.
+    """
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if entry.get('br') and BROTLI_RE.search(accept_encoding):
+        encoding = 'br'
+    elif GZIP_RE.search(accept_encoding):
+        encoding = 'gzip'
+    else:
+        encoding = 'identity'
+    response = HttpResponse(entry[encoding], content_type=content_type)
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['ETag'] = entry['etag']
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding, Cookie'
+    return get_conditional_response(request, etag=entry['etag'], response=response)
+
+
+def serve_media_file(request, path, content_type, cache_control):
+    """
+    Build the response for a media file according to VIDEO_DELIVERY_MODE.
+
+    In 'x-accel-redirect' mode (nginx) and 'x-sendfile' mode (Apache, lighttpd, Caddy)
+    the response only carries an internal-redirect header and the front proxy sends the
+    file itself, so no Python worker is held for the transfer. Any other mode falls back
+    to streaming the file through Django, which is meant for development.
+
+    Every mode answers If-None-Match / If-Modified-Since with 304 from a stat-based ETag
+    and sets the given Cache-Control. Range requests are answered with 206 when Django
+    streams the file; the proxies handle ranges themselves.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        path (str): The absolute path of the media file, as returned by media_path.
+        content_type (str): The MIME type of the file.
+        cache_control (str): The Cache-Control header value.
+
+    Returns:
+        HttpResponse: The response delivering the file.
+    """
+    stat = os.stat(path)
+    validators = HttpResponse()
+    validators['ETag'] = file_etag(stat)
+    validators['Last-Modified'] = http_date(stat.st_mtime)
+    validators['Cache-Control'] = cache_control
+    conditional = get_conditional_response(
+        request, etag=validators['ETag'], last_modified=int(stat.st_mtime), response=validators
+    )
+    if conditional is not validators:
+        return conditional
+
+    mode = settings.VIDEO_DELIVERY_MODE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, os.path.realpath(settings.MEDIA_ROOT))
+        response['X-Accel-Redirect'] = quote(settings.VIDEO_DELIVERY_INTERNAL_PREFIX + relative.replace(os.sep, '/'))
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = django_file_response(request, path, stat, content_type, validators['ETag'])
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        response[header] = validators[header]
+    return response
+
+
+def django_file_response(request, path, stat, content_type, etag):
+    """
+    Stream a file through Django, honouring a single-range 'Range' header.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        path (str): The absolute path of the media file.
+        stat (os.stat_result): The stat result of the file.
+        content_type (str): The MIME type of the file.
+        etag (str): The current ETag, checked against If-Range.
+
+    Returns:
+        HttpResponse: A 200, 206 or 416 response.
+    """
+    if_range = request.headers.get('If-Range')
+    range_header = request.headers.get('Range') if not if_range or if_range == etag else None
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(iter_file_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    return response
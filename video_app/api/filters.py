@@ -0,0 +1,8 @@
+import django_filters
+from ..models import Video
+
+
+class VideoFilter(django_filters.FilterSet):
+    class Meta:
+        model = Video
+        fields = ['category']
@@ -0,0 +1,91 @@
+import base64
+import binascii
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class VideoKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is a single indexed range scan that starts right after the last row of
+    the previous page, so its cost does not grow with the size of the catalogue.
+    The response body stays a plain list; the next page is announced in a
+    'Link: <...>; rel="next"' header.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+
+    def get_limit(self, request):
+        """
+        Return the page size requested through ?limit=, capped at VIDEO_LIST_MAX_PAGE_SIZE.
+        """
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return settings.VIDEO_LIST_PAGE_SIZE
+        return max(1, min(limit, settings.VIDEO_LIST_MAX_PAGE_SIZE))
+
+    def encode_cursor(self, video):
+        """
+        Encode the position after the given video.
+        """
+        position = f'{video.created_at.isoformat()}|{video.pk}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Decode a cursor into its (created_at, id) position.
+        Raises:
+            NotFound: If the cursor is malformed.
+        """
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the videos of the requested page.
+        Args:
+            queryset (QuerySet): The filtered videos.
+            request (Request): The request carrying ?cursor= and ?limit=.
+            view (APIView, optional): The calling view.
+        Returns:
+            list: The videos of the page.
+        """
+        self.request = request
+        limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        page = list(queryset[:limit + 1])
+        self.next_cursor = self.encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return page[:limit]
+
+    def get_next_link(self):
+        """
+        Return the absolute URL of the next page, or None on the last page.
+        """
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        """
+        Wrap a serialized page in a response with a Link header for the next page.
+        """
+        response = Response(data)
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
@@ -0,0 +1,16 @@
+from rest_framework.permissions import BasePermission
+from .signing import verify_segment_signature
+
+
+class HasValidSegmentSignature(BasePermission):
+    """
+    Allows access only if the request carries an unexpired segment signature for the
+    requested video and rendition. The check is pure HMAC and needs no database access.
+    """
+    def has_permission(self, request, view):
+        return verify_segment_signature(
+            view.kwargs.get('movie_id'),
+            view.kwargs.get('resolution'),
+            request.query_params.get('expires'),
+            request.query_params.get('signature'),
+        )
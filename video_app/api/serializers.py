@@ -1,13 +1,45 @@
 from rest_framework import serializers
-from ..models import Video
-import os
+from django.conf import settings
+from ..models import Video, VideoUpload
+from ..progress import get_progress
+from ..utils import thumbnail_upload_to, thumbnail_variant_name
 
 class VideoSerializer(serializers.ModelSerializer):
     thumbnail_url = serializers.SerializerMethodField()
-    
+    thumbnails = serializers.SerializerMethodField()
+    model_columns = {'thumbnail_url': 'thumbnail', 'thumbnails': 'thumbnail_widths'}
+
     class Meta:
         model = Video
-        fields = ['id', 'created_at', 'title', 'description', 'thumbnail_url', 'category']
+        fields = ['id', 'created_at', 'title', 'description', 'thumbnail_url', 'thumbnails', 'category']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        Initializes the VideoSerializer.
+        Args:
+            *args: Variable length argument list.
+            fields (list, optional): Restricts the output to these fields; unknown names are ignored.
+            **kwargs: Arbitrary keyword arguments.
+        """
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_fields_for(cls, fields):
+        """
+        Returns the model columns needed to serialize the given fields, for use with QuerySet.only().
+        Args:
+            fields (list): The requested serializer field names.
+        Returns:
+            list: The model field names, always including the pagination keys.
+        """
+        columns = {'id', 'created_at'}
+        for name in fields:
+            if name in cls.Meta.fields:
+                columns.add(cls.model_columns.get(name, name))
+        return sorted(columns)
 
     def get_thumbnail_url(self, obj):   
         """
@@ -17,7 +49,70 @@ class VideoSerializer(serializers.ModelSerializer):
         Returns:
             str: The URL of the thumbnail, or an empty string if the thumbnail is not set.
         """
-        domain = os.environ.get('DOMAIN', 'http://127.0.0.1:8000')
         if obj.thumbnail and hasattr(obj.thumbnail, 'url'):
-            return f'{domain}{obj.thumbnail.url}'
-        return ''
\ No newline at end of file
+            return f'{settings.DOMAIN}{obj.thumbnail.url}'
+        return ''
+
+    def get_thumbnails(self, obj):
+        """
+        Returns the responsive thumbnail set of the video object.
+        Args:
+            obj (Video): The video object.
+        Returns:
+            list: One entry per generated width with the URLs of its WebP and JPEG variant,
+                smallest first; empty for videos without generated thumbnails.
+        """
+        storage = Video._meta.get_field('thumbnail').storage
+        return [
+            {
+                'width': width,
+                'webp': f"{settings.DOMAIN}{storage.url(thumbnail_upload_to(obj, thumbnail_variant_name(width, 'webp')))}",
+                'jpeg': f"{settings.DOMAIN}{storage.url(thumbnail_upload_to(obj, thumbnail_variant_name(width, 'jpg')))}",
+            }
+            for width in obj.thumbnail_widths
+        ]
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'title', 'description', 'category', 'filename', 'length', 'offset']
+        read_only_fields = ['id', 'offset']
+
+    def validate_length(self, value):
+        """
+        Validates the announced total size of the upload.
+        Args:
+            value (int): The size of the video file in bytes.
+        Returns:
+            int: The validated size.
+        Raises:
+            serializers.ValidationError: If the size is not positive or exceeds VIDEO_UPLOAD_MAX_SIZE.
+        """
+        if value <= 0:
+            raise serializers.ValidationError('Upload length must be positive.')
+        if value > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError('Upload length exceeds the maximum size.')
+        return value
+
+
+class VideoStatusSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Video
+        fields = ['id', 'upload_status', 'processing_status', 'rendition_status', 'processing_error', 'progress']
+
+    def get_progress(self, obj):
+        """
+        Returns the live progress of each rendition as published by the workers.
+        Args:
+            obj (Video): The video instance.
+        Returns:
+            dict: The percent done, the encoding fps and the speed relative to real time, by rendition.
+        """
+        progress = get_progress(obj.id)
+        for resolution, state in obj.rendition_status.items():
+            if state == Video.PROCESSING_DONE:
+                progress[resolution] = {**progress.get(resolution, {'fps': None, 'speed': None}), 'percent': 100.0}
+        return progress
@@ -0,0 +1,86 @@
+import time
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SEGMENT_SIGNATURE_SALT = 'video_app.segment'
+
+
+def segment_signature(movie_id, resolution, expires):
+    """
+    Compute the HMAC that authorizes access to the segments of one rendition.
+
+    Args:
+        movie_id (int): The ID of the video.
+        resolution (str): The rendition name.
+        expires (int): The UNIX timestamp the signature stops being valid at.
+
+    Returns:
+        str: The hex encoded signature.
+    """
+    return salted_hmac(SEGMENT_SIGNATURE_SALT, f'{movie_id}:{resolution}:{expires}', algorithm='sha256').hexdigest()
+
+
+def segment_expiry(now=None):
+    """
+    Return the expiry for newly signed segment URLs.
+
+    The expiry is rounded up to VIDEO_SIGNED_URL_BUCKET so that every manifest rendered
+    within one bucket is byte-identical and can be cached.
+
+    Args:
+        now (float, optional): The current UNIX timestamp.
+
+    Returns:
+        int: The UNIX timestamp the signed URLs expire at.
+    """
+    now = time.time() if now is None else now
+    bucket = settings.VIDEO_SIGNED_URL_BUCKET
+    return int((now + settings.VIDEO_SIGNED_URL_TTL) // bucket + 1) * bucket
+
+
+def verify_segment_signature(movie_id, resolution, expires, signature, now=None):
+    """
+    Check a segment signature without touching the database.
+
+    Args:
+        movie_id (int): The ID of the video.
+        resolution (str): The rendition name.
+        expires (str): The expiry from the query string.
+        signature (str): The signature from the query string.
+        now (float, optional): The current UNIX timestamp.
+
+    Returns:
+        bool: True if the signature matches and has not expired.
+    """
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    if expires < now or not signature:
+        return False
+    return constant_time_compare(segment_signature(movie_id, resolution, expires), signature)
+
+
+def sign_playlist(content, movie_id, resolution, expires):
+    """
+    Rewrite the segment URIs of a rendition playlist into signed segment URLs.
+
+    Args:
+        content (str): The playlist as written by ffmpeg.
+        movie_id (int): The ID of the video.
+        resolution (str): The rendition name.
+        expires (int): The UNIX timestamp the URLs expire at.
+
+    Returns:
+        str: The playlist with every segment URI replaced by a signed absolute path.
+    """
+    query = f'?expires={expires}&signature={segment_signature(movie_id, resolution, expires)}'
+    lines = []
+    for line in content.splitlines():
+        segment = line.strip()
+        if segment and not segment.startswith('#'):
+            line = reverse('video-signed-segment', args=[movie_id, resolution, segment]) + query
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,19 @@
 from django.urls import path
-from .views import VideoListView, VideoManifestView, VideoSegmentView
+from .views import (
+    VideoListView, VideoManifestView, VideoMasterManifestView, VideoSegmentView, VideoSignedSegmentView,
+    VideoStatusView, VideoTrickplayView, VideoTrickplaySpriteView, VideoUploadCreateView, VideoUploadDetailView,
+)
 
 urlpatterns = [
     path('video/', VideoListView.as_view(), name='video-list'),
+    path('video/uploads/', VideoUploadCreateView.as_view(), name='video-upload'),
+    path('video/uploads/<uuid:upload_id>/', VideoUploadDetailView.as_view(), name='video-upload-detail'),
+    path('video/<int:movie_id>/status/', VideoStatusView.as_view(), name='video-status'),
+    path('video/<int:movie_id>/master.m3u8/', VideoMasterManifestView.as_view(), name='video-master-manifest'),
+    path('video/<int:movie_id>/trickplay/thumbnails.vtt/', VideoTrickplayView.as_view(), name='video-trickplay'),
+    path('video/<int:movie_id>/trickplay/<str:sprite>/', VideoTrickplaySpriteView.as_view(), name='video-trickplay-sprite'),
     path('video/<int:movie_id>/<str:resolution>/index.m3u8/', VideoManifestView.as_view(), name='video-manifest'),
+    path('video/<int:movie_id>/<str:resolution>/segments/<str:segment>/', VideoSignedSegmentView.as_view(), name='video-signed-segment'),
     path('video/<int:movie_id>/<str:resolution>/index.m3u8/<str:segment>/',  VideoSegmentView.as_view(), name='video-segment'),
     path('video/<int:movie_id>/<str:resolution>/<str:segment>/',  VideoSegmentView.as_view(), name='video-segment')
 ]
\ No newline at end of file
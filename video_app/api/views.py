@@ -1,37 +1,158 @@
 import os
-from django.http import FileResponse, Http404
+import base64
+import binascii
+import hashlib
+import uuid
+from django.http import Http404
 from django.conf import settings
-from rest_framework.views import APIView
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils.text import get_valid_filename
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from ..models import Video
-from .serializers import VideoSerializer
+from ..models import Video, VideoUpload
+from ..cache import get_catalogue_page, get_playlist
+from ..utils import ContentHasher, write_chunk
+from .serializers import VideoSerializer, VideoStatusSerializer, VideoUploadSerializer
+from .filters import VideoFilter
+from .pagination import VideoKeysetPagination
+from .delivery import media_path, serve_content, serve_media_file, serve_precompressed
+from .permissions import HasValidSegmentSignature
+from .signing import segment_expiry, sign_playlist
 from user_auth_app.api.authentication import CookieJWTAuthentication
 from user_auth_app.api.permissions import HasValidCookieJWT
 
+TUS_VERSION = '1.0.0'
+HTTP_460_CHECKSUM_MISMATCH = 460
+
+
+def parse_upload_checksum(header):
+    """
+    Parse a tus 'Upload-Checksum' header of the form '<algorithm> <base64 digest>'.
+    Args:
+        header (str): The raw header value, or None.
+    Returns:
+        tuple: (algorithm, digest bytes), or None if the header is absent.
+    Raises:
+        ValueError: If the header is malformed or the algorithm is unsupported.
+    """
+    if not header:
+        return None
+    algorithm, _, encoded = header.partition(' ')
+    algorithm = algorithm.lower()
+    if algorithm not in ('sha1', 'sha256', 'md5'):
+        raise ValueError('Unsupported checksum algorithm.')
+    try:
+        return algorithm, base64.b64decode(encoded, validate=True)
+    except binascii.Error:
+        raise ValueError('Malformed checksum.')
+
+
+def tus_response(upload, status_code):
+    """
+    Build an empty tus response that reports the current upload offset.
+    Args:
+        upload (VideoUpload): The upload session.
+        status_code (int): The HTTP status code.
+    Returns:
+        Response: The response carrying the tus headers.
+    """
+    response = Response(status=status_code)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Upload-Offset'] = str(upload.offset)
+    response['Upload-Length'] = str(upload.length)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def upload_claim_key(upload_id):
+    """
+    Build the cache key that marks a chunk of an upload as being received.
+    Args:
+        upload_id (UUID): The ID of the upload session.
+    Returns:
+        str: The cache key.
+    """
+    return f'video:upload:{upload_id}:claim'
+
 
 class VideoListView(APIView):
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [HasValidCookieJWT]
 
-    def get(self, request):  
+    def get(self, request):
         """
-        Get a list of all videos.
+        Get a page of the video catalogue, newest first.
+        Only videos with at least one finished rendition are listed.
+        Supports ?category= filtering, ?fields=id,title,... projection, and keyset pagination
+        through ?limit= and ?cursor=; the next page is linked in the 'Link' header.
+        Rendered pages are cached with gzip/brotli variants and a content-hash ETag until
+        a video is saved or deleted, so repeat requests skip the database and serializer.
         Args:
-            request (HttpRequest): The HTTP request object. 
+            request (HttpRequest): The HTTP request object.
         Returns:
-            Response: A response containing a list of all videos serialized as JSON.
+            Response: A response containing the videos of the page serialized as JSON.
         """
-        try:
-            videos = Video.objects.all()
-        except Video.DoesNotExist:
-            raise Http404("Videos not found.")
-        serializer = VideoSerializer(videos, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = VideoKeysetPagination()
+        entry = get_catalogue_page(request.query_params, lambda: self.render_page(request, paginator))
+        paginator.request = request
+        paginator.next_cursor = entry['next_cursor']
+        response = serve_precompressed(request, entry, 'application/json', 'private, no-cache')
+        next_link = paginator.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
+
+    def render_page(self, request, paginator):
+        """
+        Query and serialize one catalogue page.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            paginator (VideoKeysetPagination): The paginator for the request.
+        Returns:
+            tuple: The JSON body as bytes and the cursor of the next page, or None.
+        """
+        fields = [name for name in request.query_params.get('fields', '').split(',') if name]
+        playable = Video.objects.filter(processing_status=Video.PROCESSING_DONE)
+        videos = VideoFilter(request.query_params, queryset=playable).qs
+        if fields:
+            videos = videos.only(*VideoSerializer.model_fields_for(fields))
+        page = paginator.paginate_queryset(videos, request, view=self)
+        serializer = VideoSerializer(page, many=True, fields=fields)
+        return JSONRenderer().render(serializer.data), paginator.next_cursor
     
     
+class VideoStatusView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT, IsAdminUser]
+
+    def get(self, request, movie_id):
+        """
+        Get the processing state of a video: the overall and per-rendition status,
+        the error of a failed transcode, and the live progress of a running one.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            movie_id (int): The ID of the video.
+        Returns:
+            Response: The processing state serialized as JSON.
+        Raises:
+            Http404: If the video does not exist.
+        """
+        try:
+            video = Video.objects.only(
+                'upload_status', 'processing_status', 'rendition_status', 'processing_error'
+            ).get(pk=movie_id)
+        except Video.DoesNotExist:
+            raise Http404("Video not found.")
+        response = Response(VideoStatusSerializer(video).data)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
 class VideoManifestView(APIView):
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [HasValidCookieJWT]
@@ -39,27 +160,46 @@ class VideoManifestView(APIView):
     def get(self, request, movie_id, resolution):
         """
         Get the manifest file for a video.
+        The playlist comes from the playlist cache, and its segment URIs are rewritten
+        into short-lived signed URLs, so fetching the segments needs neither the JWT
+        cookie nor a database lookup.
         Args:
             request (HttpRequest): The HTTP request object.
             movie_id (int): The ID of the video.
             resolution (str): The resolution of the video.   
         Returns:
-            FileResponse: The manifest file for the video.
+            HttpResponse: The manifest file for the video.
         Raises:
             Http404: If the manifest file is not found.
         """
-        try:
-            video = Video.objects.get(pk=movie_id)
-        except Video.DoesNotExist:
+        content = get_playlist(movie_id, resolution)
+        if content is None:
             raise Http404("Video not found.")
-        manifest_path = os.path.join(
-            settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', resolution, str(movie_id), 'index.m3u8'
-        )
-        if not os.path.exists(manifest_path):
-            raise Http404("Video not found.")
-        return FileResponse(open(manifest_path, 'rb'), content_type='application/vnd.apple.mpegurl')
+        content = sign_playlist(content, movie_id, resolution, segment_expiry())
+        return serve_content(request, content.encode(), 'application/vnd.apple.mpegurl', settings.VIDEO_PLAYLIST_CACHE_CONTROL)
     
     
+class VideoMasterManifestView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT]
+
+    def get(self, request, movie_id):
+        """
+        Get the adaptive-bitrate master playlist for a video from the playlist cache.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            movie_id (int): The ID of the video.
+        Returns:
+            HttpResponse: The master playlist listing every finished rendition.
+        Raises:
+            Http404: If the video or the master playlist is not found.
+        """
+        content = get_playlist(movie_id, 'master')
+        if content is None:
+            raise Http404("Video not found.")
+        return serve_content(request, content.encode(), 'application/vnd.apple.mpegurl', settings.VIDEO_PLAYLIST_CACHE_CONTROL)
+
+
 class VideoSegmentView(APIView):
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [HasValidCookieJWT]
@@ -73,7 +213,7 @@ class VideoSegmentView(APIView):
             resolution (str): The resolution of the video.
             segment (str): The name of the segment file.  
         Returns:
-            FileResponse: The video segment file. 
+            HttpResponse: The video segment file.
         Raises:
             Http404: If the video or segment file is not found.
         """
@@ -81,9 +221,222 @@ class VideoSegmentView(APIView):
             video = Video.objects.get(pk=movie_id)
         except Video.DoesNotExist:
             raise Http404("Video not found.")
-        segment_path = os.path.join(
-            settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', resolution, str(movie_id), segment
-        )
-        if not os.path.exists(segment_path):
-            raise Http404("Video not found.")
-        return FileResponse(open(segment_path, 'rb'), content_type='video/MP2T')
\ No newline at end of file
+        segment_path = media_path('uploads', 'videos', 'hls', resolution, str(movie_id), segment)
+        return serve_media_file(request, segment_path, 'video/MP2T', settings.VIDEO_SEGMENT_CACHE_CONTROL)
+
+
+
+class VideoSignedSegmentView(APIView):
+    authentication_classes = []
+    permission_classes = [HasValidSegmentSignature]
+
+    def get(self, request, movie_id, resolution, segment):
+        """
+        Get a video segment through a signed URL from the rendition playlist.
+        The signature covers the video, the rendition and the expiry, so the request is
+        authorized in memory without a JWT decode or a database query.
+        Args:
+            request (HttpRequest): The HTTP request object with 'expires' and 'signature' query parameters.
+            movie_id (int): The ID of the video.
+            resolution (str): The resolution of the video.
+            segment (str): The name of the segment file.
+        Returns:
+            HttpResponse: The video segment file.
+        Raises:
+            Http404: If the segment file is not found.
+        """
+        segment_path = media_path('uploads', 'videos', 'hls', resolution, str(movie_id), segment)
+        return serve_media_file(request, segment_path, 'video/MP2T', settings.VIDEO_SEGMENT_CACHE_CONTROL)
+
+
+class VideoTrickplayView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT]
+
+    def get(self, request, movie_id):
+        """
+        Get the WebVTT index that maps time ranges of a video to tiles of its sprite sheets.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            movie_id (int): The ID of the video.
+        Returns:
+            HttpResponse: The WebVTT file.
+        Raises:
+            Http404: If the WebVTT file is not found.
+        """
+        vtt_path = media_path('uploads', 'videos', 'trickplay', str(movie_id), 'thumbnails.vtt')
+        return serve_media_file(request, vtt_path, 'text/vtt', settings.VIDEO_PLAYLIST_CACHE_CONTROL)
+
+
+class VideoTrickplaySpriteView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT]
+
+    def get(self, request, movie_id, sprite):
+        """
+        Get one trickplay sprite sheet of a video.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            movie_id (int): The ID of the video.
+            sprite (str): The name of the sprite sheet.
+        Returns:
+            HttpResponse: The JPEG sprite sheet.
+        Raises:
+            Http404: If the sprite sheet is not found.
+        """
+        sprite_path = media_path('uploads', 'videos', 'trickplay', str(movie_id), sprite)
+        return serve_media_file(request, sprite_path, 'image/jpeg', settings.VIDEO_SEGMENT_CACHE_CONTROL)
+
+class VideoUploadCreateView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT, IsAdminUser]
+
+    def post(self, request):
+        """
+        Start a resumable upload.
+        Creates an empty file at its final location under MEDIA_ROOT and an upload session
+        the chunks are appended to.
+        Args:
+            request (HttpRequest): The HTTP request object with title, description, category,
+                filename and the total length in bytes.
+        Returns:
+            Response: The upload session with a Location header pointing at its chunk endpoint.
+        """
+        serializer = VideoUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        upload_id = uuid.uuid4()
+        file_name = f"uploads/videos/original/{upload_id}_{get_valid_filename(serializer.validated_data['filename'])}"
+        path = os.path.join(settings.MEDIA_ROOT, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        upload = serializer.save(id=upload_id, file_name=file_name)
+        response = Response(VideoUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+        response['Location'] = reverse('video-upload-detail', args=[upload.id])
+        response['Tus-Resumable'] = TUS_VERSION
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+
+class VideoUploadDetailView(APIView):
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [HasValidCookieJWT, IsAdminUser]
+
+    def head(self, request, upload_id):
+        """
+        Report how many bytes of an upload have been received so a client can resume.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            upload_id (UUID): The ID of the upload session.
+        Returns:
+            Response: An empty response with Upload-Offset and Upload-Length headers.
+        Raises:
+            Http404: If the upload session is not found.
+        """
+        try:
+            upload = VideoUpload.objects.get(pk=upload_id)
+        except VideoUpload.DoesNotExist:
+            raise Http404("Upload not found.")
+        return tus_response(upload, status.HTTP_200_OK)
+
+    def patch(self, request, upload_id):
+        """
+        Append a chunk to an upload.
+        The request body is streamed straight into the final file at Upload-Offset. An optional
+        Upload-Checksum header is verified against the bytes written; on mismatch the chunk is
+        discarded. The content hash of the upload is fed the bytes as they are written, after the
+        partial block an earlier chunk left over is read back, so it is ready without another
+        pass over the file when the last chunk lands. The Video is then created, which enqueues
+        transcoding unless a video with the same content is done.
+        No database lock is held while the chunk streams in: the offset is claimed with a short
+        cache entry, so a concurrent request for the same upload gets 409 at once, and the new
+        offset is stored in a short transaction only if it is still the one the chunk started at.
+        Args:
+            request (HttpRequest): The HTTP request object with the chunk as its body.
+            upload_id (UUID): The ID of the upload session.
+        Returns:
+            Response: An empty 204 response with the new Upload-Offset.
+            - 400 if Upload-Offset or Upload-Checksum is missing or malformed.
+            - 409 if Upload-Offset does not match the bytes received so far, or another chunk
+              of the upload is being received.
+            - 413 if the chunk is larger than allowed or runs past the announced length.
+            - 460 if the chunk does not match its checksum.
+        Raises:
+            Http404: If the upload session is not found.
+        """
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            checksum = parse_upload_checksum(request.headers.get('Upload-Checksum'))
+        except (KeyError, ValueError):
+            return Response({'detail': 'Invalid Upload-Offset or Upload-Checksum header.'}, status=status.HTTP_400_BAD_REQUEST)
+        length = int(request.headers.get('Content-Length') or 0)
+        try:
+            upload = VideoUpload.objects.get(pk=upload_id)
+        except VideoUpload.DoesNotExist:
+            raise Http404("Upload not found.")
+        if upload.offset == upload.length:
+            return tus_response(upload, status.HTTP_204_NO_CONTENT)
+        if offset != upload.offset:
+            return tus_response(upload, status.HTTP_409_CONFLICT)
+        if length > settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE or length > upload.length - upload.offset:
+            return tus_response(upload, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        claim = upload_claim_key(upload.pk)
+        if not cache.add(claim, offset, timeout=settings.VIDEO_UPLOAD_CLAIM_TIMEOUT):
+            return tus_response(upload, status.HTTP_409_CONFLICT)
+        try:
+            upload.refresh_from_db()
+            if offset != upload.offset:
+                return tus_response(upload, status.HTTP_409_CONFLICT)
+            path = os.path.join(settings.MEDIA_ROOT, upload.file_name)
+            hasher = hashlib.new(checksum[0]) if checksum else None
+            content_hasher = ContentHasher(upload.hash_state, upload.hashed_length)
+            content_hasher.resume(path, offset)
+            hashers = [content_hasher, hasher] if hasher else [content_hasher]
+            written = write_chunk(path, offset, request.stream, length, hashers) if length else 0
+            if checksum and (written != length or hasher.digest() != checksum[1]):
+                os.truncate(path, offset)
+                return tus_response(upload, HTTP_460_CHECKSUM_MISMATCH)
+            with transaction.atomic():
+                stored = VideoUpload.objects.filter(pk=upload.pk, offset=offset).update(
+                    offset=offset + written,
+                    hash_state=content_hasher.state,
+                    hashed_length=content_hasher.hashed_length,
+                )
+                if not stored:
+                    upload.refresh_from_db()
+                    return tus_response(upload, status.HTTP_409_CONFLICT)
+                upload.offset += written
+                upload.hash_state, upload.hashed_length = content_hasher.state, content_hasher.hashed_length
+                if upload.offset == upload.length:
+                    upload.video = Video.objects.create(
+                        title=upload.title,
+                        description=upload.description,
+                        category=upload.category,
+                        file=upload.file_name,
+                        content_hash=content_hasher.hexdigest(),
+                    )
+                    upload.save(update_fields=['video'])
+        finally:
+            cache.delete(claim)
+        return tus_response(upload, status.HTTP_204_NO_CONTENT)
+
+    def delete(self, request, upload_id):
+        """
+        Abort an upload and remove the partial file.
+        Args:
+            request (HttpRequest): The HTTP request object.
+            upload_id (UUID): The ID of the upload session.
+        Returns:
+            Response: An empty 204 response.
+        Raises:
+            Http404: If the upload session is not found.
+        """
+        try:
+            upload = VideoUpload.objects.get(pk=upload_id)
+        except VideoUpload.DoesNotExist:
+            raise Http404("Upload not found.")
+        path = os.path.join(settings.MEDIA_ROOT, upload.file_name)
+        if upload.video_id is None and os.path.isfile(path):
+            os.remove(path)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
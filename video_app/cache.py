@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from .models import Video
+from .utils import RENDITIONS, hls_master_dir, hls_target_dir
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MISSING = '__missing__'
+CATALOGUE_VERSION_KEY = 'video:catalogue:version'
+CATALOGUE_QUERY_PARAMS = ('category', 'fields', 'limit', 'cursor')
+
+
+class LocalLRUCache:
+    """
+    A small, thread-safe, per-process LRU cache with a time-to-live.
+
+    Entries are not invalidated across processes, so the TTL bounds how long a
+    worker can serve a value that was invalidated elsewhere.
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a cached value, or None if it is missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value and evict the least recently used entries beyond maxsize.
+        """
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove a value if it is cached.
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every cached value.
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+local_playlists = LocalLRUCache(settings.VIDEO_PLAYLIST_LOCAL_CACHE_SIZE, settings.VIDEO_PLAYLIST_LOCAL_CACHE_TTL)
+
+
+def playlist_cache_key(video_id, name):
+    """
+    Return the cache key of a playlist.
+
+    Args:
+        video_id (int): The ID of the video.
+        name (str): A rendition name, or 'master' for the master playlist.
+
+    Returns:
+        str: The cache key.
+    """
+    return f'video:{video_id}:playlist:{name}'
+
+
+def playlist_path(video_id, name):
+    """
+    Return the path of a playlist on disk.
+
+    Args:
+        video_id (int): The ID of the video.
+        name (str): A rendition name, or 'master' for the master playlist.
+
+    Returns:
+        str: The absolute path of the playlist.
+    """
+    if name == 'master':
+        return os.path.join(hls_master_dir(video_id), 'master.m3u8')
+    return os.path.join(hls_target_dir(name, video_id), 'index.m3u8')
+
+
+def load_playlist(video_id, name):
+    """
+    Read a playlist from disk after checking that the video exists.
+
+    Args:
+        video_id (int): The ID of the video.
+        name (str): A rendition name, or 'master' for the master playlist.
+
+    Returns:
+        str: The playlist content, or MISSING if the video or the playlist does not exist.
+    """
+    if name != 'master' and name not in RENDITIONS:
+        return MISSING
+    if not Video.objects.filter(pk=video_id).exists():
+        return MISSING
+    try:
+        with open(playlist_path(video_id, name), 'r') as playlist:
+            return playlist.read()
+    except FileNotFoundError:
+        return MISSING
+
+
+def get_playlist(video_id, name):
+    """
+    Return a playlist through the per-process LRU and the shared cache.
+
+    Hits never touch the database or the disk. Misses, including videos or playlists
+    that do not exist, are loaded once and cached until invalidate_playlists runs.
+
+    Args:
+        video_id (int): The ID of the video.
+        name (str): A rendition name, or 'master' for the master playlist.
+
+    Returns:
+        str: The playlist content, or None if the video or the playlist does not exist.
+    """
+    key = playlist_cache_key(video_id, name)
+    content = local_playlists.get(key)
+    if content is None:
+        content = cache.get(key)
+        if content is None:
+            content = load_playlist(video_id, name)
+            cache.set(key, content, settings.VIDEO_PLAYLIST_CACHE_TIMEOUT)
+        local_playlists.set(key, content)
+    return None if content == MISSING else content
+
+
+def invalidate_playlists(video_id):
+    """
+    Drop every cached playlist of a video.
+
+    Args:
+        video_id (int): The ID of the video.
+    """
+    keys = [playlist_cache_key(video_id, name) for name in [*RENDITIONS, 'master']]
+    cache.delete_many(keys)
+    for key in keys:
+        local_playlists.delete(key)
+
+
+def catalogue_version():
+    """
+    Return the current catalogue version.
+
+    The version is seeded from the clock, so if Redis evicts the key the new
+    version is still newer than every version entries were cached under.
+
+    Returns:
+        int: The catalogue version.
+    """
+    return cache.get_or_set(CATALOGUE_VERSION_KEY, lambda: int(time.time() * 1000), None)
+
+
+def bump_catalogue_version():
+    """
+    Invalidate every cached catalogue page by moving to a new version.
+    """
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def catalogue_cache_key(query_params):
+    """
+    Return the cache key of a catalogue page for the current version.
+
+    Args:
+        query_params (QueryDict): The request query parameters.
+
+    Returns:
+        str: The cache key; only the parameters that change the page are part of it.
+    """
+    relevant = sorted((name, query_params[name]) for name in CATALOGUE_QUERY_PARAMS if name in query_params)
+    digest = hashlib.sha1(urlencode(relevant).encode()).hexdigest()
+    return f'video:catalogue:{catalogue_version()}:{digest}'
+
+
+def build_catalogue_entry(body, next_cursor):
+    """
+    Precompute everything needed to answer a catalogue request from the cache.
+
+    Args:
+        body (bytes): The rendered JSON page.
+        next_cursor (str): The cursor of the next page, or None.
+
+    Returns:
+        dict: The identity body with its gzip and, if available, brotli variants,
+            the content-hash ETag and the next cursor.
+    """
+    return {
+        'etag': f'"{hashlib.sha1(body).hexdigest()}"',
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        'br': brotli.compress(body, quality=11) if brotli else None,
+        'next_cursor': next_cursor,
+    }
+
+
+def get_catalogue_page(query_params, render):
+    """
+    Return a cached catalogue page, rendering and caching it on a miss.
+
+    Args:
+        query_params (QueryDict): The request query parameters.
+        render (callable): Returns (body bytes, next cursor) for the page.
+
+    Returns:
+        dict: The entry built by build_catalogue_entry.
+    """
+    key = catalogue_cache_key(query_params)
+    entry = cache.get(key)
+    if entry is None:
+        entry = build_catalogue_entry(*render())
+        cache.set(key, entry, settings.VIDEO_CATALOGUE_CACHE_TIMEOUT)
+    return entry
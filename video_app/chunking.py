@@ -0,0 +1,239 @@
+import csv
+import math
+import os
+import shutil
+from .utils import AUDIO_BITRATE, HLS_SEGMENT_SECONDS
+
+
+def build_split_command(source, split_dir, chunk_seconds):
+    """
+    Build an ffmpeg command that cuts the source into chunks without re-encoding.
+
+    The video is copied, so every chunk starts on a keyframe of the source and can
+    be decoded on its own. Each chunk restarts at timestamp zero; its start
+    position in the source is written to a CSV segment list next to the chunks.
+    The audio is left out: encoding it per chunk would leave a gap or a click at
+    every boundary, so it is encoded once over the whole source, see
+    build_audio_command.
+
+    Args:
+        source (str): The path to the video file.
+        split_dir (str): The directory the chunks and the segment list are written to.
+        chunk_seconds (int): The target length of a chunk in seconds.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    return [
+        'ffmpeg', '-y', '-i', source, '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_time', str(chunk_seconds), '-reset_timestamps', '1',
+        '-segment_list', os.path.join(split_dir, 'chunks.csv'), '-segment_list_type', 'csv',
+        os.path.join(split_dir, 'chunk_%04d.mkv'),
+    ]
+
+
+def build_audio_command(source, audio_file):
+    """
+    Build an ffmpeg command that encodes the audio of the whole source in one pass,
+    for a chunked transcode whose chunks carry only video.
+
+    Args:
+        source (str): The path to the video file.
+        audio_file (str): The path of the encoded audio.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    return [
+        'ffmpeg', '-y', '-i', source, '-map', '0:a:0', '-vn',
+        '-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE}k', '-ac', '2', '-f', 'mp4', audio_file,
+    ]
+
+
+def write_concat_list(list_file, files):
+    """
+    Write a list of files for ffmpeg's concat demuxer.
+
+    Args:
+        list_file (str): The path of the list.
+        files (list): The absolute paths of the files, in playback order.
+    """
+    with open(list_file, 'w') as concat_list:
+        concat_list.write('ffconcat version 1.0\n')
+        for path in files:
+            escaped = path.replace("'", "'\\''")
+            concat_list.write(f"file '{escaped}'\n")
+
+
+def build_join_command(concat_list, audio_file, m3u8_file):
+    """
+    Build an ffmpeg command that joins the encoded chunks of a rendition, together
+    with the audio encoded once for the whole source, into the final HLS rendition.
+
+    Every stream is copied. The chunks are read back to back, so the segmenter sees
+    one continuous stream and cuts its segments on the shared keyframes.
+
+    Args:
+        concat_list (str): The concat list of the chunk files, see write_concat_list.
+        audio_file (str): The path of the encoded audio, or None if the source has none.
+        m3u8_file (str): The playlist of the rendition to write.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list]
+    if audio_file:
+        cmd += ['-i', audio_file]
+    cmd += ['-map', '0:v:0']
+    if audio_file:
+        cmd += ['-map', '1:a:0']
+    return cmd + [
+        '-c', 'copy', '-start_number', '0', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_list_size', '0',
+        '-hls_flags', 'independent_segments', '-f', 'hls', m3u8_file,
+    ]
+
+
+def read_chunk_list(split_dir):
+    """
+    Read the segment list written by the split command.
+
+    Args:
+        split_dir (str): The directory holding the chunks.
+
+    Returns:
+        list: Tuples of (chunk_file, start in seconds), in playback order.
+    """
+    list_file = os.path.join(split_dir, 'chunks.csv')
+    if not os.path.isfile(list_file):
+        return []
+    with open(list_file, newline='') as chunk_list:
+        return [(os.path.join(split_dir, row[0]), float(row[1])) for row in csv.reader(chunk_list) if row]
+
+
+def read_media_playlist(m3u8_file, finished=True):
+    """
+    Read the segments of an HLS media playlist.
+
+    ffmpeg lists a segment only once it is completely written, so the segments of a
+    playlist that was cut short are all playable.
+
+    Args:
+        m3u8_file (str): The path to the playlist.
+        finished (bool, optional): Whether to require the end-of-list tag.
+
+    Returns:
+        list: Tuples of (duration, segment_file), or None if the playlist is missing
+        or, when finished is set, was not completed.
+    """
+    if not os.path.isfile(m3u8_file):
+        return None
+    segments = []
+    duration = None
+    complete = False
+    with open(m3u8_file, 'r') as playlist:
+        for line in playlist:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line == '#EXT-X-ENDLIST':
+                complete = True
+            elif line and not line.startswith('#') and duration is not None:
+                segments.append((duration, os.path.join(os.path.dirname(m3u8_file), line)))
+                duration = None
+    return segments if complete or not finished else None
+
+
+def resume_point(m3u8_files):
+    """
+    Find where an interrupted encode of several renditions can continue. All
+    renditions cut their segments on the same keyframes, so the segments every
+    playlist already lists cover the same span of the source.
+
+    Args:
+        m3u8_files (list): The playlists of the renditions being encoded.
+
+    Returns:
+        tuple: The durations of the segments to keep and the position in seconds to
+        continue from, or None if some rendition has no complete segment.
+    """
+    playlists = [read_media_playlist(m3u8_file, finished=False) for m3u8_file in m3u8_files]
+    if not playlists or not all(playlists):
+        return None
+    count = min(len(segments) for segments in playlists)
+    durations = [duration for duration, _ in playlists[0][:count]]
+    return durations, sum(durations)
+
+
+def build_media_playlist(durations):
+    """
+    Build a complete HLS media playlist whose segments are numbered from zero, in
+    the same shape as the playlists ffmpeg writes.
+
+    Args:
+        durations (list): The duration of each segment in seconds, in playback order.
+
+    Returns:
+        str: The content of the playlist.
+    """
+    lines = [
+        '#EXTM3U', '#EXT-X-VERSION:6', f'#EXT-X-TARGETDURATION:{math.ceil(max(durations))}',
+        '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-INDEPENDENT-SEGMENTS',
+    ]
+    for number, duration in enumerate(durations):
+        lines.append(f'#EXTINF:{duration:.6f},')
+        lines.append(f'index{number}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def stitch_rendition(chunk_playlists, target_dir):
+    """
+    Join several playlists of one rendition into a single playlist.
+
+    The segments are moved into the rendition directory and renumbered in playback
+    order. Their timestamps were already shifted to their position in the source
+    while encoding, so the result plays as one continuous stream.
+
+    Args:
+        chunk_playlists (list): The playlists to join, in playback order.
+        target_dir (str): The directory of the rendition.
+
+    Returns:
+        str: The path of the stitched playlist, or None if a playlist is incomplete.
+    """
+    chunks = [read_media_playlist(m3u8_file) for m3u8_file in chunk_playlists]
+    if not all(chunks):
+        return None
+    os.makedirs(target_dir, exist_ok=True)
+    durations = []
+    for segments in chunks:
+        for duration, segment_file in segments:
+            os.replace(segment_file, os.path.join(target_dir, f'index{len(durations)}.ts'))
+            durations.append(duration)
+    m3u8_file = os.path.join(target_dir, 'index.m3u8')
+    with open(m3u8_file, 'w') as playlist:
+        playlist.write(build_media_playlist(durations))
+    return m3u8_file
+
+
+def finish_resumed_rendition(target_dir, durations, resumed_playlist):
+    """
+    Join the segments an interrupted encode left in a rendition directory with the
+    segments of the encode that continued it.
+
+    Args:
+        target_dir (str): The directory of the rendition.
+        durations (list): The durations of the segments kept from the interrupted encode.
+        resumed_playlist (str): The playlist of the continued encode.
+
+    Returns:
+        str: The path of the joined playlist, or None if the continued encode is incomplete.
+    """
+    kept_playlist = os.path.join(target_dir, 'kept.m3u8')
+    with open(kept_playlist, 'w') as playlist:
+        playlist.write(build_media_playlist(durations))
+    m3u8_file = stitch_rendition([kept_playlist, resumed_playlist], target_dir)
+    os.remove(kept_playlist)
+    if m3u8_file:
+        shutil.rmtree(os.path.dirname(resumed_playlist), ignore_errors=True)
+    return m3u8_file
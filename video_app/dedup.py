@@ -0,0 +1,120 @@
+import os
+import shutil
+from functools import partial
+from django.conf import settings
+from .models import Video
+from .cache import invalidate_playlists, bump_catalogue_version
+from .utils import RENDITIONS, hls_target_dir, hls_master_dir, thumbnail_target_dir, trickplay_target_dir
+
+OUTPUT_FIELD_DIRS = {
+    **{f'm3u8_{resolution}': partial(hls_target_dir, resolution) for resolution in RENDITIONS},
+    'm3u8_master': hls_master_dir,
+    'thumbnail': thumbnail_target_dir,
+    'trickplay': trickplay_target_dir,
+}
+COPIED_FIELDS = [
+    'thumbnail_widths', 'rendition_status', 'duration', 'width', 'height', 'frame_rate',
+    'video_codec', 'audio_codec', 'bitrate',
+]
+
+
+def output_dirs(video_id):
+    """
+    Returns every directory a transcode writes the outputs of a video to.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        list: The absolute paths of the output directories.
+    """
+    return [directory_of(video_id) for directory_of in OUTPUT_FIELD_DIRS.values()]
+
+
+def find_shared_outputs(content_hash, video_id):
+    """
+    Find another video with the same content whose outputs are complete.
+
+    Args:
+        content_hash (str): The content hash of the uploaded file.
+        video_id (int): The ID of the video looking for outputs.
+
+    Returns:
+        Video: The video whose outputs can be reused, or None.
+    """
+    if not content_hash:
+        return None
+    candidates = Video.objects.filter(
+        content_hash=content_hash, processing_status=Video.PROCESSING_DONE
+    ).exclude(pk=video_id).order_by('pk')
+    for candidate in candidates:
+        busy = {Video.PROCESSING_QUEUED, Video.PROCESSING_RUNNING} & set(candidate.rendition_status.values())
+        if not busy:
+            return candidate
+    return None
+
+
+def link_outputs(source, video_id):
+    """
+    Reuse the outputs of a video with the same content instead of transcoding again.
+
+    The output directories are symlinked under the ID of the new video, so playlists,
+    segments, thumbnails and sprites are served through the same paths as its own
+    outputs would be. Both videos record the ID whose directories hold the files,
+    which is what deletion counts references by.
+
+    Args:
+        source (Video): The video whose outputs are reused.
+        video_id (int): The ID of the video to link them to.
+
+    Returns:
+        None
+    """
+    storage_id = source.shared_outputs_id or source.pk
+    for target, link in zip(output_dirs(storage_id), output_dirs(video_id)):
+        if not os.path.isdir(target):
+            continue
+        if os.path.islink(link):
+            os.unlink(link)
+        elif os.path.isdir(link):
+            shutil.rmtree(link)
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        os.symlink(os.path.basename(target), link)
+    fields = {name: getattr(source, name) for name in COPIED_FIELDS}
+    for name, directory_of in OUTPUT_FIELD_DIRS.items():
+        file_name = getattr(source, name).name
+        fields[name] = os.path.relpath(
+            os.path.join(directory_of(video_id), os.path.basename(file_name)), settings.MEDIA_ROOT
+        ) if file_name else None
+    Video.objects.filter(pk=source.pk, shared_outputs_id__isnull=True).update(shared_outputs_id=storage_id)
+    Video.objects.filter(pk=video_id).update(
+        shared_outputs_id=storage_id, processing_status=Video.PROCESSING_DONE, processing_error='', **fields
+    )
+    invalidate_playlists(video_id)
+    bump_catalogue_version()
+
+
+def release_outputs(video_id, storage_id):
+    """
+    Drop the reference a deleted video holds on shared outputs. Its symlinks are
+    removed; the shared files themselves only go with the last video using them.
+
+    Args:
+        video_id (int): The ID of the deleted video.
+        storage_id (int): The ID whose directories hold the outputs it shared. Without
+            one, the video's own outputs are checked, as an instance loaded before they
+            were shared does not know it.
+
+    Returns:
+        bool: True if other videos still use the outputs, so they must be kept.
+    """
+    storage_id = storage_id or video_id
+    for link in output_dirs(video_id):
+        if os.path.islink(link):
+            os.unlink(link)
+    if Video.objects.filter(shared_outputs_id=storage_id).exists():
+        return True
+    if storage_id != video_id:
+        for directory in output_dirs(storage_id):
+            shutil.rmtree(directory, ignore_errors=True)
+    return False
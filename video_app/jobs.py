@@ -0,0 +1,194 @@
+import hashlib
+import os
+from rq.command import send_stop_job_command
+from rq.exceptions import InvalidJobOperation, NoSuchJobError
+from rq.job import Job, JobStatus
+
+ACTIVE_JOB_STATUSES = {JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+WAITING_JOB_STATUSES = {JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED}
+SOURCE_MARKER = '.source'
+VIDEO_JOBS_TTL = 7 * 24 * 60 * 60
+
+
+def source_fingerprint(source, content_hash=''):
+    """
+    Identify the content of a source file for job IDs and resumable outputs.
+
+    Args:
+        source (str): The path to the video file.
+        content_hash (str, optional): The content hash computed while the file was uploaded.
+
+    Returns:
+        str: The first 16 characters of the content hash, or of a hash of the file's
+        size and modification time if there is none.
+    """
+    if content_hash:
+        return content_hash[:16]
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return 'missing'
+    return hashlib.sha256(f'{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+
+
+def video_job_id(kind, video_id, fingerprint, *parts):
+    """
+    Build the deterministic ID of a job working on a video, so the same work is never
+    queued twice for the same source.
+
+    Args:
+        kind (str): The kind of job, e.g. 'transcode'.
+        video_id (int): The ID of the video.
+        fingerprint (str): The fingerprint of the source file.
+        *parts: Further parts that tell jobs of the same kind apart, e.g. the renditions.
+
+    Returns:
+        str: The job ID.
+    """
+    return '-'.join([kind, str(video_id), *(str(part) for part in parts), fingerprint])
+
+
+def video_jobs_key(video_id):
+    """
+    Build the Redis key of the set of job IDs enqueued for a video.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The Redis key.
+    """
+    return f'video:{video_id}:jobs'
+
+
+def enqueue_once(queue, func, *args, job_id, video_id=None, **kwargs):
+    """
+    Enqueue a job under a fixed ID unless a job with that ID is already waiting or
+    running. A short-lived Redis claim keeps two processes from enqueuing it at the
+    same moment. The ID is recorded with the video, so its jobs can be canceled
+    when the video is deleted.
+
+    Args:
+        queue (Queue): The queue to enqueue the job on.
+        func (callable): The job function.
+        *args: The arguments of the job.
+        job_id (str): The deterministic ID of the job.
+        video_id (int, optional): The ID of the video the job works on.
+        **kwargs: Further options for Queue.enqueue.
+
+    Returns:
+        Job: The new job, the job already queued under that ID, or None if another
+        process is enqueuing it right now.
+    """
+    claim = f'video:enqueue:{job_id}'
+    if not queue.connection.set(claim, 1, nx=True, ex=30):
+        return queue.fetch_job(job_id)
+    try:
+        job = queue.fetch_job(job_id)
+        if job is not None and job.get_status() in ACTIVE_JOB_STATUSES:
+            return job
+        if video_id is not None:
+            queue.connection.sadd(video_jobs_key(video_id), job_id)
+            queue.connection.expire(video_jobs_key(video_id), VIDEO_JOBS_TTL)
+        return queue.enqueue(func, *args, job_id=job_id, **kwargs)
+    finally:
+        queue.connection.delete(claim)
+
+
+def cancel_video_jobs(connection, video_id):
+    """
+    Cancel the jobs of a video that are still waiting and stop the ones that are
+    running. RQ stops a job by killing its work horse together with its process
+    group, which takes the job's ffmpeg process down with it.
+
+    Args:
+        connection (Redis): The Redis connection of the queues.
+        video_id (int): The ID of the video.
+
+    Returns:
+        list: The IDs of the jobs that were asked to stop.
+    """
+    stopped = []
+    for job_id in connection.smembers(video_jobs_key(video_id)):
+        job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+        try:
+            job = Job.fetch(job_id, connection=connection)
+        except NoSuchJobError:
+            continue
+        status = job.get_status()
+        if status in WAITING_JOB_STATUSES:
+            job.cancel()
+        elif status == JobStatus.STARTED:
+            try:
+                send_stop_job_command(connection, job_id)
+            except InvalidJobOperation:
+                continue
+            stopped.append(job_id)
+    connection.delete(video_jobs_key(video_id))
+    return stopped
+
+
+def running_jobs(connection, job_ids):
+    """
+    Find which of the given jobs are still running.
+
+    Args:
+        connection (Redis): The Redis connection of the queues.
+        job_ids (list): The IDs of the jobs to look at.
+
+    Returns:
+        list: The IDs of the jobs that are still running.
+    """
+    running = []
+    for job_id in job_ids:
+        try:
+            if Job.fetch(job_id, connection=connection).get_status() == JobStatus.STARTED:
+                running.append(job_id)
+        except NoSuchJobError:
+            pass
+    return running
+
+
+def write_source_marker(directory, fingerprint):
+    """
+    Record which source the outputs in a directory are encoded from.
+
+    Args:
+        directory (str): The output directory.
+        fingerprint (str): The fingerprint of the source file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SOURCE_MARKER), 'w') as marker:
+        marker.write(fingerprint)
+
+
+def read_source_marker(directory):
+    """
+    Read which source the outputs in a directory are encoded from.
+
+    Args:
+        directory (str): The output directory.
+
+    Returns:
+        str: The fingerprint of the source, or None if the directory carries no marker.
+    """
+    try:
+        with open(os.path.join(directory, SOURCE_MARKER)) as marker:
+            return marker.read().strip() or None
+    except OSError:
+        return None
+
+
+def source_marker_matches(directory, fingerprint):
+    """
+    Check whether the outputs in a directory were encoded from the given source, so
+    they can be kept or continued.
+
+    Args:
+        directory (str): The output directory.
+        fingerprint (str): The fingerprint of the source file.
+
+    Returns:
+        bool: True if the directory carries a marker for this source.
+    """
+    return read_source_marker(directory) == fingerprint
@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+from django.core.management.base import BaseCommand
+
+# What each kind of process imports before it serves its first request or job.
+PROFILES = {
+    'web': ['core.wsgi', 'core.urls'],
+    'worker': ['core.wsgi', 'core.urls', 'video_app.tasks', 'video_app.thumbnails', 'PIL.Image'],
+}
+HEAVY_MODULES = ['numpy', 'PIL']
+PROFILE_SCRIPT = '''
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+for name in {modules!r}:
+    importlib.import_module(name)
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Sum the cumulative import time of each top-level package from `python -X importtime`.
+
+    Args:
+        stderr (str): The stderr of the interpreter run with -X importtime.
+
+    Returns:
+        dict: The cumulative microseconds by top-level package.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, package = line[len('import time:'):].split('|')
+        if package.startswith('  ') or not cumulative.strip().isdigit():
+            continue
+        name = package.strip().split('.')[0]
+        totals[name] = totals.get(name, 0) + int(cumulative)
+    return totals
+
+
+def measure_profile(modules):
+    """
+    Start a fresh interpreter that loads Django and the given modules, and measure it.
+
+    Args:
+        modules (list): The modules the process imports after django.setup().
+
+    Returns:
+        dict: The startup seconds, peak RSS in KiB, number of loaded modules, the heavy
+        media packages that were loaded and the import time by top-level package.
+    """
+    script = PROFILE_SCRIPT.format(modules=modules, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True, text=True, env=os.environ.copy(), check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr)
+    return report
+
+
+class Command(BaseCommand):
+    help = 'Compare the import time and memory of a web process and an RQ worker process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest packages to list per process.')
+
+    def handle(self, *args, **options):
+        """
+        Measure every profile in a fresh interpreter and print the results side by side.
+        """
+        for profile, modules in PROFILES.items():
+            report = measure_profile(modules)
+            self.stdout.write(
+                f"{profile}: {report['seconds'] * 1000:.0f} ms, {report['max_rss_kb'] / 1024:.1f} MiB peak RSS, "
+                f"{report['modules']} modules, heavy: {', '.join(report['heavy']) or 'none'}"
+            )
+            slowest = sorted(report['imports'].items(), key=lambda item: item[1], reverse=True)[:options['top']]
+            for name, microseconds in slowest:
+                self.stdout.write(f"    {microseconds / 1000:8.1f} ms  {name}")
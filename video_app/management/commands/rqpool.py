@@ -0,0 +1,155 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rq.worker import Worker, WorkerStatus
+import django_rq
+from ...scheduling import available_cpus, heavy_encode_slots, quick_encode_slots
+
+
+def pool_target(alive, idle, queued, min_workers, max_workers):
+    """
+    Work out how many workers the pool should run.
+
+    Every queued job that no idle worker is about to take gets a worker of its own,
+    up to the maximum. Without a backlog the pool keeps what it has; extra workers
+    leave by themselves once they have been idle long enough.
+
+    Args:
+        alive (int): The number of running workers.
+        idle (int): The number of running workers without a job.
+        queued (int): The number of jobs waiting in the queues of the pool.
+        min_workers (int): The number of workers that always run.
+        max_workers (int): The largest number of workers the pool may run.
+
+    Returns:
+        int: The number of workers to run.
+    """
+    backlog = max(0, queued - idle)
+    return max(min_workers, min(max_workers, alive + backlog))
+
+
+class Command(BaseCommand):
+    help = 'Run a supervised, autoscaling pool of RQ workers on the given queues.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queues', nargs='+', help='The queues to work on, in order of priority.')
+        parser.add_argument('--min-workers', type=int, default=1, help='Workers that always run.')
+        parser.add_argument('--max-workers', type=int, default=None, help='Upper bound of the pool; by default the encode slots of the host for pools on the encode queue, the usable CPUs otherwise.')
+        parser.add_argument('--max-jobs', type=int, default=settings.RQ_POOL_MAX_JOBS, help='Jobs a worker runs before it is replaced.')
+        parser.add_argument('--idle-timeout', type=int, default=settings.RQ_POOL_IDLE_TIMEOUT, help='Seconds an extra worker waits for a job before it exits.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between two checks of the queues and workers.')
+
+    def handle(self, *args, **options):
+        """
+        Start the minimum number of workers, then check the queues and the workers
+        every interval: replace workers that exited, were recycled or crashed, and
+        add extra workers while jobs are waiting. On SIGTERM or SIGINT every worker
+        finishes its current job and the command exits once all of them are gone.
+        """
+        self.queues = options['queues']
+        self.min_workers = max(1, options['min_workers'])
+        self.max_workers = max(self.min_workers, options['max_workers'] or self.default_max_workers())
+        self.max_jobs = options['max_jobs']
+        self.idle_timeout = options['idle_timeout']
+        self.prefix = f"{socket.gethostname()}.{os.getpid()}.{'_'.join(self.queues)}"
+        self.workers = {}
+        self.spawned = 0
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f"Worker pool on {', '.join(self.queues)}: {self.min_workers} to {self.max_workers} workers")
+        while True:
+            self.reap()
+            if self.stopping.is_set():
+                if not self.workers:
+                    break
+                time.sleep(1)
+                continue
+            self.scale()
+            self.stopping.wait(options['interval'])
+        self.stdout.write('Worker pool stopped')
+
+    def default_max_workers(self):
+        """
+        Get the upper bound of the pool when none is given. Only as many encodes as
+        there are heavy and quick encode slots run at the same time on a host, so a
+        pool on the 'encode' queue gets no more workers than that; other pools get one
+        per usable CPU.
+
+        Returns:
+            int: The largest number of workers the pool may run.
+        """
+        if 'encode' in self.queues:
+            return heavy_encode_slots() + quick_encode_slots()
+        return available_cpus()
+
+    def spawn(self, core):
+        """
+        Start a worker process. Core workers keep running while idle; extra workers
+        exit after idle_timeout seconds without a job. Both are replaced after max_jobs
+        jobs, which returns the memory a long-running worker accumulates. Every worker
+        may run the scheduler, which puts encodes that waited for a slot back into
+        their queue; RQ lets only one of them do so per queue at a time.
+
+        Args:
+            core (bool): Whether the worker counts towards the minimum of the pool.
+        """
+        self.spawned += 1
+        name = f'{self.prefix}.{self.spawned}'
+        cmd = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'rqworker', *self.queues,
+            '--name', name, '--max-jobs', str(self.max_jobs), '--with-scheduler',
+        ]
+        if not core:
+            cmd += ['--max-idle-time', str(self.idle_timeout)]
+        # A session of its own keeps a Ctrl+C in the terminal from reaching the workers
+        # directly; the pool forwards a single warm shutdown instead.
+        self.workers[name] = (subprocess.Popen(cmd, start_new_session=True), core)
+
+    def reap(self):
+        """
+        Forget the workers that exited and report the ones that did not exit cleanly.
+        """
+        for name, (process, core) in list(self.workers.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            del self.workers[name]
+            if returncode != 0 and not self.stopping.is_set():
+                self.stderr.write(f'Worker {name} exited with code {returncode}')
+
+    def scale(self):
+        """
+        Bring the pool to the minimum and add extra workers for the backlog.
+        """
+        queued = sum(django_rq.get_queue(queue).count for queue in self.queues)
+        connection = django_rq.get_connection(self.queues[0])
+        busy = {
+            worker.name for worker in Worker.all(connection=connection)
+            if worker.name in self.workers and worker.get_state() == WorkerStatus.BUSY
+        }
+        # Workers that are still booting have not registered yet; they count as idle,
+        # or every check until they are up would start another one for the same backlog.
+        idle = len(self.workers) - len(busy)
+        core = sum(1 for _, is_core in self.workers.values() if is_core)
+        for _ in range(self.min_workers - core):
+            self.spawn(core=True)
+        target = pool_target(len(self.workers), idle, queued, self.min_workers, self.max_workers)
+        for _ in range(target - len(self.workers)):
+            self.spawn(core=False)
+
+    def stop(self, signum, frame):
+        """
+        Ask every worker for a warm shutdown: it finishes its current job and exits. A
+        second signal is passed on as well, which makes RQ abort the running jobs.
+        """
+        self.stopping.set()
+        for process, _ in self.workers.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
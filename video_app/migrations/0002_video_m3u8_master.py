@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 10:40
+
+import video_app.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='m3u8_master',
+            field=models.FileField(blank=True, null=True, upload_to=video_app.utils.hls_master_upload_to),
+        ),
+    ]
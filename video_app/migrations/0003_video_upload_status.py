@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+def mark_existing_uploads_complete(apps, schema_editor):
+    Video = apps.get_model('video_app', 'Video')
+    Video.objects.exclude(file='').exclude(file__isnull=True).update(upload_status='complete')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0002_video_m3u8_master'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('complete', 'Complete')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_uploads_complete, migrations.RunPython.noop),
+    ]
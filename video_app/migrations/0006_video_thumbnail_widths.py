@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0005_video_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_widths',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
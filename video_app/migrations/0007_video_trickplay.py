@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 10:51
+
+import video_app.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0006_video_thumbnail_widths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='trickplay',
+            field=models.FileField(blank=True, null=True, upload_to=video_app.utils.trickplay_upload_to),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+def mark_existing_renditions_done(apps, schema_editor):
+    Video = apps.get_model('video_app', 'Video')
+    for video in Video.objects.all():
+        renditions = {
+            resolution: 'done'
+            for resolution in ('480p', '720p', '1080p')
+            if getattr(video, f'm3u8_{resolution}')
+        }
+        if renditions:
+            Video.objects.filter(pk=video.pk).update(processing_status='done', rendition_status=renditions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0007_video_trickplay'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='processing_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='rendition_status',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(mark_existing_renditions_done, migrations.RunPython.noop),
+    ]
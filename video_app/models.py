@@ -1,5 +1,9 @@
+import uuid
 from django.db import models
-from .utils import hls_480p_upload_to, hls_720p_upload_to, hls_1080p_upload_to, thumbnail_upload_to
+from .utils import (
+    hls_480p_upload_to, hls_720p_upload_to, hls_1080p_upload_to, hls_master_upload_to, thumbnail_upload_to,
+    trickplay_upload_to,
+)
 
 class Video(models.Model):
     """Model representing a video file.
@@ -8,15 +12,85 @@ class Video(models.Model):
     Returns:
         Model: The video model class.
     """
+    UPLOAD_PENDING = 'pending'
+    UPLOAD_COMPLETE = 'complete'
+    UPLOAD_STATUS_CHOICES = [
+        (UPLOAD_PENDING, 'Pending'),
+        (UPLOAD_COMPLETE, 'Complete'),
+    ]
+    PROCESSING_PENDING = 'pending'
+    PROCESSING_QUEUED = 'queued'
+    PROCESSING_RUNNING = 'running'
+    PROCESSING_DONE = 'done'
+    PROCESSING_FAILED = 'failed'
+    PROCESSING_STATUS_CHOICES = [
+        (PROCESSING_PENDING, 'Pending'),
+        (PROCESSING_QUEUED, 'Queued'),
+        (PROCESSING_RUNNING, 'Running'),
+        (PROCESSING_DONE, 'Done'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+
     title = models.CharField(max_length=255)
     description = models.TextField()
     thumbnail = models.ImageField(upload_to=thumbnail_upload_to, blank=True, null=True)
+    thumbnail_widths = models.JSONField(default=list, blank=True)
     file = models.FileField(upload_to='uploads/videos/original/', blank=True, null=True)
     category = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     m3u8_480p = models.FileField(upload_to=hls_480p_upload_to, null=True, blank=True)
     m3u8_720p = models.FileField(upload_to=hls_720p_upload_to, null=True, blank=True)
     m3u8_1080p = models.FileField(upload_to=hls_1080p_upload_to, null=True, blank=True)
+    m3u8_master = models.FileField(upload_to=hls_master_upload_to, null=True, blank=True)
+    trickplay = models.FileField(upload_to=trickplay_upload_to, null=True, blank=True)
+    upload_status = models.CharField(max_length=20, choices=UPLOAD_STATUS_CHOICES, default=UPLOAD_PENDING)
+    processing_status = models.CharField(
+        max_length=20, choices=PROCESSING_STATUS_CHOICES, default=PROCESSING_PENDING, db_index=True
+    )
+    rendition_status = models.JSONField(default=dict, blank=True)
+    processing_error = models.TextField(blank=True, default='')
+    duration = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    frame_rate = models.FloatField(null=True, blank=True)
+    video_codec = models.CharField(max_length=32, blank=True, default='')
+    audio_codec = models.CharField(max_length=32, blank=True, default='')
+    bitrate = models.PositiveIntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    shared_outputs_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='video_created_id_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='video_category_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+
+class VideoUpload(models.Model):
+    """Model representing a resumable, chunked upload of a video file.
+    The chunks are appended at their offset straight into the final file under
+    MEDIA_ROOT; the Video row is created once the last chunk has landed.
+    Args:
+        models (Model): The base model class from Django.
+    Returns:
+        Model: The video upload model class.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    category = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=512, editable=False)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    hash_state = models.CharField(max_length=64, blank=True, default='', editable=False)
+    hashed_length = models.BigIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.length})'
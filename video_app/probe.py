@@ -0,0 +1,103 @@
+import json
+import subprocess
+
+PROBE_ENTRIES = (
+    'format=duration,bit_rate'
+    ':stream=codec_type,codec_name,width,height,avg_frame_rate'
+    ':stream_side_data=rotation'
+)
+
+
+def parse_frame_rate(value):
+    """
+    Parse a frame rate as reported by ffprobe, e.g. '30000/1001'.
+
+    Args:
+        value (str): The raw frame rate.
+
+    Returns:
+        float: The frame rate, or None if it is unknown.
+    """
+    numerator, _, denominator = (value or '').partition('/')
+    try:
+        rate = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 3) if rate > 0 else None
+
+
+def probe_duration(source):
+    """
+    Read the duration of a video file with ffprobe.
+
+    Args:
+        source (str): The path to the video file.
+
+    Returns:
+        float: The duration in seconds, or None if it cannot be determined.
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', source],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def probe_source(source):
+    """
+    Read the properties of a video file with ffprobe. Only the container headers are
+    read, so this takes milliseconds even for long files.
+
+    The reported size is the display size: a rotation in the stream side data swaps
+    width and height, as ffmpeg rotates the frames when it decodes them.
+
+    Args:
+        source (str): The path to the video file.
+
+    Returns:
+        dict: The duration, width, height, frame_rate, video_codec, audio_codec and bitrate.
+
+    Raises:
+        ValueError: If the file cannot be read or has no decodable video stream.
+    """
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', PROBE_ENTRIES, '-of', 'json', source],
+            capture_output=True, text=True, timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ValueError(f'Could not probe the video file: {e}')
+    if result.returncode != 0:
+        raise ValueError(result.stderr.strip()[-500:] or 'Could not read the video file.')
+    try:
+        info = json.loads(result.stdout or '{}')
+    except ValueError:
+        raise ValueError('Could not read the video file.')
+    streams = info.get('streams') or []
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ValueError('The file contains no video stream.')
+    width, height = int(video.get('width') or 0), int(video.get('height') or 0)
+    try:
+        duration = float(info.get('format', {}).get('duration') or 0)
+    except ValueError:
+        duration = 0
+    if not width or not height or duration <= 0:
+        raise ValueError('The video stream has no frame size or duration.')
+    rotation = next((int(data['rotation']) for data in video.get('side_data_list') or [] if 'rotation' in data), 0)
+    if abs(rotation) % 180 == 90:
+        width, height = height, width
+    bitrate = info.get('format', {}).get('bit_rate')
+    return {
+        'duration': duration,
+        'width': width,
+        'height': height,
+        'frame_rate': parse_frame_rate(video.get('avg_frame_rate')),
+        'video_codec': video.get('codec_name') or '',
+        'audio_codec': (audio or {}).get('codec_name') or '',
+        'bitrate': int(bitrate) if bitrate and str(bitrate).isdigit() else None,
+    }
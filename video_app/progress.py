@@ -0,0 +1,154 @@
+import subprocess
+import tempfile
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .utils import RENDITIONS
+
+FFMPEG_ERROR_TAIL = 4000
+
+
+def progress_cache_key(video_id, resolution):
+    """
+    Build the cache key of the live transcode progress of one rendition of a video.
+    Args:
+        video_id (int): The ID of the video.
+        resolution (str): The name of the rendition, e.g. '720p'.
+    Returns:
+        str: The cache key.
+    """
+    return f'video:{video_id}:progress:{resolution}'
+
+
+def get_progress(video_id):
+    """
+    Get the live transcode progress of every rendition of a video.
+    Args:
+        video_id (int): The ID of the video.
+    Returns:
+        dict: The last reported percent, fps and speed by rendition; renditions without
+        a report are left out.
+    """
+    keys = {progress_cache_key(video_id, resolution): resolution for resolution in RENDITIONS}
+    return {keys[key]: progress for key, progress in cache.get_many(keys).items()}
+
+
+def chunk_counter_key(video_id, resolutions):
+    """
+    Build the cache key counting the finished chunks of a chunked transcode.
+    Args:
+        video_id (int): The ID of the video.
+        resolutions (list): The renditions the chunks are encoded to.
+    Returns:
+        str: The cache key.
+    """
+    return f'video:{video_id}:chunks:{"_".join(resolutions)}'
+
+
+def report_chunk_done(video_id, resolutions, count):
+    """
+    Count a finished chunk of a chunked transcode and publish the share of chunks done
+    as the progress of its renditions.
+    Args:
+        video_id (int): The ID of the video.
+        resolutions (list): The renditions the chunks are encoded to.
+        count (int): The total number of chunks.
+    """
+    key = chunk_counter_key(video_id, resolutions)
+    cache.add(key, 0, timeout=settings.VIDEO_PROGRESS_TIMEOUT)
+    done = cache.incr(key)
+    ProgressReporter(video_id, None, resolutions).write(round(min(done, count) / count * 100, 1))
+
+
+def parse_speed(value):
+    """
+    Parse the speed ffmpeg reports in its progress output, e.g. '1.52x'.
+    Args:
+        value (str): The raw speed value.
+    Returns:
+        float: The speed as a multiple of real time, or None if it is not known yet.
+    """
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class ProgressReporter:
+    """
+    Turns the key=value blocks of ffmpeg's -progress output into a percentage and
+    stores it in the cache. Writes are throttled to one per
+    VIDEO_PROGRESS_INTERVAL seconds; the final block is always written. An encode
+    resumed part way through passes its start, since ffmpeg counts from there.
+    """
+    def __init__(self, video_id, duration, resolutions, start=0.0):
+        self.video_id = video_id
+        self.duration = duration
+        self.start = start
+        self.resolutions = resolutions
+        self.interval = settings.VIDEO_PROGRESS_INTERVAL
+        self.percent = 0.0
+        self.last_write = None
+
+    def write(self, percent=0.0, fps=None, speed=None):
+        """
+        Store the progress of the renditions being encoded in the cache.
+        """
+        progress = {'percent': percent, 'fps': fps, 'speed': speed}
+        cache.set_many(
+            {progress_cache_key(self.video_id, resolution): progress for resolution in self.resolutions},
+            timeout=settings.VIDEO_PROGRESS_TIMEOUT,
+        )
+        self.percent = percent
+        self.last_write = time.monotonic()
+
+    def __call__(self, block):
+        """
+        Handle one progress block from ffmpeg.
+        Args:
+            block (dict): The key=value pairs of the block, ending with 'progress'.
+        """
+        finished = block.get('progress') == 'end'
+        if not finished and self.last_write is not None and time.monotonic() - self.last_write < self.interval:
+            return
+        try:
+            position = int(block.get('out_time_us') or block.get('out_time_ms') or 0) / 1000000
+        except ValueError:
+            position = 0
+        percent = min(100.0, (self.start + position) / self.duration * 100) if self.duration else 0.0
+        try:
+            fps = float(block.get('fps'))
+        except (TypeError, ValueError):
+            fps = None
+        self.write(round(100.0 if finished else percent, 1), fps, parse_speed(block.get('speed')))
+
+
+def run_ffmpeg(cmd, on_progress=None):
+    """
+    Run an ffmpeg command and feed its -progress output to a callback.
+
+    The progress is read from stdout line by line while stderr goes to a temporary
+    file, so a chatty encode can never fill a pipe and stall.
+
+    Args:
+        cmd (list): The ffmpeg argument list, starting with 'ffmpeg'.
+        on_progress (callable, optional): Called with every completed progress block.
+
+    Returns:
+        tuple: The return code and the tail of ffmpeg's stderr.
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            if key == 'progress':
+                if on_progress:
+                    on_progress(block)
+                block = {}
+        returncode = process.wait()
+        stderr.seek(0)
+        error = stderr.read().decode(errors='replace')[-FFMPEG_ERROR_TAIL:]
+    return returncode, error
@@ -0,0 +1,203 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from rq import Retry
+import django_rq
+
+# Takes a slot if fewer than ARGV[2] unexpired leases are held. Expired leases of
+# workers that died mid-encode are dropped first, so a crash never leaks a slot.
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+# A job waiting for a slot is rescheduled until it gets one, however long the
+# encodes ahead of it take.
+SLOT_RETRY_MAX = 1000000
+
+
+def read_cgroup_cpus(cgroup_root='/sys/fs/cgroup'):
+    """
+    Read the CPU quota of the container from the cgroup filesystem.
+
+    Args:
+        cgroup_root (str): The mount point of the cgroup filesystem.
+
+    Returns:
+        float: The number of CPUs the quota allows, or None if there is no quota.
+    """
+    try:
+        with open(os.path.join(cgroup_root, 'cpu.max')) as cpu_max:
+            quota, _, period = cpu_max.read().strip().partition(' ')
+        if quota == 'max':
+            return None
+        return int(quota) / int(period or 100000)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us')) as quota_file:
+            quota = int(quota_file.read())
+        with open(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us')) as period_file:
+            period = int(period_file.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus(cgroup_root='/sys/fs/cgroup'):
+    """
+    Count the CPUs this process may actually use: the CPU affinity mask, capped by
+    the cgroup quota of the container. os.cpu_count() reports the cores of the
+    host, which overstates what a limited container gets.
+
+    Args:
+        cgroup_root (str): The mount point of the cgroup filesystem.
+
+    Returns:
+        int: The number of usable CPUs, at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = read_cgroup_cpus(cgroup_root)
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def encode_slots(cpus=None):
+    """
+    Get the number of encodes allowed to run at the same time on this host.
+
+    Args:
+        cpus (int, optional): The usable CPUs; detected if not given.
+
+    Returns:
+        int: VIDEO_ENCODE_SLOTS, or one encode per VIDEO_ENCODE_CPUS_PER_SLOT CPUs if it is 0.
+    """
+    if settings.VIDEO_ENCODE_SLOTS > 0:
+        return settings.VIDEO_ENCODE_SLOTS
+    cpus = cpus or available_cpus()
+    return max(1, cpus // settings.VIDEO_ENCODE_CPUS_PER_SLOT)
+
+
+def quick_encode_slots():
+    """
+    Get the number of slots reserved for encodes of the quick renditions, so the first
+    playable rendition of an upload never waits behind a long high-resolution encode.
+
+    Returns:
+        int: VIDEO_QUICK_ENCODE_SLOTS, at least 1.
+    """
+    return max(1, settings.VIDEO_QUICK_ENCODE_SLOTS)
+
+
+def heavy_encode_slots(cpus=None):
+    """
+    Get the number of slots left for the other encodes once the quick slots are reserved.
+
+    Args:
+        cpus (int, optional): The usable CPUs; detected if not given.
+
+    Returns:
+        int: The number of heavy encodes allowed at the same time, at least 1.
+    """
+    return max(1, encode_slots(cpus) - quick_encode_slots())
+
+
+def encode_threads(cpus=None):
+    """
+    Get the thread budget of one encode: the usable CPUs shared evenly between the heavy
+    and the quick slots, so every slot running at once never oversubscribes the host.
+
+    Args:
+        cpus (int, optional): The usable CPUs; detected if not given.
+
+    Returns:
+        int: The number of threads ffmpeg may use for one encode, at least 1.
+    """
+    cpus = cpus or available_cpus()
+    return max(1, cpus // (heavy_encode_slots(cpus) + quick_encode_slots()))
+
+
+def encode_slot_key(host=None, quick=False):
+    """
+    Build the Redis key of an encode semaphore of a host.
+
+    Args:
+        host (str, optional): The host name; defaults to the current host.
+        quick (bool, optional): Whether to use the semaphore of the quick slots.
+
+    Returns:
+        str: The Redis key.
+    """
+    return f"video:encode_slots:{host or socket.gethostname()}{':quick' if quick else ''}"
+
+
+def slot_retry():
+    """
+    Put a job that found no free encode slot back into its queue. RQ schedules it
+    again under the same ID after VIDEO_ENCODE_SLOT_POLL seconds, so the worker is
+    free for other jobs meanwhile and jobs depending on it keep waiting.
+
+    Returns:
+        Retry: The value for the job to return.
+    """
+    return Retry(max=SLOT_RETRY_MAX, interval=settings.VIDEO_ENCODE_SLOT_POLL)
+
+
+@contextmanager
+def encode_slot(quick=False, connection=None, slots=None):
+    """
+    Hold one of the encode slots of this host while the block runs.
+
+    Encodes of the quick renditions take one of the slots reserved for them and
+    the other encodes one of the rest, so a quick encode never waits behind a
+    long high-resolution encode while both still count against the CPU budget.
+
+    Taking a slot never waits: if all of them are held, None is yielded and the
+    caller is expected to return slot_retry(). The lease is renewed in the
+    background and expires on its own if the worker dies, so a crashed encode
+    frees its slot after VIDEO_ENCODE_SLOT_LEASE seconds.
+
+    Args:
+        quick (bool, optional): Whether the encode only writes quick renditions.
+        connection (Redis, optional): The Redis connection; the 'encode' queue's by default.
+        slots (int, optional): The number of slots; quick_encode_slots() or heavy_encode_slots() by default.
+
+    Yields:
+        int: The thread budget of the encode, or None if no slot is free.
+    """
+    connection = connection or django_rq.get_connection('encode')
+    slots = slots or (quick_encode_slots() if quick else heavy_encode_slots())
+    key = encode_slot_key(quick=quick)
+    token = uuid.uuid4().hex
+    lease = settings.VIDEO_ENCODE_SLOT_LEASE
+    acquire = connection.register_script(ACQUIRE_SCRIPT)
+    if not acquire(keys=[key], args=[time.time(), slots, time.time() + lease, token, lease * 2]):
+        yield None
+        return
+    stopped = threading.Event()
+
+    def renew():
+        while not stopped.wait(lease / 3):
+            connection.zadd(key, {token: time.time() + lease}, xx=True)
+            connection.expire(key, lease * 2)
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        yield encode_threads()
+    finally:
+        stopped.set()
+        renewer.join()
+        connection.zrem(key, token)
@@ -1,56 +1,136 @@
 import os
 import time
+from functools import partial
+from django.conf import settings
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from .models import Video
-from video_app.models import Video
-from .tasks import convert480p, convert720p, convert1080p, generate_thumbnail, delete_video_directory
+from .cache import invalidate_playlists, bump_catalogue_version
+from .tasks import prepare_video, delete_video_files
+from .jobs import cancel_video_jobs, enqueue_once, source_fingerprint, video_job_id
 import django_rq
 
 
+def enqueue_transcode(source, video_id, content_hash=''):
+    """
+    Enqueue the job that probes an uploaded video and queues its thumbnail and
+    transcode jobs, see prepare_video.
+
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+        content_hash (str, optional): The content hash computed while the file was uploaded.
+    """
+    fingerprint = source_fingerprint(source, content_hash)
+    try:
+        enqueue_once(
+            django_rq.get_queue('quick', autocommit=True), prepare_video, source, video_id, content_hash,
+            job_id=video_job_id('prepare', video_id, fingerprint), video_id=video_id,
+        )
+    except Exception as e:
+        print(f"Error enqueuing video tasks: {e}")
+
+
+def invalidate_video(video_id):
+    """
+    Drop the cached playlists of a video and the cached catalogue pages.
+
+    Args:
+        video_id (int): The ID of the video.
+    """
+    invalidate_playlists(video_id)
+    bump_catalogue_version()
+
+
+@receiver(pre_save, sender=Video)
+def hash_uploaded_file(sender, instance, **kwargs):
+    """
+    Take over the content hash of a file uploaded through the admin, so a re-upload of
+    the same content reuses the finished outputs just like a resumable upload does.
+
+    The hash is computed by the upload handlers while the file is received, so the
+    file is not read again here. Files assigned by name, like those of resumable
+    uploads, keep the hash they were created with.
+
+    Args:
+        sender (Video): The sender model.
+        instance (Video): The Video instance about to be saved.
+        **kwargs: Additional keyword arguments.
+    """
+    if not instance.file or instance.file._committed:
+        return
+    instance.content_hash = getattr(instance.file.file, 'content_hash', '')
+
+
 @receiver(post_save, sender=Video)
 def video_post_save(sender, instance, created, **kwargs):
     """
     Signal handler for post-save actions on Video instances.
+
+    Every save drops the cached playlists of the video and the cached catalogue
+    pages, including the saves the transcode job makes when renditions finish. This
+    happens once the transaction commits; a request in between would otherwise
+    cache the old rows under the new catalogue version.
+
+    The storage backend has already written the file when post_save fires, so the
+    upload is marked complete right away. Only the save that flips the state from
+    pending to complete queues the video and schedules the transcode, and it
+    does so once the surrounding transaction commits so the worker always sees the row.
+    """
+    transaction.on_commit(partial(invalidate_video, instance.pk))
+    if instance.upload_status != Video.UPLOAD_PENDING or not instance.file:
+        return
+    if not os.path.isfile(instance.file.path):
+        return
+    flipped = Video.objects.filter(pk=instance.pk, upload_status=Video.UPLOAD_PENDING).update(
+        upload_status=Video.UPLOAD_COMPLETE, processing_status=Video.PROCESSING_QUEUED
+    )
+    instance.upload_status = Video.UPLOAD_COMPLETE
+    instance.processing_status = Video.PROCESSING_QUEUED
+    if flipped:
+        transaction.on_commit(partial(enqueue_transcode, instance.file.path, instance.pk, instance.content_hash))
+
+
+def discard_video(video_id, file_path='', storage_id=None):
     """
-    if created and instance.file:
-        try:
-            waited = 0
-            while not (instance.file and hasattr(instance.file, 'path') and os.path.isfile(instance.file.path)) and waited < 30:
-                time.sleep(1)
-                waited += 1
-            queue = django_rq.get_queue('default', autocommit=True)
-            if instance.file and hasattr(instance.file, 'path'):
-                queue.enqueue(convert480p, instance.file.path, instance.pk)
-                queue.enqueue(convert720p, instance.file.path, instance.pk)
-                queue.enqueue(convert1080p, instance.file.path, instance.pk)
-                queue.enqueue(generate_thumbnail, instance.file.path, instance.pk)
-        except Exception as e:
-            print(f"Error enqueuing video tasks: {e}")
-    else:
-        pass
-
-
-            
+    Stop all work on a deleted video and have its files removed in the background.
+
+    Jobs of the video that are still queued are canceled and running ones are
+    stopped, which kills their ffmpeg process. The files are removed by a job on
+    the 'quick' queue; if it cannot be enqueued, they are removed right here.
+
+    Args:
+        video_id (int): The ID of the deleted video.
+        file_path (str, optional): The absolute path of the uploaded source file.
+        storage_id (int, optional): The ID whose directories hold the outputs the video shared.
+    """
+    stopped = []
+    try:
+        stopped = cancel_video_jobs(django_rq.get_connection('quick'), video_id)
+        django_rq.get_queue('quick', autocommit=True).enqueue(
+            delete_video_files, video_id, file_path, storage_id, stopped,
+            time.time() + settings.VIDEO_DELETE_JOB_WAIT,
+        )
+    except Exception as e:
+        print(f"Error enqueuing video deletion: {e}")
+        delete_video_files(video_id, file_path, storage_id, stopped)
+
+
 @receiver(post_delete, sender=Video)
 def delete_video_files_and_folder(sender, instance, **kwargs):
     """
-    Delete all files and folders associated with a Video instance upon deletion.
+    Cancel the jobs of a deleted Video instance and remove its files and folders.
+
+    Everything happens once the deletion commits: the cached playlists and catalogue
+    pages are dropped, and the files are removed by a background job, so deleting
+    a large video returns immediately.
     
     Args:
         sender (Video): The sender model.
         instance (Video): The deleted Video instance.
         **kwargs: Additional keyword arguments.
     """
-    if instance.file and os.path.isfile(instance.file.path):
-        os.remove(instance.file.path)
-    if instance.thumbnail:
-        instance.thumbnail.delete(save=False)
-    if instance.m3u8_480p:
-        instance.m3u8_480p.delete(save=False)
-    if instance.m3u8_720p:
-        instance.m3u8_720p.delete(save=False)
-    if instance.m3u8_1080p:
-        instance.m3u8_1080p.delete(save=False)
-    delete_video_directory(instance)
-    
+    transaction.on_commit(partial(invalidate_video, instance.pk))
+    file_path = instance.file.path if instance.file else ''
+    transaction.on_commit(partial(discard_video, instance.pk, file_path, instance.shared_outputs_id))
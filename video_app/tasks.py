@@ -1,19 +1,233 @@
+import math
 import os
 import subprocess
 import shutil
-import io
 import time
 from django.conf import settings
-from django.core.files.base import ContentFile
-from moviepy import VideoFileClip
-from PIL import Image
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from rq import Callback, Retry, get_current_job
+from rq.job import Dependency
+import django_rq
 from .models import Video
+from .cache import invalidate_playlists, bump_catalogue_version
+from .chunking import (
+    build_audio_command, build_join_command, build_split_command, finish_resumed_rendition, read_chunk_list,
+    resume_point, write_concat_list,
+)
+from .dedup import find_shared_outputs, link_outputs, output_dirs, release_outputs
+from .jobs import (
+    enqueue_once, read_source_marker, source_fingerprint, running_jobs, source_marker_matches, video_job_id,
+    write_source_marker,
+)
+from .progress import FFMPEG_ERROR_TAIL, ProgressReporter, chunk_counter_key, report_chunk_done, run_ffmpeg
+from .probe import probe_duration, probe_source
+from .scheduling import SLOT_RETRY_MAX, encode_slot, slot_retry
+from .utils import (
+    RENDITIONS, QUICK_RENDITIONS, AUDIO_BITRATE, AUDIO_CODECS, HLS_SEGMENT_SECONDS, KEYFRAME_INTERVAL_SECONDS,
+    THUMBNAIL_FORMATS, THUMBNAIL_DEFAULT_WIDTH,
+    TRICKPLAY_INTERVAL_SECONDS, TRICKPLAY_TILE_WIDTH, TRICKPLAY_COLUMNS, TRICKPLAY_ROWS,
+    build_ladder, rendition_size, scaled_rendition, thumbnail_widths_for,
+    hls_target_dir, hls_master_dir, chunk_target_dir, thumbnail_target_dir, thumbnail_variant_name, trickplay_target_dir,
+)
 
 
+def build_transcode_command(source, targets, sprite_pattern=None, ts_offset=None, threads=None, start=None,
+                            chunk=False):
+    """
+    Build a single ffmpeg command that decodes the source once and writes every
+    HLS rendition, plus the trickplay sprite sheets if a sprite pattern is given.
+
+    The decoded video is fanned out with a split filter, so each rendition only
+    pays for its own scale and encode instead of a full demux and decode. All
+    renditions get keyframes at the same timestamps so players can switch
+    between them on any segment boundary.
+
+    Args:
+        source (str): The path to the video file.
+        targets (list): Tuples of (resolution, rendition settings, output file).
+        sprite_pattern (str, optional): The image2 pattern the sprite sheets are written to.
+        ts_offset (float, optional): Shifts the output timestamps, used for chunks of a longer source.
+        threads (int, optional): The thread budget of the encode. The decoder and the filter
+            graph get all of it and the renditions share it; ffmpeg picks one thread per
+            core of the host for each of them if it is not given.
+        start (float, optional): The position in the source to start reading from, used to
+            continue an interrupted encode.
+        chunk (bool, optional): Write each rendition as a video-only Matroska file, for the
+            chunk of a chunked transcode, instead of an HLS playlist with audio.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    branches = len(targets) + (1 if sprite_pattern else 0)
+    split_labels = ''.join(f'[s{index}]' for index in range(branches))
+    filters = [f'[0:v]split={branches}{split_labels}']
+    for index, (resolution, rendition, _) in enumerate(targets):
+        filters.append(f"[s{index}]scale={rendition['width']}:{rendition['height']},format=yuv420p[v{resolution}]")
+    if sprite_pattern:
+        filters.append(
+            f'[s{len(targets)}]fps=1/{TRICKPLAY_INTERVAL_SECONDS},scale={TRICKPLAY_TILE_WIDTH}:-2,'
+            f'tile={TRICKPLAY_COLUMNS}x{TRICKPLAY_ROWS}[sprites]'
+        )
+    cmd = ['ffmpeg', '-y']
+    if threads:
+        cmd += ['-threads', str(threads)]
+    if start:
+        cmd += ['-ss', f'{start:.6f}']
+    cmd += ['-i', source]
+    if threads:
+        cmd += ['-filter_complex_threads', str(threads)]
+    cmd += ['-filter_complex', ';'.join(filters)]
+    encoder_threads = ['-threads', str(max(1, threads // len(targets)))] if threads and targets else []
+    for resolution, rendition, output_file in targets:
+        cmd += [
+            '-map', f'[v{resolution}]',
+            '-c:v', 'libx264', *encoder_threads, '-profile:v', rendition['profile'], '-level', rendition['level'],
+            '-b:v', f"{rendition['bitrate']}k", '-maxrate', f"{rendition['maxrate']}k",
+            '-bufsize', f"{rendition['bitrate'] * 2}k",
+            '-force_key_frames', f'expr:gte(t,n_forced*{KEYFRAME_INTERVAL_SECONDS})', '-sc_threshold', '0',
+            *(['-output_ts_offset', f'{ts_offset:.6f}'] if ts_offset else []),
+        ]
+        if chunk:
+            cmd += ['-f', 'matroska', output_file]
+            continue
+        cmd += [
+            '-map', '0:a?', '-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE}k', '-ac', '2',
+            '-start_number', '0', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_list_size', '0',
+            '-hls_flags', 'independent_segments', '-f', 'hls', output_file,
+        ]
+    if sprite_pattern:
+        cmd += ['-map', '[sprites]', '-q:v', '5', '-start_number', '0', '-f', 'image2', sprite_pattern]
+    return cmd
+
+
+def format_vtt_time(seconds):
+    """
+    Format a position as a WebVTT timestamp.
+
+    Args:
+        seconds (float): The position in seconds.
+
+    Returns:
+        str: The timestamp as HH:MM:SS.mmm.
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+
+
+def build_trickplay_vtt(duration, tile_count, tile_size, sprite_url):
+    """
+    Build the WebVTT index that maps time ranges to tiles of the sprite sheets.
+
+    Args:
+        duration (float): The duration of the video in seconds.
+        tile_count (int): The number of tiles written.
+        tile_size (tuple): The (width, height) of one tile in pixels.
+        sprite_url (callable): Returns the URL of the sprite sheet with the given index.
+
+    Returns:
+        str: The content of the WebVTT file.
+    """
+    tile_width, tile_height = tile_size
+    per_sheet = TRICKPLAY_COLUMNS * TRICKPLAY_ROWS
+    lines = ['WEBVTT', '']
+    for index in range(tile_count):
+        start = index * TRICKPLAY_INTERVAL_SECONDS
+        end = min(start + TRICKPLAY_INTERVAL_SECONDS, duration)
+        if end <= start:
+            break
+        sheet, position = divmod(index, per_sheet)
+        row, column = divmod(position, TRICKPLAY_COLUMNS)
+        lines.append(f'{format_vtt_time(start)} --> {format_vtt_time(end)}')
+        lines.append(f'{sprite_url(sheet)}#xywh={column * tile_width},{row * tile_height},{tile_width},{tile_height}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def write_trickplay_vtt(video_id, source):
+    """
+    Write the WebVTT index for the sprite sheets produced by the transcode.
+
+    Args:
+        video_id (int): The ID of the video.
+        source (str): The path to the video file, probed for its duration.
 
-def convert480p(source, video_id):
+    Returns:
+        str: The path of the written WebVTT file, or None if no sprite sheet exists.
+    """
+    trickplay_dir = trickplay_target_dir(video_id)
+    sheets = sorted(name for name in os.listdir(trickplay_dir) if name.endswith('.jpg'))
+    if not sheets:
+        return None
+    # Imported here rather than at module level so the web process, which imports
+    # this module only to enqueue jobs, never loads Pillow.
+    from PIL import Image
+    with Image.open(os.path.join(trickplay_dir, sheets[0])) as sheet:
+        sheet_width, sheet_height = sheet.size
+    per_sheet = TRICKPLAY_COLUMNS * TRICKPLAY_ROWS
+    duration = probe_duration(source) or len(sheets) * per_sheet * TRICKPLAY_INTERVAL_SECONDS
+    tile_count = min(math.ceil(duration / TRICKPLAY_INTERVAL_SECONDS), len(sheets) * per_sheet)
+    content = build_trickplay_vtt(
+        duration,
+        tile_count,
+        (sheet_width // TRICKPLAY_COLUMNS, sheet_height // TRICKPLAY_ROWS),
+        lambda index: reverse('video-trickplay-sprite', args=[video_id, f'sprite_{index:03d}.jpg']),
+    )
+    vtt_file = os.path.join(trickplay_dir, 'thumbnails.vtt')
+    with open(vtt_file, 'w') as vtt:
+        vtt.write(content)
+    return vtt_file
+
+
+def build_thumbnail_command(source, seek, outputs):
+    """
+    Build an ffmpeg command that grabs one frame near the seek position and writes
+    it in several sizes.
+
+    The seek happens on the input side and only keyframes are decoded, so ffmpeg
+    jumps straight to the nearest keyframe and decodes a single frame instead of
+    reading the clip from the start.
+
+    Args:
+        source (str): The path to the video file.
+        seek (float): The position in seconds to take the frame from.
+        outputs (list): Tuples of (width, image_file); the format follows the extension.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    split_labels = ''.join(f'[s{index}]' for index in range(len(outputs)))
+    filters = [f'[0:v]split={len(outputs)}{split_labels}']
+    for index, (width, _) in enumerate(outputs):
+        filters.append(f"[s{index}]scale='min({width},iw)':-2[t{index}]")
+    cmd = [
+        'ffmpeg', '-y', '-skip_frame', 'nokey', '-ss', str(seek), '-noaccurate_seek', '-i', source,
+        '-filter_complex', ';'.join(filters),
+    ]
+    for index, (_, image_file) in enumerate(outputs):
+        quality = ['-quality', '80'] if image_file.endswith('.webp') else ['-q:v', '4']
+        cmd += ['-map', f'[t{index}]', '-frames:v', '1', *quality, image_file]
+    return cmd
+
+
+def generate_thumbnail(source, video_id):
     """
-    Convert a video file to HLS 480p format and save the generated m3u8 file.
+    Generate the thumbnails of a video in every size of THUMBNAIL_WIDTHS, as WebP
+    and JPEG, and store them on the video. Sizes wider than the source are rendered
+    once at the source width, and the real widths are recorded, so the responsive
+    image set never advertises a width the file does not have.
+
+    The frame is chosen by scoring low-resolution keyframe samples, so fades,
+    black frames and static title cards are skipped; only the winner is
+    rendered at full thumbnail size.
+
+    Thumbnails left from an earlier run are removed first, and a render counts only
+    if ffmpeg succeeded and wrote every listed file; otherwise it is retried at the
+    start of the video.
 
     Args:
         source (str): The path to the video file.
@@ -21,97 +235,717 @@ def convert480p(source, video_id):
 
     Returns:
         None
+
+    Raises:
+        RuntimeError: If ffmpeg fails, so the job is kept in the failed job registry.
     """
-    target_dir = os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', '480p', str(video_id))
-    os.makedirs(target_dir, exist_ok=True)
-    m3u8_file = os.path.join(target_dir, 'index.m3u8')
-    cmd = (
-        f'ffmpeg -i "{source}" -profile:v baseline -level 3.0 -s 854x480 -start_number 0 '
-        f'-hls_time 10 -hls_list_size 0 -f hls "{m3u8_file}"'
+    # Frame scoring needs NumPy, which only the worker running this job should load.
+    from .thumbnails import select_thumbnail_time
+    size = Video.objects.filter(pk=video_id).values_list('width').first()
+    if size is None:
+        return
+    widths = thumbnail_widths_for(size[0])
+    thumb_dir = thumbnail_target_dir(video_id)
+    if os.path.islink(thumb_dir):
+        os.unlink(thumb_dir)
+    shutil.rmtree(thumb_dir, ignore_errors=True)
+    os.makedirs(thumb_dir)
+    outputs = [
+        (width, os.path.join(thumb_dir, thumbnail_variant_name(width, extension)))
+        for width in widths for extension in THUMBNAIL_FORMATS
+    ]
+    for seek in (select_thumbnail_time(source), 0):
+        for _, image_file in outputs:
+            if os.path.isfile(image_file):
+                os.remove(image_file)
+        result = subprocess.run(build_thumbnail_command(source, seek, outputs), capture_output=True)
+        if result.returncode == 0 and all(os.path.isfile(image_file) for _, image_file in outputs):
+            break
+    else:
+        error = result.stderr.decode(errors='replace')[-FFMPEG_ERROR_TAIL:]
+        raise RuntimeError(f'Rendering the thumbnails of video {video_id} failed: {error}')
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        return
+    default_width = max((width for width in widths if width <= THUMBNAIL_DEFAULT_WIDTH), default=widths[0])
+    video.thumbnail.name = os.path.relpath(
+        os.path.join(thumb_dir, thumbnail_variant_name(default_width, 'jpg')), settings.MEDIA_ROOT
     )
-    subprocess.run(cmd, shell=True, capture_output=True)
-    video = Video.objects.get(pk=video_id)
-    video.m3u8_480p.save(f'index.m3u8', ContentFile(open(m3u8_file, 'rb').read()), save=True)
+    video.thumbnail_widths = widths
+    video.save(update_fields=['thumbnail', 'thumbnail_widths'])
 
 
-def convert720p(source, video_id): 
+def rendition_finished(m3u8_file):
     """
-    Convert a video file to HLS 720p format and save the generated m3u8 file.
+    Check whether ffmpeg completed a rendition playlist.
+
+    Args:
+        m3u8_file (str): The path to the rendition playlist.
+
+    Returns:
+        bool: True if the playlist exists and carries the end-of-list tag.
+    """
+    if not os.path.isfile(m3u8_file):
+        return False
+    with open(m3u8_file, 'r') as playlist:
+        return '#EXT-X-ENDLIST' in playlist.read()
+
+
+def build_master_playlist(resolutions, sizes=None):
+    """
+    Build an adaptive-bitrate master playlist for the given renditions.
+
+    Args:
+        resolutions (list): The names of the finished renditions, e.g. ['480p', '720p'].
+        sizes (dict, optional): The encoded (width, height) by rendition; defaults to the nominal sizes.
+
+    Returns:
+        str: The content of the master playlist.
+    """
+    sizes = sizes or {}
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for resolution in resolutions:
+        rendition = RENDITIONS[resolution]
+        width, height = sizes.get(resolution, (rendition['width'], rendition['height']))
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={(rendition['maxrate'] + AUDIO_BITRATE) * 1000},"
+            f"AVERAGE-BANDWIDTH={(rendition['bitrate'] + AUDIO_BITRATE) * 1000},"
+            f"RESOLUTION={width}x{height},"
+            f'CODECS="{rendition["codecs"]},{AUDIO_CODECS}"'
+        )
+        lines.append(f'../{resolution}/index.m3u8/')
+    return '\n'.join(lines) + '\n'
+
+
+def write_master_playlist(video_id, resolutions, sizes=None):
+    """
+    Write the master playlist of a video to disk.
+
+    Args:
+        video_id (int): The ID of the video.
+        resolutions (list): The names of the finished renditions.
+        sizes (dict, optional): The encoded (width, height) by rendition.
+
+    Returns:
+        str: The path of the written master playlist.
+    """
+    master_dir = hls_master_dir(video_id)
+    os.makedirs(master_dir, exist_ok=True)
+    master_file = os.path.join(master_dir, 'master.m3u8')
+    with open(master_file, 'w') as playlist:
+        playlist.write(build_master_playlist(resolutions, sizes))
+    return master_file
+
+
+def processing_status_for(rendition_status):
+    """
+    Derive the overall processing state of a video from the state of its renditions.
+    A video counts as done as soon as one rendition is playable; the per-rendition
+    state tells which ones are still being encoded.
+
+    Args:
+        rendition_status (dict): The state of each rendition by name.
+
+    Returns:
+        str: The overall processing state.
+    """
+    states = set(rendition_status.values())
+    for state in (Video.PROCESSING_DONE, Video.PROCESSING_RUNNING, Video.PROCESSING_QUEUED):
+        if state in states:
+            return state
+    return Video.PROCESSING_FAILED if states else Video.PROCESSING_PENDING
+
+
+def start_renditions(video_id, resolutions):
+    """
+    Mark renditions of a video as running. The row is locked while the state is
+    merged, so jobs encoding other renditions of the same video don't overwrite it.
+
     Args:
-        source (str): The path to the video file.
         video_id (int): The ID of the video.
+        resolutions (list): The names of the renditions about to be encoded.
+
+    Returns:
+        Video: The video with its source size, content hash and trickplay index, or None
+        if it no longer exists.
+    """
+    with transaction.atomic():
+        video = Video.objects.select_for_update().only(
+            'rendition_status', 'width', 'height', 'content_hash', 'trickplay'
+        ).filter(
+            pk=video_id
+        ).first()
+        if video is None:
+            return None
+        video.rendition_status.update(dict.fromkeys(resolutions, Video.PROCESSING_RUNNING))
+        Video.objects.filter(pk=video_id).update(
+            rendition_status=video.rendition_status,
+            processing_status=processing_status_for(video.rendition_status),
+        )
+    return video
+
+
+def finish_renditions(video_id, source, results, error='', sprites=False):
+    """
+    Store the outcome of an encode on the video. The results are merged into the
+    row under a lock, and the master playlist is rewritten with every rendition
+    finished so far, since other jobs may encode other renditions of the video.
+
+    Args:
+        video_id (int): The ID of the video.
+        source (str): The path to the video file.
+        results (list): Tuples of (resolution, m3u8_file); m3u8_file is None if the encode failed.
+        error (str, optional): The error output to keep on the video.
+        sprites (bool, optional): Whether trickplay sprite sheets were written and need an index.
+
     Returns:
         None
     """
-    target_dir = os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', '720p', str(video_id))
-    os.makedirs(target_dir, exist_ok=True)
-    m3u8_file = os.path.join(target_dir, 'index.m3u8')
-    cmd = (
-        f'ffmpeg -i "{source}" -profile:v baseline -level 3.0 -s 1280x720 -start_number 0 '
-        f'-hls_time 10 -hls_list_size 0 -f hls "{m3u8_file}"'
+    with transaction.atomic():
+        try:
+            video = Video.objects.select_for_update().get(pk=video_id)
+        except Video.DoesNotExist:
+            return
+        update_fields = ['processing_status', 'rendition_status']
+        for resolution, m3u8_file in results:
+            if m3u8_file and rendition_finished(m3u8_file):
+                getattr(video, f'm3u8_{resolution}').name = os.path.relpath(m3u8_file, settings.MEDIA_ROOT)
+                update_fields.append(f'm3u8_{resolution}')
+                video.rendition_status[resolution] = Video.PROCESSING_DONE
+            else:
+                video.rendition_status[resolution] = Video.PROCESSING_FAILED
+        finished = [
+            resolution for resolution in RENDITIONS
+            if video.rendition_status.get(resolution) == Video.PROCESSING_DONE
+        ]
+        if finished:
+            sizes = {resolution: rendition_size(resolution, video.width, video.height) for resolution in finished}
+            master_file = write_master_playlist(video_id, finished, sizes)
+            video.m3u8_master.name = os.path.relpath(master_file, settings.MEDIA_ROOT)
+            update_fields.append('m3u8_master')
+        if sprites:
+            vtt_file = write_trickplay_vtt(video_id, source)
+            if vtt_file:
+                video.trickplay.name = os.path.relpath(vtt_file, settings.MEDIA_ROOT)
+                update_fields.append('trickplay')
+        video.processing_status = processing_status_for(video.rendition_status)
+        if error:
+            video.processing_error = error
+            update_fields.append('processing_error')
+        video.save(update_fields=update_fields)
+    invalidate_playlists(video_id)
+    bump_catalogue_version()
+
+
+def fail_renditions(job, connection, exc_type, exc_value, traceback):
+    """
+    Mark the renditions of a transcode job as failed when the job dies before it
+    stores its outcome, e.g. when RQ kills it at the timeout of its queue. Without
+    this they would keep showing as queued or running.
+
+    Args:
+        job (Job): The failed transcode_video job.
+        connection (Redis): The Redis connection of the job.
+        exc_type (type): The type of the exception the job died of.
+        exc_value (Exception): The exception.
+        traceback (traceback): The traceback of the exception.
+
+    Returns:
+        None
+    """
+    video_id = job.args[1]
+    resolutions = job.args[2] if len(job.args) > 2 and job.args[2] else list(RENDITIONS)
+    with transaction.atomic():
+        video = Video.objects.select_for_update().only('rendition_status').filter(pk=video_id).first()
+        if video is None:
+            return
+        for resolution in resolutions:
+            if video.rendition_status.get(resolution) in (Video.PROCESSING_QUEUED, Video.PROCESSING_RUNNING):
+                video.rendition_status[resolution] = Video.PROCESSING_FAILED
+        Video.objects.filter(pk=video_id).update(
+            rendition_status=video.rendition_status,
+            processing_status=processing_status_for(video.rendition_status),
+            processing_error=f'{exc_type.__name__}: {exc_value}',
+        )
+    invalidate_playlists(video_id)
+    bump_catalogue_version()
+
+
+def prepare_video(source, video_id, content_hash=''):
+    """
+    Probe an uploaded video and enqueue its thumbnail and transcode jobs.
+
+    This runs as a short job on the 'quick' queue, so neither the probe nor the lookup
+    of shared outputs holds up the request that finished the upload.
+
+    If another video with the same content hash is already done, its outputs are
+    linked to this video instead and nothing is enqueued.
+
+    The probe reads only the container headers. Its results are stored on the video
+    and decide the rendition ladder, so a source is never scaled up. A file ffprobe
+    cannot read is marked as failed right away instead of being handed to an encode
+    worker.
+
+    The thumbnail and the lowest renditions go to the 'quick' queue, so the poster
+    and a first playable stream show up long before the higher renditions and
+    trickplay sprites from the 'encode' queue are done.
+
+    Every job gets an ID made of the video, its renditions and the fingerprint of
+    the source, so a job that is already waiting or running is not queued again.
+    A transcode job that dies marks its renditions as failed, see fail_renditions.
+
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+        content_hash (str, optional): The content hash computed while the file was uploaded.
+    """
+    if not Video.objects.filter(pk=video_id).exists():
+        return
+    shared = find_shared_outputs(content_hash, video_id)
+    if shared is not None:
+        link_outputs(shared, video_id)
+        return
+    try:
+        probe = probe_source(source)
+    except ValueError as e:
+        Video.objects.filter(pk=video_id).update(
+            processing_status=Video.PROCESSING_FAILED, rendition_status={}, processing_error=str(e)
+        )
+        invalidate_playlists(video_id)
+        bump_catalogue_version()
+        return
+    ladder = build_ladder(probe['width'], probe['height'])
+    Video.objects.filter(pk=video_id).update(
+        rendition_status=dict.fromkeys(ladder, Video.PROCESSING_QUEUED), **probe
     )
-    subprocess.run(cmd, shell=True, capture_output=True)
-    video = Video.objects.get(pk=video_id)
-    video.m3u8_720p.save(f'index.m3u8', ContentFile(open(m3u8_file, 'rb').read()), save=True)
+    quick = [resolution for resolution in ladder if resolution in QUICK_RENDITIONS]
+    heavy = [resolution for resolution in ladder if resolution not in QUICK_RENDITIONS]
+    fingerprint = source_fingerprint(source, content_hash)
+    quick_queue = django_rq.get_queue('quick', autocommit=True)
+    enqueue_once(
+        quick_queue, generate_thumbnail, source, video_id,
+        job_id=video_job_id('thumbnail', video_id, fingerprint), video_id=video_id,
+    )
+    if quick:
+        enqueue_once(
+            quick_queue, transcode_video, source, video_id, quick, not heavy,
+            job_id=video_job_id('transcode', video_id, fingerprint, '_'.join(quick)), video_id=video_id,
+            on_failure=Callback(fail_renditions),
+        )
+    if heavy:
+        encode_queue = django_rq.get_queue('encode', autocommit=True)
+        enqueue_once(
+            encode_queue, transcode_video, source, video_id, heavy, True,
+            job_id=video_job_id('transcode', video_id, fingerprint, '_'.join(heavy)), video_id=video_id,
+            on_failure=Callback(fail_renditions),
+        )
+
+
+def transcode_video(source, video_id, resolutions=None, sprites=True):
+    """
+    Convert a video file to HLS renditions, and optionally the trickplay sprite
+    sheets, in one ffmpeg run, then store the generated playlists and WebVTT index
+    on the video.
+
+    Sources longer than VIDEO_CHUNKED_MIN_DURATION are split into chunks that are
+    encoded as separate jobs instead, see split_transcode.
+
+    The job can run again for the same source without redoing work. Every rendition
+    directory records the fingerprint of the source it was encoded from; renditions
+    already complete for this source are kept as they are, and an encode that was
+    cut short continues after the last segment all of its renditions completed.
+
+    The encode needs a free encode slot of the host and runs with its thread
+    budget; encodes of QUICK_RENDITIONS only take the slots reserved for them, see
+    encode_slot. Without a free slot the job goes back to its queue before it
+    touches the video.
 
+    While ffmpeg runs, its progress is parsed and published to the cache; the
+    processing state of the video and of each rendition is stored on the row once
+    the run ends. A non-zero exit code marks the renditions of the run as failed
+    and keeps the tail of ffmpeg's output as the processing error.
 
-def convert1080p(source, video_id):
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+        resolutions (list, optional): The renditions to encode; defaults to all of RENDITIONS.
+        sprites (bool, optional): Whether to write the trickplay sprite sheets as well.
+
+    Returns:
+        Retry: The retry of the job if no encode slot is free, otherwise None.
+    """
+    resolutions = resolutions or list(RENDITIONS)
+    with encode_slot(quick=set(resolutions) <= set(QUICK_RENDITIONS)) as threads:
+        if threads is None:
+            return slot_retry()
+        encode_renditions(source, video_id, resolutions, sprites, threads)
+
+
+def encode_renditions(source, video_id, resolutions, sprites, threads):
     """
-    Convert a video file to HLS 1080p format and save the generated m3u8 file.
+    Run the encode of transcode_video while its encode slot is held.
+
     Args:
         source (str): The path to the video file.
         video_id (int): The ID of the video.
+        resolutions (list): The renditions to encode.
+        sprites (bool): Whether to write the trickplay sprite sheets as well.
+        threads (int): The thread budget of the encode.
+
     Returns:
         None
     """
-    target_dir = os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', '1080p', str(video_id))
-    os.makedirs(target_dir, exist_ok=True)
-    m3u8_file = os.path.join(target_dir, 'index.m3u8')
-    cmd = (
-        f'ffmpeg -i "{source}" -profile:v baseline -level 3.0 -s 1920x1080 -start_number 0 '
-        f'-hls_time 10 -hls_list_size 0 -f hls "{m3u8_file}"'
+    video = start_renditions(video_id, resolutions)
+    if video is None:
+        return
+    fingerprint = source_fingerprint(source, video.content_hash)
+    playlists = {
+        resolution: os.path.join(hls_target_dir(resolution, video_id), 'index.m3u8') for resolution in resolutions
+    }
+    done = [
+        resolution for resolution in resolutions
+        if source_marker_matches(hls_target_dir(resolution, video_id), fingerprint)
+        and rendition_finished(playlists[resolution])
+    ]
+    pending = [resolution for resolution in resolutions if resolution not in done]
+    if done:
+        finish_renditions(video_id, source, [(resolution, playlists[resolution]) for resolution in done])
+    if not pending:
+        if sprites and not video.trickplay:
+            write_trickplay(source, video_id, threads)
+        return
+    duration = probe_duration(source)
+    if settings.VIDEO_CHUNK_SECONDS and duration and duration >= settings.VIDEO_CHUNKED_MIN_DURATION:
+        if split_transcode(source, video_id, pending, sprites, fingerprint):
+            return
+    for resolution in pending:
+        target_dir = hls_target_dir(resolution, video_id)
+        if not source_marker_matches(target_dir, fingerprint):
+            shutil.rmtree(target_dir, ignore_errors=True)
+            write_source_marker(target_dir, fingerprint)
+    resume = resume_point([playlists[resolution] for resolution in pending])
+    start = resume[1] if resume else 0.0
+    targets = []
+    for resolution in pending:
+        m3u8_file = playlists[resolution]
+        if resume:
+            resume_dir = os.path.join(hls_target_dir(resolution, video_id), 'resume')
+            shutil.rmtree(resume_dir, ignore_errors=True)
+            os.makedirs(resume_dir)
+            m3u8_file = os.path.join(resume_dir, 'index.m3u8')
+        rendition = scaled_rendition(resolution, video.width, video.height)
+        targets.append((resolution, rendition, m3u8_file))
+    sprite_pattern = None
+    if sprites and not resume:
+        trickplay_dir = trickplay_target_dir(video_id)
+        os.makedirs(trickplay_dir, exist_ok=True)
+        sprite_pattern = os.path.join(trickplay_dir, 'sprite_%03d.jpg')
+    reporter = ProgressReporter(video_id, duration, pending, start)
+    reporter.write(round(min(100.0, start / duration * 100), 1) if duration else 0.0)
+    returncode, error = run_ffmpeg(
+        build_transcode_command(source, targets, sprite_pattern, ts_offset=start, threads=threads, start=start),
+        reporter,
     )
-    subprocess.run(cmd, shell=True, capture_output=True)
-    video = Video.objects.get(pk=video_id)
-    video.m3u8_1080p.save(f'index.m3u8', ContentFile(open(m3u8_file, 'rb').read()), save=True)
+    results = []
+    for resolution, _, m3u8_file in targets:
+        if returncode == 0 and resume:
+            m3u8_file = finish_resumed_rendition(hls_target_dir(resolution, video_id), resume[0], m3u8_file)
+        results.append((resolution, m3u8_file if returncode == 0 else None))
+    finish_renditions(video_id, source, results, error if returncode != 0 else '', bool(sprite_pattern) and returncode == 0)
+    reporter.write(100.0 if returncode == 0 else reporter.percent)
+    if sprites and resume and returncode == 0:
+        write_trickplay(source, video_id, threads)
 
 
-def generate_thumbnail(source, video_id):
+def split_transcode(source, video_id, resolutions, sprites, fingerprint):
+    """
+    Split the source at keyframes and fan the encode out over the workers: one job
+    per chunk, plus one for the trickplay sprites, and a stitch job that runs once
+    every chunk job has ended. The jobs go to the queue of the current job, so any
+    idle worker of that queue picks up a chunk.
+
+    A split made from the same source is reused, together with the chunks that were
+    already encoded, and the jobs have deterministic IDs, so running this again only
+    queues the work that is missing.
+
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+        resolutions (list): The renditions to encode.
+        sprites (bool): Whether to write the trickplay sprite sheets as well.
+        fingerprint (str): The fingerprint of the source file.
+
+    Returns:
+        bool: False if the source could not be split into several chunks.
+    """
+    group = '_'.join(resolutions)
+    split_dir = os.path.join(chunk_target_dir(video_id), group)
+    if source_marker_matches(split_dir, fingerprint):
+        chunks = read_chunk_list(split_dir)
+    else:
+        shutil.rmtree(split_dir, ignore_errors=True)
+        for resolution in resolutions:
+            shutil.rmtree(os.path.join(chunk_target_dir(video_id), resolution), ignore_errors=True)
+        os.makedirs(split_dir)
+        returncode, _ = run_ffmpeg(build_split_command(source, split_dir, settings.VIDEO_CHUNK_SECONDS))
+        chunks = read_chunk_list(split_dir) if returncode == 0 else []
+        if len(chunks) >= 2:
+            write_source_marker(split_dir, fingerprint)
+    if len(chunks) < 2:
+        shutil.rmtree(split_dir, ignore_errors=True)
+        return False
+    cache.delete(chunk_counter_key(video_id, resolutions))
+    current_job = get_current_job()
+    queue = django_rq.get_queue(current_job.origin if current_job else 'encode', autocommit=True)
+    jobs = [
+        enqueue_once(
+            queue, transcode_chunk, chunk_file, start, video_id, resolutions, index, len(chunks),
+            job_id=video_job_id('chunk', video_id, fingerprint, group, index), video_id=video_id,
+        )
+        for index, (chunk_file, start) in enumerate(chunks)
+    ]
+    if sprites:
+        enqueue_once(
+            queue, generate_trickplay, source, video_id,
+            job_id=video_job_id('trickplay', video_id, fingerprint), video_id=video_id,
+        )
+    enqueue_once(
+        queue, stitch_chunks, source, video_id, resolutions, len(chunks),
+        job_id=video_job_id('stitch', video_id, fingerprint, group), video_id=video_id,
+        depends_on=Dependency(jobs=[job for job in jobs if job is not None], allow_failure=True),
+    )
+    return True
+
+
+def chunk_output_file(resolution, video_id, index):
+    """
+    Returns the file an encoded chunk of a rendition is written to.
+
+    Args:
+        resolution (str): The name of the rendition.
+        video_id (int): The ID of the video.
+        index (int): The position of the chunk.
+
+    Returns:
+        str: The absolute path of the chunk output file.
+    """
+    return os.path.join(chunk_target_dir(video_id), resolution, f'{index:04d}.mkv')
+
+
+def transcode_chunk(chunk_file, start, video_id, resolutions, index, count):
+    """
+    Encode the video of one chunk of the source to the given renditions. Each output
+    starts at timestamp zero; the chunks are put back in place when they are joined,
+    see stitch_chunks. A chunk whose renditions are all complete is not encoded again.
+
+    Args:
+        chunk_file (str): The path to the chunk.
+        start (float): The start of the chunk in the source, in seconds.
+        video_id (int): The ID of the video.
+        resolutions (list): The renditions to encode.
+        index (int): The position of the chunk.
+        count (int): The total number of chunks.
+
+    Returns:
+        Retry: The retry of the job if no encode slot is free, otherwise None.
+
+    Raises:
+        RuntimeError: If ffmpeg fails, so the job is kept in the failed job registry.
+    """
+    size = Video.objects.filter(pk=video_id).values_list('width', 'height').first()
+    if size is None:
+        return
+    outputs = [chunk_output_file(resolution, video_id, index) for resolution in resolutions]
+    if all(os.path.isfile(output_file) for output_file in outputs):
+        report_chunk_done(video_id, resolutions, count)
+        return
+    with encode_slot(quick=set(resolutions) <= set(QUICK_RENDITIONS)) as threads:
+        if threads is None:
+            return slot_retry()
+        targets = []
+        for resolution, output_file in zip(resolutions, outputs):
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            targets.append((resolution, scaled_rendition(resolution, *size), f'{output_file}.part'))
+        returncode, error = run_ffmpeg(build_transcode_command(chunk_file, targets, threads=threads, chunk=True))
+    if returncode != 0:
+        raise RuntimeError(f'Encoding chunk {index} of video {video_id} failed: {error}')
+    for output_file in outputs:
+        os.replace(f'{output_file}.part', output_file)
+    report_chunk_done(video_id, resolutions, count)
+
+
+def stitch_chunks(source, video_id, resolutions, count):
+    """
+    Join the encoded chunks of each rendition into one playlist, store the result
+    on the video and remove the working files of the chunked transcode.
+
+    The chunks carry only video. If the source has audio, it is encoded once over
+    the whole source and muxed into every rendition while the chunks are joined,
+    so it plays without gaps at the chunk boundaries. The audio encode needs a
+    free encode slot, see encode_slot.
+
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+        resolutions (list): The renditions that were encoded.
+        count (int): The total number of chunks.
+
+    Returns:
+        Retry: The retry of the job if no encode slot is free for the audio, otherwise None.
+    """
+    audio_codec = Video.objects.filter(pk=video_id).values_list('audio_codec', flat=True).first()
+    if audio_codec is None:
+        return
+    chunk_dir = chunk_target_dir(video_id)
+    split_dir = os.path.join(chunk_dir, '_'.join(resolutions))
+    audio_file = None
+    error = ''
+    if audio_codec:
+        audio_file = os.path.join(split_dir, 'audio.m4a')
+        if not os.path.isfile(audio_file):
+            with encode_slot(quick=set(resolutions) <= set(QUICK_RENDITIONS)) as threads:
+                if threads is None:
+                    return slot_retry()
+                returncode, output = run_ffmpeg(build_audio_command(source, f'{audio_file}.part'))
+            if returncode == 0:
+                os.replace(f'{audio_file}.part', audio_file)
+            else:
+                audio_file = None
+                error = f'Encoding the audio failed: {output}'
+    results = []
+    for resolution in resolutions:
+        chunk_files = [chunk_output_file(resolution, video_id, index) for index in range(count)]
+        m3u8_file = None
+        if (audio_file or not audio_codec) and all(os.path.isfile(chunk_file) for chunk_file in chunk_files):
+            m3u8_file = join_rendition(chunk_files, audio_file, resolution, video_id)
+        results.append((resolution, m3u8_file))
+    failed = [resolution for resolution, m3u8_file in results if m3u8_file is None]
+    fingerprint = read_source_marker(split_dir)
+    for resolution, m3u8_file in results:
+        if m3u8_file and fingerprint:
+            write_source_marker(hls_target_dir(resolution, video_id), fingerprint)
+    if failed and not error:
+        error = f"Chunks of {', '.join(failed)} failed to encode."
+    finish_renditions(video_id, source, results, error)
+    for name in ['_'.join(resolutions), *resolutions]:
+        shutil.rmtree(os.path.join(chunk_dir, name), ignore_errors=True)
+    if os.path.isdir(chunk_dir) and not os.listdir(chunk_dir):
+        os.rmdir(chunk_dir)
+
+
+def join_rendition(chunk_files, audio_file, resolution, video_id):
+    """
+    Write a rendition from its encoded chunks and the audio of the whole source.
+
+    Args:
+        chunk_files (list): The encoded chunks of the rendition, in playback order.
+        audio_file (str): The path of the encoded audio, or None if the source has none.
+        resolution (str): The name of the rendition.
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The path of the rendition's playlist, or None if ffmpeg failed.
+    """
+    concat_list = os.path.join(chunk_target_dir(video_id), resolution, 'chunks.txt')
+    write_concat_list(concat_list, chunk_files)
+    target_dir = hls_target_dir(resolution, video_id)
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.makedirs(target_dir)
+    m3u8_file = os.path.join(target_dir, 'index.m3u8')
+    returncode, _ = run_ffmpeg(build_join_command(concat_list, audio_file, m3u8_file))
+    return m3u8_file if returncode == 0 else None
+
+
+def generate_trickplay(source, video_id):
+    """
+    Write the trickplay sprite sheets and WebVTT index of a video on their own,
+    for chunked transcodes where no single encode sees the whole source. The job
+    needs a free encode slot, see encode_slot.
+
+    Args:
+        source (str): The path to the video file.
+        video_id (int): The ID of the video.
+
+    Returns:
+        Retry: The retry of the job if no encode slot is free, otherwise None.
+    """
+    if not Video.objects.filter(pk=video_id).exists():
+        return
+    with encode_slot() as threads:
+        if threads is None:
+            return slot_retry()
+        write_trickplay(source, video_id, threads)
+
+
+def write_trickplay(source, video_id, threads):
     """
-    Generate a thumbnail for a video file and save it to the database.
+    Render the trickplay sprite sheets of a video and store their WebVTT index on it.
+
     Args:
         source (str): The path to the video file.
-        video_id (int): The ID of the video. 
+        video_id (int): The ID of the video.
+        threads (int): The thread budget of the encode.
+
     Returns:
         None
     """
-    waited = 0
-    while not Video.objects.filter(pk=video_id).exists() and waited < 30:
-        time.sleep(1)
-        waited += 1
-    try:
-        video = Video.objects.get(pk=video_id)
-    except Video.DoesNotExist:
+    trickplay_dir = trickplay_target_dir(video_id)
+    os.makedirs(trickplay_dir, exist_ok=True)
+    returncode, _ = run_ffmpeg(
+        build_transcode_command(source, [], os.path.join(trickplay_dir, 'sprite_%03d.jpg'), threads=threads)
+    )
+    vtt_file = write_trickplay_vtt(video_id, source) if returncode == 0 else None
+    if not vtt_file:
+        return
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None:
+        return
+    video.trickplay.name = os.path.relpath(vtt_file, settings.MEDIA_ROOT)
+    video.save(update_fields=['trickplay'])
+
+
+def delete_video_directory(video_id):
+    """
+    Delete every output directory of a video, including the working files of a
+    chunked transcode. Symlinks to shared outputs are removed, not followed.
+
+    Args:
+        video_id (int): The ID of the video.
+    """
+    for folder in [*output_dirs(video_id), chunk_target_dir(video_id)]:
+        if os.path.islink(folder):
+            os.unlink(folder)
+        elif os.path.exists(folder):
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def delete_video_files(video_id, file_path='', storage_id=None, stopped_jobs=(), wait_until=0):
+    """
+    Remove the files of a deleted video: the uploaded source, the finished outputs
+    and the partial output of encodes that were stopped. Outputs shared with other
+    videos of the same content are kept until the last of them is deleted.
+
+    While a stopped job is still running and wait_until has not passed, the job is
+    put back into its queue like a job without a free encode slot, so no ffmpeg
+    process is left writing into a directory after it is removed and the worker is
+    not blocked meanwhile.
+
+    Args:
+        video_id (int): The ID of the deleted video.
+        file_path (str, optional): The absolute path of the uploaded source file.
+        storage_id (int, optional): The ID whose directories hold the outputs the video shared.
+        stopped_jobs (list, optional): The IDs of the jobs of the video that were asked to stop.
+        wait_until (float, optional): The Unix time up to which the stopped jobs are waited for.
+
+    Returns:
+        Retry: A retry while a stopped job is still running, otherwise None.
+    """
+    if stopped_jobs and time.time() < wait_until:
+        if running_jobs(django_rq.get_connection('quick'), stopped_jobs):
+            return Retry(max=SLOT_RETRY_MAX, interval=settings.VIDEO_ENCODE_SLOT_POLL)
+    if file_path and os.path.isfile(file_path):
+        os.remove(file_path)
+    if release_outputs(video_id, storage_id):
         return
-    clip = VideoFileClip(source)
-    frame = clip.get_frame(1)
-    image = Image.fromarray(frame)
-    buffer = io.BytesIO()
-    image.save(buffer, format='PNG')
-    thumbnail_name = f'{video_id}_thumb.png'
-    video.thumbnail.save(thumbnail_name, ContentFile(buffer.getvalue()), save=True)
-    
-def delete_video_directory(instance):
-    """
-    Delete the directory associated with a Video instance.
-    Args:
-        instance (Video): The Video instance whose directory is to be deleted.
-    """
-    base_dir = os.path.join('media', 'uploads', 'videos', 'hls')
-    for res in ['480p', '720p', '1080p']:
-        folder = os.path.join(base_dir, res, str(instance.id))
-        if os.path.exists(folder):
-            shutil.rmtree(folder)
-    thumb_folder = os.path.join('media', 'uploads', 'videos', 'thumbnails', str(instance.id))
-    if os.path.exists(thumb_folder):
-        shutil.rmtree(thumb_folder)
\ No newline at end of file
+    delete_video_directory(video_id)
@@ -1,10 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, RequestFactory, override_settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import mock, skipUnless
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import Video
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
+from .models import Video, VideoUpload
+from .cache import get_playlist, local_playlists
+from .progress import ProgressReporter, get_progress
+from .chunking import build_join_command, build_split_command, read_media_playlist, stitch_rendition
+from .signals import enqueue_transcode
+from .api.views import upload_claim_key
+from .tasks import (
+    delete_video_files, fail_renditions, generate_thumbnail, generate_trickplay, prepare_video, stitch_chunks, transcode_chunk, transcode_video,
+    build_transcode_command, build_master_playlist, build_thumbnail_command, build_trickplay_vtt,
+)
+from .thumbnails import score_frames
+import numpy as np
+from .dedup import find_shared_outputs
+from .jobs import cancel_video_jobs, enqueue_once, source_fingerprint, video_jobs_key, write_source_marker
+from rq import Retry
+from rq.exceptions import NoSuchJobError
+from rq.timeouts import JobTimeoutException
+from rq.job import JobStatus
+from .probe import probe_source
+from .scheduling import (
+    available_cpus, encode_slot, encode_slot_key, encode_slots, encode_threads, heavy_encode_slots, quick_encode_slots,
+    read_cgroup_cpus,
+)
+from .management.commands.import_benchmark import PROFILES, measure_profile
+from .management.commands.rqpool import Command as WorkerPoolCommand, pool_target
+from .utils import RENDITIONS, ContentHasher, build_ladder, finish_content_hash, rendition_size, thumbnail_widths_for
 import os
+import shutil
+import tempfile
+import time
+import base64
+import hashlib
+import json
+import signal
+import subprocess
+from contextlib import nullcontext
 
 class VideoAppTests(APITestCase):
     def setUp(self):
@@ -18,7 +57,8 @@ class VideoAppTests(APITestCase):
             title='Test Movie',
             description='Test Description',
             thumbnail='http://example.com/image.jpg',
-            category='Drama'
+            category='Drama',
+            processing_status=Video.PROCESSING_DONE
         )
         self.list_url = reverse('video-list')
         self.manifest_url = reverse('video-manifest', args=[self.video.id, '720p'])
@@ -53,10 +93,10 @@ class VideoAppTests(APITestCase):
         self.authenticate()
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['title'], 'Test Movie')
-        self.assertEqual(response.data[0]['description'], 'Test Description')
-        self.assertEqual(response.data[0]['category'], 'Drama')
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(response.json()[0]['title'], 'Test Movie')
+        self.assertEqual(response.json()[0]['description'], 'Test Description')
+        self.assertEqual(response.json()[0]['category'], 'Drama')
 
     def test_manifest_not_found(self):
         """
@@ -76,4 +116,1314 @@ class VideoAppTests(APITestCase):
         """
         self.authenticate()
         response = self.client.get(self.segment_url)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TranscodeCommandTests(SimpleTestCase):
+    def test_single_decode_for_all_renditions(self):
+        """
+        Tests that all renditions and the thumbnail are produced by one ffmpeg command.
+        Builds the command for two renditions and verifies that the source is read once,
+        the decoded video is split into one branch per output and every output is mapped.
+        """
+        targets = [
+            ('480p', RENDITIONS['480p'], '/tmp/480p/index.m3u8'),
+            ('720p', RENDITIONS['720p'], '/tmp/720p/index.m3u8'),
+        ]
+        cmd = build_transcode_command('/tmp/source.mp4', targets)
+        self.assertEqual(cmd.count('-i'), 1)
+        graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(graph.startswith('[0:v]split=2'))
+        self.assertIn('[s0]scale=854:480,format=yuv420p[v480p]', graph)
+        self.assertIn('/tmp/480p/index.m3u8', cmd)
+        self.assertEqual(cmd[-1], '/tmp/720p/index.m3u8')
+
+    def test_thumbnail_seeks_on_input_and_writes_every_size(self):
+        """
+        Tests that the thumbnail command seeks before opening the input, decodes keyframes only,
+        and writes one single-frame output per requested size and format.
+        """
+        outputs = [(320, '/tmp/thumb_320.webp'), (320, '/tmp/thumb_320.jpg'), (1280, '/tmp/thumb_1280.webp')]
+        cmd = build_thumbnail_command('/tmp/source.mp4', 1, outputs)
+        self.assertLess(cmd.index('-ss'), cmd.index('-i'))
+        self.assertIn('nokey', cmd)
+        self.assertEqual(cmd.count('-frames:v'), 3)
+        self.assertIn("[s2]scale='min(1280,iw)':-2[t2]", cmd[cmd.index('-filter_complex') + 1])
+        self.assertEqual([arg for arg in cmd if arg.startswith('/tmp/thumb_')], [path for _, path in outputs])
+
+    def test_thumbnail_widths_never_exceed_source(self):
+        """
+        Tests that sizes wider than the source collapse into one thumbnail at the source width,
+        and that an unknown width keeps every size.
+        """
+        self.assertEqual(thumbnail_widths_for(1920), [320, 640, 1280])
+        self.assertEqual(thumbnail_widths_for(500), [320, 500])
+        self.assertEqual(thumbnail_widths_for(240), [240])
+        self.assertEqual(thumbnail_widths_for(None), [320, 640, 1280])
+
+    def test_master_playlist_lists_finished_renditions(self):
+        """
+        Tests that the master playlist only references the renditions passed in.
+        Builds a master playlist for 480p and 720p and verifies that both variant streams
+        are described with bandwidth, resolution and codecs, and that 1080p is left out.
+        """
+        playlist = build_master_playlist(['480p', '720p'])
+        self.assertTrue(playlist.startswith('#EXTM3U'))
+        self.assertEqual(playlist.count('#EXT-X-STREAM-INF'), 2)
+        self.assertIn('RESOLUTION=854x480', playlist)
+        self.assertIn('CODECS="avc1.4d401f,mp4a.40.2"', playlist)
+        self.assertIn('../720p/index.m3u8/', playlist)
+        self.assertNotIn('1080p', playlist)
+
+
+    def test_ladder_never_upscales_and_keeps_aspect_ratio(self):
+        """
+        Tests that only renditions the source fills are encoded, scaled to fit their box
+        with the source's aspect ratio, upright boxes for portrait sources.
+        """
+        self.assertEqual(build_ladder(1920, 1080), ['480p', '720p', '1080p'])
+        self.assertEqual(build_ladder(1280, 536), ['480p', '720p'])
+        self.assertEqual(rendition_size('480p', 1280, 536), (854, 358))
+        self.assertEqual(rendition_size('720p', 1280, 536), (1280, 536))
+        self.assertEqual(build_ladder(1080, 1920), ['480p', '720p', '1080p'])
+        self.assertEqual(rendition_size('720p', 1080, 1920), (720, 1280))
+        self.assertEqual(build_ladder(640, 360), ['480p'])
+        self.assertEqual(rendition_size('480p', 640, 360), (640, 360))
+        playlist = build_master_playlist(['480p'], {'480p': (640, 360)})
+        self.assertIn('RESOLUTION=640x360', playlist)
+
+    def test_probe_reads_display_size_and_rejects_files_without_video(self):
+        """
+        Tests that a rotated stream reports its upright size and that a file without a
+        video stream or with a failing ffprobe is rejected.
+        """
+        output = {
+            'streams': [
+                {'codec_type': 'video', 'codec_name': 'hevc', 'width': 1920, 'height': 1080,
+                 'avg_frame_rate': '30000/1001', 'side_data_list': [{'rotation': -90}]},
+                {'codec_type': 'audio', 'codec_name': 'aac'},
+            ],
+            'format': {'duration': '61.5', 'bit_rate': '12000000'},
+        }
+        completed = mock.Mock(returncode=0, stdout=json.dumps(output), stderr='')
+        with mock.patch('video_app.probe.subprocess.run', return_value=completed):
+            probe = probe_source('/tmp/source.mov')
+        self.assertEqual((probe['width'], probe['height'], probe['frame_rate']), (1080, 1920, 29.97))
+        self.assertEqual((probe['video_codec'], probe['audio_codec'], probe['bitrate']), ('hevc', 'aac', 12000000))
+        completed.stdout = json.dumps({'streams': [{'codec_type': 'audio'}], 'format': {'duration': '3'}})
+        with mock.patch('video_app.probe.subprocess.run', return_value=completed):
+            self.assertRaises(ValueError, probe_source, '/tmp/audio.m4a')
+        failed = mock.Mock(returncode=1, stdout='', stderr='Invalid data found when processing input')
+        with mock.patch('video_app.probe.subprocess.run', return_value=failed):
+            with self.assertRaisesMessage(ValueError, 'Invalid data found'):
+                probe_source('/tmp/broken.mp4')
+
+    @override_settings(VIDEO_ENCODE_SLOTS=0, VIDEO_ENCODE_CPUS_PER_SLOT=4)
+    def test_cpu_budget_follows_cgroup_quota(self):
+        """
+        Tests that the usable CPUs are capped by the cgroup v2 or v1 quota, that they are
+        shared evenly between the encode slots and that the budget reaches ffmpeg.
+        """
+        cgroup_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cgroup_root)
+        self.assertIsNone(read_cgroup_cpus(cgroup_root))
+        os.makedirs(os.path.join(cgroup_root, 'cpu'))
+        with open(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'), 'w') as quota:
+            quota.write('150000')
+        with open(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us'), 'w') as period:
+            period.write('100000')
+        self.assertEqual(read_cgroup_cpus(cgroup_root), 1.5)
+        with open(os.path.join(cgroup_root, 'cpu.max'), 'w') as cpu_max:
+            cpu_max.write('max 100000\n')
+        self.assertIsNone(read_cgroup_cpus(cgroup_root))
+        with open(os.path.join(cgroup_root, 'cpu.max'), 'w') as cpu_max:
+            cpu_max.write('600000 100000\n')
+        with mock.patch('os.sched_getaffinity', return_value=set(range(16)), create=True):
+            self.assertEqual(available_cpus(cgroup_root), 6)
+        self.assertEqual((encode_slots(16), heavy_encode_slots(16), encode_threads(16)), (4, 3, 4))
+        self.assertEqual((encode_slots(2), heavy_encode_slots(2), encode_threads(2)), (1, 1, 1))
+        targets = [
+            ('480p', RENDITIONS['480p'], '/tmp/480p/index.m3u8'),
+            ('720p', RENDITIONS['720p'], '/tmp/720p/index.m3u8'),
+        ]
+        cmd = build_transcode_command('/tmp/source.mp4', targets, threads=6)
+        self.assertEqual(cmd[cmd.index('-threads') + 1], '6')
+        self.assertLess(cmd.index('-threads'), cmd.index('-i'))
+        self.assertEqual(cmd[cmd.index('-filter_complex_threads') + 1], '6')
+        self.assertEqual(cmd[cmd.index('libx264') + 1:cmd.index('libx264') + 3], ['-threads', '3'])
+
+    @override_settings(VIDEO_ENCODE_SLOT_LEASE=60, VIDEO_QUICK_ENCODE_SLOTS=1)
+    def test_encode_slot_taken_without_waiting(self):
+        """
+        Tests that an encode takes a free slot with the thread budget and gives it back
+        afterwards, that a full semaphore yields None at once, and that quick encodes
+        are refused once the slots reserved for them are held.
+        """
+        connection = mock.Mock()
+        acquire = connection.register_script.return_value
+        acquire.side_effect = [1, 0, 0]
+        with mock.patch('video_app.scheduling.time.sleep') as sleep, \
+                mock.patch('video_app.scheduling.encode_threads', return_value=3):
+            with encode_slot(connection=connection, slots=2) as threads:
+                self.assertEqual(threads, 3)
+                connection.zrem.assert_not_called()
+            keys, args = acquire.call_args.kwargs['keys'], acquire.call_args.kwargs['args']
+            self.assertEqual(keys, [encode_slot_key()])
+            self.assertEqual(args[1], 2)
+            connection.zrem.assert_called_once_with(encode_slot_key(), args[3])
+            with encode_slot(connection=connection, slots=2) as threads:
+                self.assertIsNone(threads)
+            with encode_slot(quick=True, connection=connection) as threads:
+                self.assertIsNone(threads)
+            keys, args = acquire.call_args.kwargs['keys'], acquire.call_args.kwargs['args']
+            self.assertEqual(keys, [encode_slot_key(quick=True)])
+            self.assertEqual(args[1], quick_encode_slots())
+        self.assertEqual(acquire.call_count, 3)
+        self.assertEqual(connection.zrem.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_trickplay_sprites_share_the_transcode_decode(self):
+        """
+        Tests that the sprite sheets are an extra branch of the single transcode decode.
+        """
+        targets = [('480p', RENDITIONS['480p'], '/tmp/480p/index.m3u8')]
+        cmd = build_transcode_command('/tmp/source.mp4', targets, '/tmp/trickplay/sprite_%03d.jpg')
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertIn('tile=10x10[sprites]', cmd[cmd.index('-filter_complex') + 1])
+        self.assertEqual(cmd[-1], '/tmp/trickplay/sprite_%03d.jpg')
+
+    def test_trickplay_vtt_maps_time_to_tiles(self):
+        """
+        Tests that the WebVTT index maps each interval to the right tile of the right sheet and
+        that the last cue ends at the video duration.
+        """
+        vtt = build_trickplay_vtt(1005, 101, (160, 90), lambda index: f'/sprite_{index:03d}.jpg/')
+        self.assertTrue(vtt.startswith('WEBVTT'))
+        self.assertIn('00:00:10.000 --> 00:00:20.000\n/sprite_000.jpg/#xywh=160,0,160,90', vtt)
+        self.assertIn('00:01:40.000 --> 00:01:50.000\n/sprite_000.jpg/#xywh=0,90,160,90', vtt)
+        self.assertIn('00:16:40.000 --> 00:16:45.000\n/sprite_001.jpg/#xywh=0,0,160,90', vtt)
+
+
+class ChunkedTranscodeTests(TestCase):
+    def setUp(self):
+        """
+        Point MEDIA_ROOT at a temporary directory and create a queued video.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root, VIDEO_CHUNK_SECONDS=120, VIDEO_CHUNKED_MIN_DURATION=600
+        )
+        self.override.enable()
+        self.video = Video.objects.create(
+            title='Movie', description='Desc', category='Drama',
+            rendition_status={resolution: Video.PROCESSING_QUEUED for resolution in RENDITIONS},
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def write_chunk_playlist(self, directory, durations, finished=True):
+        """
+        Write an encoded chunk with one empty segment file per duration.
+        """
+        os.makedirs(directory, exist_ok=True)
+        lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:10']
+        for number, duration in enumerate(durations):
+            open(os.path.join(directory, f'index{number}.ts'), 'wb').close()
+            lines += [f'#EXTINF:{duration},', f'index{number}.ts']
+        if finished:
+            lines.append('#EXT-X-ENDLIST')
+        with open(os.path.join(directory, 'index.m3u8'), 'w') as playlist:
+            playlist.write('\n'.join(lines) + '\n')
+        return os.path.join(directory, 'index.m3u8')
+
+    def test_chunks_cut_without_reencoding_and_without_audio(self):
+        """
+        Tests that the video of the source is split by stream copy, that a chunk's encode
+        writes video-only files, and that joining them copies the audio encoded once.
+        """
+        cmd = build_split_command('/tmp/source.mp4', '/tmp/chunks', 120)
+        self.assertEqual(cmd[cmd.index('-c') + 1], 'copy')
+        self.assertEqual(cmd[cmd.index('-segment_time') + 1], '120')
+        self.assertNotIn('0:a:0?', cmd)
+        targets = [
+            ('720p', RENDITIONS['720p'], '/tmp/720p/0001.mkv'),
+            ('1080p', RENDITIONS['1080p'], '/tmp/1080p/0001.mkv'),
+        ]
+        cmd = build_transcode_command('/tmp/chunk_0001.mkv', targets, chunk=True)
+        self.assertNotIn('0:a?', cmd)
+        self.assertNotIn('-c:a', cmd)
+        self.assertEqual(cmd.count('matroska'), 2)
+        cmd = build_join_command('/tmp/720p/chunks.txt', '/tmp/audio.m4a', '/tmp/hls/index.m3u8')
+        self.assertEqual(cmd[cmd.index('-f') + 1], 'concat')
+        self.assertEqual(cmd[cmd.index('-c') + 1], 'copy')
+        self.assertEqual(cmd[cmd.index('1:a:0') - 1], '-map')
+
+    def test_stitch_renumbers_segments_in_playback_order(self):
+        """
+        Tests that the segments of all chunks end up in the rendition directory numbered
+        from zero, and that an incomplete chunk fails the whole rendition.
+        """
+        chunk_dir = os.path.join(self.media_root, 'chunks')
+        playlists = [
+            self.write_chunk_playlist(os.path.join(chunk_dir, '0'), [10.0, 4.5]),
+            self.write_chunk_playlist(os.path.join(chunk_dir, '1'), [10.0, 10.0, 2.0]),
+        ]
+        target_dir = os.path.join(self.media_root, 'hls')
+        with open(stitch_rendition(playlists, target_dir)) as playlist:
+            content = playlist.read()
+        self.assertEqual(sorted(os.listdir(target_dir)), ['index.m3u8'] + [f'index{number}.ts' for number in range(5)])
+        self.assertIn('#EXTINF:4.500000,\nindex1.ts\n#EXTINF:10.000000,\nindex2.ts', content)
+        self.assertTrue(content.endswith('#EXT-X-ENDLIST\n'))
+        broken = self.write_chunk_playlist(os.path.join(chunk_dir, '2'), [10.0], finished=False)
+        self.assertIsNone(stitch_rendition([broken], os.path.join(self.media_root, 'other')))
+
+    def test_long_source_fanned_out_over_chunk_jobs(self):
+        """
+        Tests that a long source is split and encoded as one job per chunk, with the sprites
+        in their own job and a stitch job that waits for every chunk, even failed ones.
+        """
+        def fake_split(cmd, on_progress=None):
+            split_dir = os.path.dirname(cmd[-1])
+            with open(os.path.join(split_dir, 'chunks.csv'), 'w') as chunk_list:
+                chunk_list.write('chunk_0000.mkv,0.000000,120.040000\nchunk_0001.mkv,120.040000,200.000000\n')
+            return 0, ''
+
+        queue = mock.Mock()
+        queue.enqueue.side_effect = lambda *args, **kwargs: f'job-{queue.enqueue.call_count}'
+        with mock.patch('video_app.tasks.run_ffmpeg', side_effect=fake_split), \
+                mock.patch('video_app.tasks.encode_slot', side_effect=lambda **kwargs: nullcontext(2)), \
+                mock.patch('video_app.tasks.probe_duration', return_value=3600.0), \
+                mock.patch('video_app.tasks.django_rq.get_queue', return_value=queue):
+            transcode_video('/source.mp4', self.video.id, ['720p', '1080p'], True)
+        functions = [call.args[0] for call in queue.enqueue.call_args_list]
+        self.assertEqual(functions, [transcode_chunk, transcode_chunk, generate_trickplay, stitch_chunks])
+        self.assertEqual(queue.enqueue.call_args_list[1].args[1:3], (
+            os.path.join(self.media_root, 'uploads', 'videos', 'chunks', str(self.video.id), '720p_1080p', 'chunk_0001.mkv'),
+            120.04,
+        ))
+        dependency = queue.enqueue.call_args_list[-1].kwargs['depends_on']
+        self.assertEqual(dependency.dependencies, ['job-1', 'job-2'])
+        self.assertTrue(dependency.allow_failure)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.rendition_status['1080p'], Video.PROCESSING_RUNNING)
+
+
+    def audio_gaps(self, m3u8_file):
+        """
+        Read the AAC audio of an HLS rendition straight from its MPEG-TS segments and
+        return, for every PES packet that does not start right where the previous one
+        ended, its timestamp and the size of the gap in 90 kHz ticks.
+        """
+        rates = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+        data = b''.join(
+            open(segment_file, 'rb').read() for _, segment_file in read_media_playlist(m3u8_file)
+        )
+        pmt_pid = audio_pid = None
+        packets = []
+        for offset in range(0, len(data) - 187, 188):
+            packet = data[offset:offset + 188]
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            unit_start = packet[1] & 0x40
+            payload = packet[5 + packet[4]:] if packet[3] & 0x20 else packet[4:]
+            if not packet[3] & 0x10:
+                continue
+            if pid == 0 and unit_start:
+                section = payload[1 + payload[0]:]
+                pmt_pid = ((section[10] & 0x1F) << 8) | section[11]
+            elif pid == pmt_pid and unit_start and audio_pid is None:
+                section = payload[1 + payload[0]:]
+                end = 3 + (((section[1] & 0x0F) << 8) | section[2]) - 4
+                position = 12 + (((section[10] & 0x0F) << 8) | section[11])
+                while position < end:
+                    if section[position] == 0x0F:
+                        audio_pid = ((section[position + 1] & 0x1F) << 8) | section[position + 2]
+                    position += 5 + (((section[position + 3] & 0x0F) << 8) | section[position + 4])
+            elif pid == audio_pid and unit_start:
+                p = payload[9:14]
+                pts = ((p[0] >> 1) & 7) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+                packets.append((pts, bytearray(payload[9 + payload[8]:])))
+            elif pid == audio_pid and packets:
+                packets[-1][1].extend(payload)
+        self.assertGreater(len(packets), 1)
+        gaps = []
+        for (pts, frames), (next_pts, _) in zip(packets, packets[1:]):
+            position = samples = 0
+            while position + 7 <= len(frames):
+                rate = rates[(frames[position + 2] >> 2) & 0x0F]
+                position += ((frames[position + 3] & 3) << 11) | (frames[position + 4] << 3) | (frames[position + 5] >> 5)
+                samples += 1024
+            gap = next_pts - pts - round(samples * 90000 / rate)
+            if abs(gap) > 2:
+                gaps.append((pts, gap))
+        return gaps
+
+    @skipUnless(shutil.which('ffmpeg'), 'ffmpeg is not installed')
+    def test_stitched_audio_continuous_across_chunks(self):
+        """
+        Tests with a real ffmpeg that a source cut into chunks plays its audio without a
+        gap or an overlap at the chunk boundaries, because the audio is encoded once for
+        the whole source instead of once per chunk.
+        """
+        source = os.path.join(self.media_root, 'source.mp4')
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=size=320x240:rate=25',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100', '-t', '12',
+            '-c:v', 'libx264', '-g', '50', '-pix_fmt', 'yuv420p', '-c:a', 'aac', source,
+        ], check=True)
+        Video.objects.filter(pk=self.video.id).update(width=320, height=240, audio_codec='aac')
+        queue = mock.Mock()
+        queue.enqueue.side_effect = lambda *args, **kwargs: f'job-{queue.enqueue.call_count}'
+        with override_settings(VIDEO_CHUNK_SECONDS=4, VIDEO_CHUNKED_MIN_DURATION=5), \
+                mock.patch('video_app.tasks.encode_slot', side_effect=lambda **kwargs: nullcontext(2)), \
+                mock.patch('video_app.tasks.probe_duration', return_value=12.0), \
+                mock.patch('video_app.tasks.django_rq.get_queue', return_value=queue):
+            transcode_video(source, self.video.id, ['480p'], False)
+            jobs = [call.args for call in queue.enqueue.call_args_list]
+            self.assertEqual([job[0] for job in jobs], [transcode_chunk] * 3 + [stitch_chunks])
+            for func, *args in jobs:
+                func(*args)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.rendition_status['480p'], Video.PROCESSING_DONE)
+        m3u8_file = self.video.m3u8_480p.path
+        self.assertAlmostEqual(sum(duration for duration, _ in read_media_playlist(m3u8_file)), 12.0, delta=0.1)
+        self.assertEqual(self.audio_gaps(m3u8_file), [])
+
+    def test_interrupted_encode_resumes_and_finished_renditions_are_kept(self):
+        """
+        Tests that a rerun keeps a rendition already finished for the same source and
+        continues the others after the last segment all of them completed, with the
+        timestamps and segment numbers carrying on. A third run encodes nothing.
+        """
+        Video.objects.filter(pk=self.video.id).update(width=1920, height=1080, content_hash='ab' * 32)
+        fingerprint = source_fingerprint('/source.mp4', 'ab' * 32)
+        for resolution, durations, finished in [('480p', [10.0, 10.0, 4.0], True), ('720p', [10.0, 10.0], False),
+                                                ('1080p', [10.0], False)]:
+            target_dir = os.path.join(self.media_root, 'uploads', 'videos', 'hls', resolution, str(self.video.id))
+            self.write_chunk_playlist(target_dir, durations, finished)
+            write_source_marker(target_dir, fingerprint)
+
+        def fake_ffmpeg(cmd, on_progress=None):
+            for argument in cmd:
+                if argument.endswith('index.m3u8'):
+                    self.write_chunk_playlist(os.path.dirname(argument), [10.0, 4.0])
+            return 0, ''
+
+        with mock.patch('video_app.tasks.run_ffmpeg', side_effect=fake_ffmpeg) as run_ffmpeg, \
+                mock.patch('video_app.tasks.encode_slot', side_effect=lambda **kwargs: nullcontext(2)), \
+                mock.patch('video_app.tasks.write_trickplay') as write_trickplay, \
+                mock.patch('video_app.tasks.probe_duration', return_value=24.0):
+            transcode_video('/source.mp4', self.video.id, ['480p', '720p', '1080p'], True)
+            cmd = run_ffmpeg.call_args.args[0]
+            self.assertEqual(cmd[cmd.index('-ss') + 1], '10.000000')
+            self.assertEqual(cmd[cmd.index('-output_ts_offset') + 1], '10.000000')
+            self.assertFalse(any('/480p/' in argument for argument in cmd))
+            write_trickplay.assert_called_once_with('/source.mp4', self.video.id, 2)
+            self.video.refresh_from_db()
+            self.assertEqual(set(self.video.rendition_status.values()), {Video.PROCESSING_DONE})
+            with open(self.video.m3u8_720p.path) as playlist:
+                content = playlist.read()
+            self.assertIn('#EXTINF:10.000000,\nindex1.ts\n#EXTINF:4.000000,\nindex2.ts\n#EXT-X-ENDLIST', content)
+            self.assertNotIn('resume', os.listdir(os.path.dirname(self.video.m3u8_720p.path)))
+            Video.objects.filter(pk=self.video.id).update(trickplay='uploads/videos/trickplay/1/thumbnails.vtt')
+            transcode_video('/source.mp4', self.video.id, ['480p', '720p', '1080p'], True)
+            self.assertEqual(run_ffmpeg.call_count, 1)
+
+    def test_job_enqueued_once_per_id(self):
+        """
+        Tests that a job whose ID is already queued or running is not enqueued again, and
+        that it is once the earlier job has ended.
+        """
+        queue = mock.Mock()
+        queue.fetch_job.return_value.get_status.return_value = JobStatus.STARTED
+        job = enqueue_once(queue, transcode_video, '/source.mp4', 1, job_id='transcode-1-480p-abab')
+        self.assertIs(job, queue.fetch_job.return_value)
+        queue.enqueue.assert_not_called()
+        queue.fetch_job.return_value.get_status.return_value = JobStatus.FAILED
+        enqueue_once(queue, transcode_video, '/source.mp4', 1, job_id='transcode-1-480p-abab')
+        queue.enqueue.assert_called_once_with(transcode_video, '/source.mp4', 1, job_id='transcode-1-480p-abab')
+        queue.connection.delete.assert_called_with('video:enqueue:transcode-1-480p-abab')
+
+class ThumbnailScoringTests(SimpleTestCase):
+    def test_best_frame_skips_black_and_duplicates(self):
+        """
+        Tests that black frames and near-duplicates are rejected and that a detailed, well exposed
+        frame beats a flat one.
+        """
+        rng = np.random.default_rng(0)
+        black = np.zeros((90, 160), dtype=np.uint8)
+        flat = np.full((90, 160), 128, dtype=np.uint8)
+        detailed = rng.integers(40, 220, size=(90, 160), dtype=np.uint8)
+        frames = np.stack([black, flat, detailed, detailed])
+        scores = score_frames(frames)
+        self.assertEqual(scores[0], -np.inf)
+        self.assertEqual(scores[3], -np.inf)
+        self.assertEqual(int(np.argmax(scores)), 2)
+
+
+class WebProcessImportTests(SimpleTestCase):
+    def test_web_process_skips_media_libraries(self):
+        """
+        Tests that a fresh web process loads the job entry points without NumPy or Pillow,
+        while a worker running the jobs does load them.
+        """
+        self.assertEqual(measure_profile(PROFILES['web'])['heavy'], [])
+        self.assertEqual(set(measure_profile(PROFILES['worker'])['heavy']), {'numpy', 'PIL'})
+
+
+class WorkerPoolTests(SimpleTestCase):
+    def setUp(self):
+        """
+        Sets up a pool of one to four workers on two queues without starting it.
+        """
+        self.pool = WorkerPoolCommand()
+        self.pool.queues = ['encode', 'quick']
+        self.pool.min_workers, self.pool.max_workers = 1, 4
+        self.pool.max_jobs, self.pool.idle_timeout = 50, 120
+        self.pool.prefix = 'host.1.encode_quick'
+        self.pool.workers = {}
+        self.pool.spawned = 0
+        self.pool.stopping = mock.Mock(is_set=mock.Mock(return_value=False))
+
+    def scale(self, queued, busy=()):
+        queue = mock.Mock(count=queued)
+        workers = [mock.Mock(get_state=mock.Mock(return_value='busy')) for _ in busy]
+        for worker, name in zip(workers, busy):
+            worker.name = name
+        with mock.patch('video_app.management.commands.rqpool.django_rq.get_queue', return_value=queue), \
+                mock.patch('video_app.management.commands.rqpool.django_rq.get_connection'), \
+                mock.patch('video_app.management.commands.rqpool.Worker.all', return_value=workers), \
+                mock.patch('video_app.management.commands.rqpool.subprocess.Popen') as popen:
+            popen.return_value.poll.return_value = None
+            self.pool.scale()
+        return [call.args[0] for call in popen.call_args_list]
+
+    def test_pool_size_follows_backlog(self):
+        """
+        Tests that jobs not covered by idle workers add workers up to the maximum, and
+        that the pool never drops below its minimum.
+        """
+        self.assertEqual(pool_target(0, 0, 0, 1, 4), 1)
+        self.assertEqual(pool_target(2, 2, 1, 1, 4), 2)
+        self.assertEqual(pool_target(2, 0, 1, 1, 4), 3)
+        self.assertEqual(pool_target(2, 0, 9, 1, 4), 4)
+
+    def test_scales_up_on_backlog_and_replaces_exited_workers(self):
+        """
+        Tests that the pool starts its core worker, adds extra workers that exit when idle
+        for a backlog, recycles workers after max_jobs and replaces a core worker that exited.
+        """
+        started = self.scale(queued=0)
+        self.assertEqual(len(started), 1)
+        self.assertIn('--max-jobs', started[0])
+        self.assertNotIn('--max-idle-time', started[0])
+        self.assertEqual(started[0][started[0].index('rqworker') + 1:][:2], ['encode', 'quick'])
+        core = next(iter(self.pool.workers))
+        started = self.scale(queued=5, busy=[core])
+        self.assertEqual(len(started), 3)
+        self.assertTrue(all('--max-idle-time' in cmd for cmd in started))
+        self.assertEqual(len(self.pool.workers), 4)
+        self.pool.workers[core][0].poll.return_value = 0
+        self.pool.reap()
+        self.assertNotIn(core, self.pool.workers)
+        started = self.scale(queued=0)
+        self.assertEqual(len(started), 1)
+        self.assertNotIn('--max-idle-time', started[0])
+
+    @override_settings(VIDEO_ENCODE_SLOTS=0, VIDEO_ENCODE_CPUS_PER_SLOT=4)
+    def test_encode_pool_bounded_by_encode_slots(self):
+        """
+        Tests that a pool on the encode queue defaults to one worker per encode slot, and
+        other pools to one per usable CPU.
+        """
+        with mock.patch('video_app.scheduling.available_cpus', return_value=8), \
+                mock.patch('video_app.management.commands.rqpool.available_cpus', return_value=8):
+            self.assertEqual(self.pool.default_max_workers(), 2)
+            self.pool.queues = ['mail', 'quick', 'default']
+            self.assertEqual(self.pool.default_max_workers(), 8)
+
+    def test_stop_drains_workers(self):
+        """
+        Tests that a stop signal asks every running worker for a warm shutdown.
+        """
+        self.pool.stopping = mock.Mock()
+        running, exited = mock.Mock(), mock.Mock()
+        running.poll.return_value = None
+        exited.poll.return_value = 0
+        self.pool.workers = {'a': (running, True), 'b': (exited, False)}
+        self.pool.stop(signal.SIGTERM, None)
+        self.pool.stopping.set.assert_called_once()
+        running.send_signal.assert_called_once_with(signal.SIGTERM)
+        exited.send_signal.assert_not_called()
+
+
+class VideoUploadSignalTests(TestCase):
+    def setUp(self):
+        """
+        Point MEDIA_ROOT at a temporary directory so uploaded files can be written.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_transcode_enqueued_once_on_commit(self):
+        """
+        Tests that saving an uploaded video marks it complete and enqueues the transcode
+        exactly once, after the transaction commits. A second save must not enqueue again.
+        """
+        with mock.patch('video_app.signals.enqueue_transcode') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                video = Video(title='Upload', description='Desc', category='Drama')
+                video.file.save('clip.mp4', ContentFile(b'data'), save=False)
+                video.save()
+                enqueue.assert_not_called()
+            enqueue.assert_called_once_with(video.file.path, video.pk, '')
+            with self.captureOnCommitCallbacks(execute=True):
+                video.title = 'Renamed'
+                video.save()
+            enqueue.assert_called_once()
+        video.refresh_from_db()
+        self.assertEqual(video.upload_status, Video.UPLOAD_COMPLETE)
+        self.assertEqual(video.processing_status, Video.PROCESSING_QUEUED)
+
+    def test_probe_and_dedup_left_to_quick_job(self):
+        """
+        Tests that finishing an upload only enqueues the job that probes the source and
+        decides on the ladder, so neither runs in the web process.
+        """
+        with mock.patch('video_app.signals.django_rq.get_queue') as get_queue, \
+                mock.patch('video_app.tasks.probe_source') as probe, \
+                mock.patch('video_app.tasks.find_shared_outputs') as find_shared:
+            enqueue_transcode('/source.mp4', 7, 'c' * 64)
+        get_queue.assert_called_once_with('quick', autocommit=True)
+        get_queue.return_value.enqueue.assert_called_once_with(
+            prepare_video, '/source.mp4', 7, 'c' * 64, job_id=f'prepare-7-{"c" * 16}',
+        )
+        probe.assert_not_called()
+        find_shared.assert_not_called()
+
+    def test_jobs_routed_by_cost(self):
+        """
+        Tests that the thumbnail and the lowest rendition go to the 'quick' queue and the
+        remaining renditions with the trickplay sprites to the 'encode' queue.
+        """
+        video = Video.objects.create(title='Source', description='Desc', category='Drama')
+        queues = {}
+
+        def get_queue(name, **kwargs):
+            return queues.setdefault(name, mock.Mock())
+
+        probe = {
+            'duration': 60.0, 'width': 1920, 'height': 1080, 'frame_rate': 25.0,
+            'video_codec': 'h264', 'audio_codec': 'aac', 'bitrate': 8000000,
+        }
+        with mock.patch('video_app.tasks.django_rq.get_queue', side_effect=get_queue), \
+                mock.patch('video_app.tasks.probe_source', return_value=probe):
+            prepare_video('/source.mp4', video.pk)
+        quick_jobs = [call.args for call in queues['quick'].enqueue.call_args_list]
+        self.assertEqual(quick_jobs, [
+            (generate_thumbnail, '/source.mp4', video.pk),
+            (transcode_video, '/source.mp4', video.pk, ['480p'], False),
+        ])
+        queues['encode'].enqueue.assert_called_once_with(
+            transcode_video, '/source.mp4', video.pk, ['720p', '1080p'], True,
+            job_id=f'transcode-{video.pk}-720p_1080p-missing', on_failure=mock.ANY,
+        )
+        self.assertIs(queues['encode'].enqueue.call_args.kwargs['on_failure'].func, fail_renditions)
+
+    def test_probe_decides_ladder_and_rejects_corrupt_files(self):
+        """
+        Tests that the probe results are stored on the video, that a small source only gets
+        the renditions it fills, and that an unreadable file fails without enqueueing a job.
+        """
+        video = Video.objects.create(title='Clip', description='Desc', category='Drama')
+        probe = {
+            'duration': 12.5, 'width': 640, 'height': 360, 'frame_rate': 29.97,
+            'video_codec': 'h264', 'audio_codec': '', 'bitrate': 900000,
+        }
+        with mock.patch('video_app.tasks.django_rq.get_queue') as get_queue, \
+                mock.patch('video_app.tasks.probe_source', return_value=probe):
+            prepare_video('/clip.mp4', video.pk)
+        video.refresh_from_db()
+        self.assertEqual((video.width, video.height, video.frame_rate), (640, 360, 29.97))
+        self.assertEqual(video.rendition_status, {'480p': Video.PROCESSING_QUEUED})
+        get_queue.assert_called_once_with('quick', autocommit=True)
+        get_queue.return_value.enqueue.assert_called_with(
+            transcode_video, '/clip.mp4', video.pk, ['480p'], True, job_id=f'transcode-{video.pk}-480p-missing',
+            on_failure=mock.ANY,
+        )
+        with mock.patch('video_app.tasks.django_rq.get_queue') as get_queue, \
+                mock.patch('video_app.tasks.probe_source', side_effect=ValueError('moov atom not found')):
+            prepare_video('/broken.mp4', video.pk)
+        get_queue.assert_not_called()
+        video.refresh_from_db()
+        self.assertEqual(video.processing_status, Video.PROCESSING_FAILED)
+        self.assertEqual(video.processing_error, 'moov atom not found')
+
+
+class VideoUploadTests(APITestCase):
+    def setUp(self):
+        """
+        Set up an admin user with a valid access_token cookie and a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def send_chunk(self, url, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum:
+            headers['HTTP_UPLOAD_CHECKSUM'] = f'sha256 {base64.b64encode(checksum).decode()}'
+        return self.client.generic('PATCH', url, chunk, content_type='application/offset+octet-stream', **headers)
+
+    def test_chunked_upload_resumes_and_creates_video(self):
+        """
+        Tests a resumable upload in two chunks.
+        A chunk with a wrong checksum is rejected without moving the offset, a chunk at the wrong
+        offset gets 409, and the Video is created with the assembled file once the last chunk lands.
+        """
+        payload = b'a' * 10 + b'b' * 6
+        response = self.client.post(reverse('video-upload'), {
+            'title': 'Chunked', 'description': 'Desc', 'category': 'Drama',
+            'filename': 'movie.mp4', 'length': len(payload),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = response['Location']
+        response = self.send_chunk(url, 0, payload[:10], checksum=hashlib.sha256(b'wrong').digest())
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '0')
+        response = self.send_chunk(url, 0, payload[:10], checksum=hashlib.sha256(payload[:10]).digest())
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '10')
+        self.assertEqual(self.send_chunk(url, 0, payload[10:]).status_code, status.HTTP_409_CONFLICT)
+        with mock.patch('video_app.signals.enqueue_transcode') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.send_chunk(url, 10, payload[10:])
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            upload = VideoUpload.objects.get()
+            enqueue.assert_called_once_with(upload.video.file.path, upload.video.pk, upload.video.content_hash)
+        with open(upload.video.file.path, 'rb') as uploaded:
+            self.assertEqual(uploaded.read(), payload)
+        self.assertEqual(upload.video.upload_status, Video.UPLOAD_COMPLETE)
+        self.assertEqual(upload.video.content_hash, finish_content_hash(upload.video.file.path, '', 0, len(payload)))
+
+    def test_chunk_in_progress_conflicts_without_locking(self):
+        """
+        Tests that a chunk sent while another chunk of the same upload is being received gets
+        409 at once, and that the upload continues once the other chunk is done.
+        """
+        cache.clear()
+        response = self.client.post(reverse('video-upload'), {
+            'title': 'Chunked', 'description': 'Desc', 'category': 'Drama',
+            'filename': 'movie.mp4', 'length': 8,
+        }, format='json')
+        url = response['Location']
+        upload = VideoUpload.objects.get()
+        cache.add(upload_claim_key(upload.pk), 0)
+        response = self.send_chunk(url, 0, b'abcd')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '0')
+        cache.delete(upload_claim_key(upload.pk))
+        self.assertEqual(self.send_chunk(url, 0, b'abcd').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(cache.get(upload_claim_key(upload.pk)))
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '4')
+
+    def test_content_hash_does_not_depend_on_chunking(self):
+        """
+        Tests that the content hash fed over several chunks, with its state stored and the
+        left-over partial block read back between them, matches the hash of the whole file,
+        and that different content gets a different hash.
+        """
+        path = os.path.join(self.media_root, 'movie.mp4')
+        payload = os.urandom(10000)
+        with open(path, 'wb') as movie:
+            movie.write(payload)
+        with mock.patch('video_app.utils.CONTENT_HASH_BLOCK_SIZE', 1024):
+            state, hashed, start = '', 0, 0
+            for end in (700, 3000, 3001, 10000):
+                hasher = ContentHasher(state, hashed)
+                hasher.resume(path, start)
+                hasher.update(payload[start:end])
+                state, hashed, start = hasher.state, hasher.hashed_length, end
+            self.assertEqual(hashed, 9216)
+            self.assertEqual(hasher.hexdigest(), finish_content_hash(path, '', 0, len(payload)))
+            expected = finish_content_hash(path, '', 0, len(payload))
+            self.assertEqual(finish_content_hash(path, state, hashed, len(payload)), expected)
+            with open(path, 'r+b') as movie:
+                movie.write(b'x')
+            self.assertNotEqual(finish_content_hash(path, '', 0, len(payload)), expected)
+
+
+class VideoAdminUploadTests(TestCase):
+    def setUp(self):
+        """
+        Point MEDIA_ROOT at a temporary directory.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def receive_upload(self, payload):
+        """
+        Parse a multipart form upload of payload with the configured upload handlers.
+        """
+        request = RequestFactory().post('/admin/', {'file': SimpleUploadedFile('movie.mp4', payload)})
+        return request.FILES['file']
+
+    def test_admin_upload_gets_content_hash(self):
+        """
+        Tests that a file uploaded through a form, as the admin does, gets the same content
+        hash as a resumable upload of the same bytes, and keeps it on later saves.
+        """
+        payload = os.urandom(5000)
+        video = Video(title='Admin', description='Desc', category='Drama', file=self.receive_upload(payload))
+        video.save()
+        self.assertEqual(video.content_hash, finish_content_hash(video.file.path, '', 0, len(payload)))
+        Video.objects.filter(pk=video.pk).update(content_hash='b' * 64)
+        video.refresh_from_db()
+        video.save()
+        self.assertEqual(video.content_hash, 'b' * 64)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_admin_upload_hashed_while_received(self):
+        """
+        Tests that an upload streamed to a temporary file is hashed while it is received,
+        so saving the video does not read the file again.
+        """
+        payload = os.urandom(300 * 1024)
+        upload = self.receive_upload(payload)
+        self.assertTrue(hasattr(upload, 'temporary_file_path'))
+        video = Video(title='Admin', description='Desc', category='Drama', file=upload)
+        with mock.patch.object(ContentHasher, 'update') as update:
+            video.save()
+        upload.close()
+        update.assert_not_called()
+        self.assertEqual(video.content_hash, finish_content_hash(video.file.path, '', 0, len(payload)))
+
+
+class VideoDedupTests(TestCase):
+    def setUp(self):
+        """
+        Point MEDIA_ROOT at a temporary directory and create a transcoded video with its outputs on disk.
+        """
+        cache.clear()
+        local_playlists.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.original = Video.objects.create(
+            title='Original', description='Desc', category='Drama', content_hash='a' * 64,
+            processing_status=Video.PROCESSING_DONE, rendition_status={'480p': Video.PROCESSING_DONE},
+            width=854, height=480,
+        )
+        hls_dir = os.path.join(self.media_root, 'uploads', 'videos', 'hls', '480p', str(self.original.id))
+        os.makedirs(hls_dir)
+        with open(os.path.join(hls_dir, 'index.m3u8'), 'w') as manifest:
+            manifest.write('#EXTM3U\n#EXTINF:10.0,\nindex0.ts\n#EXT-X-ENDLIST\n')
+        open(os.path.join(hls_dir, 'index0.ts'), 'wb').close()
+        self.original.m3u8_480p.name = os.path.relpath(os.path.join(hls_dir, 'index.m3u8'), self.media_root)
+        self.original.save()
+        self.hls_dir = hls_dir
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def delete_video(self, video):
+        """
+        Delete a video and run the job that removes its files inline.
+        """
+        with mock.patch('video_app.signals.cancel_video_jobs', return_value=[]), \
+                mock.patch('video_app.signals.django_rq.get_queue') as get_queue, \
+                self.captureOnCommitCallbacks(execute=True):
+            get_queue.return_value.enqueue.side_effect = lambda func, *args: func(*args)
+            video.delete()
+
+    def test_repeat_upload_reuses_outputs_until_last_reference(self):
+        """
+        Tests that a video with the same content hash links the finished outputs instead of
+        enqueueing jobs, and that the shared files survive until the last video is deleted.
+        """
+        copy = Video.objects.create(title='Copy', description='Desc', category='Drama', content_hash='a' * 64)
+        with mock.patch('video_app.tasks.django_rq.get_queue') as get_queue, \
+                mock.patch('video_app.tasks.probe_source') as probe:
+            prepare_video('/copy.mp4', copy.id, copy.content_hash)
+        get_queue.assert_not_called()
+        probe.assert_not_called()
+        copy.refresh_from_db()
+        self.assertEqual(copy.processing_status, Video.PROCESSING_DONE)
+        self.assertEqual((copy.width, copy.shared_outputs_id), (854, self.original.id))
+        self.assertEqual(copy.m3u8_480p.name, f'uploads/videos/hls/480p/{copy.id}/index.m3u8')
+        self.assertIn('index0.ts', get_playlist(copy.id, '480p'))
+        self.delete_video(self.original)
+        self.assertTrue(os.path.isfile(os.path.join(self.hls_dir, 'index0.ts')))
+        self.assertIn('index0.ts', get_playlist(copy.id, '480p'))
+        self.delete_video(copy)
+        self.assertFalse(os.path.exists(self.hls_dir))
+        self.assertFalse(os.path.lexists(os.path.join(os.path.dirname(self.hls_dir), str(copy.id))))
+
+    def test_delete_stops_jobs_and_removes_files_in_background(self):
+        """
+        Tests that deleting a video cancels its jobs and leaves the file removal to a job
+        that is retried, instead of sleeping, until the stopped encodes have exited, and then
+        removes the outputs and partial chunks.
+        """
+        chunk_dir = os.path.join(self.media_root, 'uploads', 'videos', 'chunks', str(self.original.id), '480p')
+        os.makedirs(chunk_dir)
+        video_id = self.original.id
+        with mock.patch('video_app.signals.cancel_video_jobs', return_value=['chunk-1']) as cancel, \
+                mock.patch('video_app.signals.django_rq.get_queue') as get_queue, \
+                mock.patch('video_app.signals.time.time', return_value=1000.0), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.original.delete()
+        cancel.assert_called_once()
+        self.assertEqual(cancel.call_args.args[1], video_id)
+        enqueue = get_queue.return_value.enqueue
+        enqueue.assert_called_once_with(delete_video_files, video_id, '', None, ['chunk-1'], 1060.0)
+        self.assertTrue(os.path.isdir(self.hls_dir))
+        with mock.patch('video_app.tasks.running_jobs', return_value=['chunk-1']) as running, \
+                mock.patch('video_app.tasks.time.time', return_value=1010.0), \
+                mock.patch('video_app.tasks.django_rq.get_connection'):
+            result = delete_video_files(*enqueue.call_args.args[1:])
+        self.assertIsInstance(result, Retry)
+        self.assertEqual(running.call_args.args[1], ['chunk-1'])
+        self.assertTrue(os.path.isdir(self.hls_dir))
+        with mock.patch('video_app.tasks.running_jobs', return_value=[]), \
+                mock.patch('video_app.tasks.time.time', return_value=1020.0), \
+                mock.patch('video_app.tasks.django_rq.get_connection'):
+            self.assertIsNone(delete_video_files(*enqueue.call_args.args[1:]))
+        self.assertFalse(os.path.exists(self.hls_dir))
+        self.assertFalse(os.path.exists(os.path.dirname(chunk_dir)))
+
+    def test_delete_gives_up_waiting_for_stopped_jobs(self):
+        """
+        Tests that the files are removed once the wait for the stopped jobs has run out,
+        even if one of them is still running.
+        """
+        with mock.patch('video_app.tasks.running_jobs', return_value=['chunk-1']) as running:
+            self.assertIsNone(delete_video_files(self.original.id, '', None, ['chunk-1'], time.time() - 1))
+        running.assert_not_called()
+        self.assertFalse(os.path.exists(self.hls_dir))
+
+    def test_cancel_video_jobs(self):
+        """
+        Tests that queued jobs of a video are canceled, started ones are sent a stop command
+        and finished or missing ones are left alone.
+        """
+        connection = mock.Mock()
+        connection.smembers.return_value = [b'queued', b'started', b'finished', b'gone']
+        jobs = {}
+        for job_id, job_status in [('queued', JobStatus.QUEUED), ('started', JobStatus.STARTED), ('finished', JobStatus.FINISHED)]:
+            jobs[job_id] = mock.Mock()
+            jobs[job_id].get_status.return_value = job_status
+
+        def fetch(job_id, connection):
+            if job_id not in jobs:
+                raise NoSuchJobError(job_id)
+            return jobs[job_id]
+
+        with mock.patch('video_app.jobs.Job.fetch', side_effect=fetch), \
+                mock.patch('video_app.jobs.send_stop_job_command') as stop:
+            self.assertEqual(cancel_video_jobs(connection, 7), ['started'])
+        jobs['queued'].cancel.assert_called_once()
+        jobs['started'].cancel.assert_not_called()
+        jobs['finished'].cancel.assert_not_called()
+        stop.assert_called_once_with(connection, 'started')
+        connection.delete.assert_called_once_with(video_jobs_key(7))
+
+    def test_outputs_not_reused_while_original_is_encoding(self):
+        """
+        Tests that a video whose renditions are still encoding is not used as a source of outputs.
+        """
+        Video.objects.filter(pk=self.original.pk).update(
+            rendition_status={'480p': Video.PROCESSING_DONE, '720p': Video.PROCESSING_RUNNING}
+        )
+        self.assertIsNone(find_shared_outputs('a' * 64, self.original.id + 1))
+        self.assertIsNone(find_shared_outputs('', self.original.id + 1))
+
+
+class VideoDeliveryTests(APITestCase):
+    def setUp(self):
+        """
+        Set up a user with a valid access_token cookie and a segment file in a temporary MEDIA_ROOT.
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        cache.clear()
+        local_playlists.clear()
+        self.user = User.objects.create_user(username='viewer', password='viewerpass')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        self.video = Video.objects.create(title='Movie', description='Desc', category='Drama')
+        segment_dir = os.path.join(self.media_root, 'uploads', 'videos', 'hls', '720p', str(self.video.id))
+        os.makedirs(segment_dir)
+        with open(os.path.join(segment_dir, 'index0.ts'), 'wb') as segment:
+            segment.write(b'segment-bytes')
+        with open(os.path.join(segment_dir, 'index.m3u8'), 'w') as manifest:
+            manifest.write('#EXTM3U\n#EXTINF:10.0,\nindex0.ts\n#EXT-X-ENDLIST\n')
+        self.manifest_url = reverse('video-manifest', args=[self.video.id, '720p'])
+        self.segment_url = reverse('video-segment', args=[self.video.id, '720p', 'index0.ts'])
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_segment_streamed_by_django(self):
+        """
+        Tests that the default delivery mode streams the segment through Django.
+        """
+        response = self.client.get(self.segment_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'segment-bytes')
+
+    @override_settings(VIDEO_DELIVERY_MODE='x-accel-redirect', VIDEO_DELIVERY_INTERNAL_PREFIX='/protected-media/')
+    def test_segment_offloaded_to_proxy(self):
+        """
+        Tests that in x-accel-redirect mode the view only returns the internal redirect header
+        and leaves the body to the front proxy.
+        """
+        response = self.client.get(self.segment_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'/protected-media/uploads/videos/hls/720p/{self.video.id}/index0.ts'
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'video/MP2T')
+
+    def test_segment_range_and_revalidation(self):
+        """
+        Tests that a Range request returns 206 with the requested bytes, that the segment carries
+        a long-lived Cache-Control, and that revalidating with its ETag returns 304.
+        """
+        response = self.client.get(self.segment_url, HTTP_RANGE='bytes=8-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'bytes')
+        self.assertEqual(response['Content-Range'], 'bytes 8-12/13')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(self.segment_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.segment_url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_manifest_hands_out_signed_segment_urls(self):
+        """
+        Tests that the rendition playlist rewrites segment URIs into signed URLs which can be
+        fetched without the JWT cookie and without any database query, while a tampered
+        signature is rejected.
+        """
+        response = self.client.get(self.manifest_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        signed_url = [line for line in response.content.decode().splitlines() if not line.startswith('#')][0]
+        self.assertIn('signature=', signed_url)
+        anonymous = APIClient()
+        with self.assertNumQueries(0):
+            response = anonymous.get(signed_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'segment-bytes')
+        response = anonymous.get(signed_url[:-1] + ('0' if signed_url[-1] != '0' else '1'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_playlist_cached_until_video_saved(self):
+        """
+        Tests that a cached playlist is served without database access and that saving the
+        video invalidates it so the next read picks up the new file content.
+        """
+        self.assertIn('index0.ts', get_playlist(self.video.id, '720p'))
+        self.assertIsNone(get_playlist(self.video.id, '1080p'))
+        with self.assertNumQueries(0):
+            self.assertIn('index0.ts', get_playlist(self.video.id, '720p'))
+            self.assertIsNone(get_playlist(self.video.id, '1080p'))
+        manifest_path = os.path.join(self.media_root, 'uploads', 'videos', 'hls', '720p', str(self.video.id), 'index.m3u8')
+        with open(manifest_path, 'w') as manifest:
+            manifest.write('#EXTM3U\n#EXTINF:10.0,\nindex1.ts\n#EXT-X-ENDLIST\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+        self.assertIn('index1.ts', get_playlist(self.video.id, '720p'))
+
+
+class VideoCatalogueTests(APITestCase):
+    def setUp(self):
+        """
+        Set up a user with a valid access_token cookie and a small catalogue in two categories.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='viewerpass')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        for index in range(5):
+            Video.objects.create(
+                title=f'Movie {index}', description='Desc', category='Drama' if index % 2 else 'Action',
+                processing_status=Video.PROCESSING_DONE,
+            )
+        self.list_url = reverse('video-list')
+
+    def test_keyset_pagination_walks_catalogue(self):
+        """
+        Tests that following the 'next' links with limit=2 returns every video exactly once,
+        newest first, and that the last page has no 'next' link.
+        """
+        url = f'{self.list_url}?limit=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.json()), 2)
+            seen += [video['id'] for video in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(seen, list(Video.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_category_filter_and_field_projection(self):
+        """
+        Tests that ?category= restricts the catalogue and ?fields= limits the serialized fields.
+        """
+        response = self.client.get(self.list_url, {'category': 'Drama', 'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(set(response.json()[0]), {'id', 'title'})
+
+    def test_responsive_thumbnail_set(self):
+        """
+        Tests that the catalogue exposes one WebP and one JPEG URL per generated thumbnail width.
+        """
+        video = Video.objects.order_by('-created_at', '-id').first()
+        video.thumbnail_widths = [320, 640]
+        video.save()
+        response = self.client.get(self.list_url, {'limit': 1, 'fields': 'id,thumbnails'})
+        thumbnails = response.json()[0]['thumbnails']
+        self.assertEqual([entry['width'] for entry in thumbnails], [320, 640])
+        self.assertTrue(thumbnails[0]['webp'].endswith(f'/uploads/videos/thumbnails/{video.id}/thumb_320.webp'))
+        self.assertTrue(thumbnails[1]['jpeg'].endswith(f'/uploads/videos/thumbnails/{video.id}/thumb_640.jpg'))
+
+    def test_catalogue_served_from_cache_until_video_changes(self):
+        """
+        Tests that a repeated catalogue request is answered from the cache without touching the
+        database, that the ETag yields 304 and gzip is negotiated, and that saving a video
+        invalidates the cached page once the transaction commits.
+        """
+        response = self.client.get(self.list_url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(title='New', description='Desc', category='Drama', processing_status=Video.PROCESSING_DONE)
+            self.assertEqual(self.client.get(self.list_url)['ETag'], etag)
+        response = self.client.get(self.list_url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['title'], 'New')
+
+    def test_catalogue_hides_videos_that_are_not_playable(self):
+        """
+        Tests that queued, running and failed videos are left out of the catalogue.
+        """
+        for processing_status in (Video.PROCESSING_QUEUED, Video.PROCESSING_RUNNING, Video.PROCESSING_FAILED):
+            Video.objects.create(title='Hidden', description='Desc', category='Drama', processing_status=processing_status)
+        response = self.client.get(self.list_url)
+        self.assertEqual(len(response.json()), 5)
+        self.assertNotIn('Hidden', [video['title'] for video in response.json()])
+
+
+class VideoProcessingStatusTests(APITestCase):
+    def setUp(self):
+        """
+        Set up an admin with a valid access_token cookie, a temporary MEDIA_ROOT and a queued video.
+        """
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass', email='admin@example.com')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+        self.video = Video.objects.create(
+            title='Movie', description='Desc', category='Drama', processing_status=Video.PROCESSING_QUEUED,
+            rendition_status={resolution: Video.PROCESSING_QUEUED for resolution in RENDITIONS},
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_progress_parsed_and_throttled(self):
+        """
+        Tests that ffmpeg progress blocks are turned into percent, fps and speed, that blocks
+        arriving within the interval are dropped, and that the final block is always written.
+        """
+        reporter = ProgressReporter(self.video.id, 20.0, ['720p', '1080p'])
+        reporter({'out_time_us': '5000000', 'fps': '48.0', 'speed': '2.0x', 'progress': 'continue'})
+        self.assertEqual(get_progress(self.video.id)['720p']['percent'], 25.0)
+        reporter({'out_time_us': '10000000', 'fps': '50.0', 'speed': '2.1x', 'progress': 'continue'})
+        progress = get_progress(self.video.id)['1080p']
+        self.assertEqual((progress['percent'], progress['fps'], progress['speed']), (25.0, 48.0, 2.0))
+        reporter({'out_time_us': '19960000', 'fps': '50.0', 'speed': 'N/A', 'progress': 'end'})
+        progress = get_progress(self.video.id)['720p']
+        self.assertEqual((progress['percent'], progress['speed']), (100.0, None))
+        self.assertNotIn('480p', get_progress(self.video.id))
+
+    def test_failed_transcode_recorded(self):
+        """
+        Tests that a non-zero ffmpeg exit code marks every rendition as failed, keeps the
+        error output and is reported by the status endpoint.
+        """
+        with mock.patch('video_app.tasks.run_ffmpeg', return_value=(1, 'Invalid data found')), \
+                mock.patch('video_app.tasks.encode_slot', side_effect=lambda **kwargs: nullcontext(2)), \
+                mock.patch('video_app.tasks.probe_duration', return_value=10.0):
+            transcode_video('/missing.mp4', self.video.id)
+        response = self.client.get(reverse('video-status', args=[self.video.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['processing_status'], Video.PROCESSING_FAILED)
+        self.assertEqual(set(response.json()['rendition_status'].values()), {Video.PROCESSING_FAILED})
+        self.assertEqual(response.json()['processing_error'], 'Invalid data found')
+        self.assertFalse(Video.objects.get(pk=self.video.id).m3u8_master)
+
+    def test_split_renditions_merge_into_one_master(self):
+        """
+        Tests that the quick and the heavy transcode jobs each merge their renditions into
+        the row, and that the video is listed as done once the first rendition is playable.
+        """
+        def fake_ffmpeg(cmd, on_progress):
+            for argument in cmd:
+                if argument.endswith('index.m3u8'):
+                    with open(argument, 'w') as playlist:
+                        playlist.write('#EXTM3U\n#EXTINF:10.0,\nindex0.ts\n#EXT-X-ENDLIST\n')
+            return 0, ''
+
+        with mock.patch('video_app.tasks.run_ffmpeg', side_effect=fake_ffmpeg), \
+                mock.patch('video_app.tasks.encode_slot', side_effect=lambda **kwargs: nullcontext(2)), \
+                mock.patch('video_app.tasks.probe_duration', return_value=10.0):
+            transcode_video('/source.mp4', self.video.id, ['480p'], False)
+            self.video.refresh_from_db()
+            self.assertEqual(self.video.processing_status, Video.PROCESSING_DONE)
+            self.assertEqual(self.video.rendition_status['480p'], Video.PROCESSING_DONE)
+            self.assertEqual(self.video.rendition_status['1080p'], Video.PROCESSING_QUEUED)
+            transcode_video('/source.mp4', self.video.id, ['720p', '1080p'], False)
+        self.video.refresh_from_db()
+        self.assertEqual(set(self.video.rendition_status.values()), {Video.PROCESSING_DONE})
+        with open(self.video.m3u8_master.path) as master:
+            self.assertEqual(master.read().count('#EXT-X-STREAM-INF'), 3)
+        response = self.client.get(reverse('video-status', args=[self.video.id]))
+        self.assertEqual(response.json()['progress']['720p']['percent'], 100.0)
+
+    @override_settings(VIDEO_ENCODE_SLOT_POLL=5)
+    def test_encode_retried_without_free_slot(self):
+        """
+        Tests that an encode without a free slot returns a retry before it touches the video,
+        that the quick rendition only takes its reserved slot and is retried while that is
+        held, and that it is encoded once the slot is free.
+        """
+        slots = []
+        quick_free = []
+
+        def no_slot(quick=False):
+            slots.append(quick)
+            return nullcontext(2 if quick and quick_free else None)
+
+        with mock.patch('video_app.tasks.encode_slot', side_effect=no_slot), \
+                mock.patch('video_app.tasks.run_ffmpeg', return_value=(0, '')) as ffmpeg, \
+                mock.patch('video_app.tasks.probe_duration', return_value=10.0):
+            retry = transcode_video('/source.mp4', self.video.id, ['720p', '1080p'], False)
+            self.assertIsInstance(retry, Retry)
+            self.assertEqual(retry.intervals, [5])
+            ffmpeg.assert_not_called()
+            self.video.refresh_from_db()
+            self.assertEqual(self.video.rendition_status['1080p'], Video.PROCESSING_QUEUED)
+            self.assertIsInstance(transcode_video('/source.mp4', self.video.id, ['480p'], False), Retry)
+            ffmpeg.assert_not_called()
+            quick_free.append(True)
+            self.assertIsNone(transcode_video('/source.mp4', self.video.id, ['480p'], False))
+        self.assertEqual(slots, [False, True, True])
+        ffmpeg.assert_called_once()
+
+    def test_small_source_records_real_thumbnail_widths(self):
+        """
+        Tests that the thumbnails of a source narrower than the larger sizes are recorded with
+        their real widths, and the default thumbnail is the widest one up to the default width.
+        """
+        Video.objects.filter(pk=self.video.pk).update(width=500, height=280)
+        thumb_dir = os.path.join(self.media_root, 'uploads', 'videos', 'thumbnails', str(self.video.id))
+        os.makedirs(thumb_dir)
+        open(os.path.join(thumb_dir, 'thumb_1280.jpg'), 'wb').close()
+
+        def fake_ffmpeg(cmd, capture_output):
+            for argument in cmd:
+                if argument.endswith(('.webp', '.jpg')):
+                    open(argument, 'wb').close()
+            return subprocess.CompletedProcess(cmd, 0, b'', b'')
+
+        with mock.patch('video_app.tasks.subprocess.run', side_effect=fake_ffmpeg) as run, \
+                mock.patch('video_app.thumbnails.select_thumbnail_time', return_value=1.0):
+            generate_thumbnail('/source.mp4', self.video.id)
+        self.assertEqual(run.call_count, 1)
+        self.assertNotIn('thumb_1280.jpg', os.listdir(thumb_dir))
+        outputs = [argument for argument in run.call_args.args[0] if argument.endswith(('.webp', '.jpg'))]
+        self.assertEqual([os.path.basename(output) for output in outputs], [
+            'thumb_320.webp', 'thumb_320.jpg', 'thumb_500.webp', 'thumb_500.jpg',
+        ])
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail_widths, [320, 500])
+        self.assertTrue(self.video.thumbnail.name.endswith('thumb_500.jpg'))
+
+    def test_failed_thumbnail_render_retried_then_raises(self):
+        """
+        Tests that a render whose ffmpeg fails, even after writing some of the files, is
+        retried at the start of the video, and that the job fails if that fails too.
+        """
+        Video.objects.filter(pk=self.video.pk).update(width=500, height=280)
+
+        def broken_ffmpeg(cmd, capture_output):
+            outputs = [argument for argument in cmd if argument.endswith(('.webp', '.jpg'))]
+            open(outputs[0], 'wb').close()
+            return subprocess.CompletedProcess(cmd, 1, b'', b'Conversion failed!')
+
+        with mock.patch('video_app.tasks.subprocess.run', side_effect=broken_ffmpeg) as run, \
+                mock.patch('video_app.thumbnails.select_thumbnail_time', return_value=1.0), \
+                self.assertRaisesMessage(RuntimeError, 'Conversion failed!'):
+            generate_thumbnail('/source.mp4', self.video.id)
+        self.assertEqual(run.call_count, 2)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail_widths, [])
+        self.assertFalse(self.video.thumbnail)
+
+    def test_dead_transcode_marks_renditions_failed(self):
+        """
+        Tests that a transcode job killed before it stored its outcome marks its unfinished
+        renditions as failed.
+        """
+        Video.objects.filter(pk=self.video.pk).update(rendition_status={
+            '480p': Video.PROCESSING_DONE, '720p': Video.PROCESSING_RUNNING, '1080p': Video.PROCESSING_QUEUED,
+        })
+        job = mock.Mock(args=['/source.mp4', self.video.id, ['480p', '720p', '1080p'], True])
+        fail_renditions(job, None, JobTimeoutException, JobTimeoutException('Task exceeded maximum timeout value'), None)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.rendition_status, {
+            '480p': Video.PROCESSING_DONE, '720p': Video.PROCESSING_FAILED, '1080p': Video.PROCESSING_FAILED,
+        })
+        self.assertEqual(self.video.processing_status, Video.PROCESSING_DONE)
+        self.assertIn('JobTimeoutException', self.video.processing_error)
+
+    def test_status_requires_admin(self):
+        """
+        Tests that the status endpoint is only available to admins.
+        """
+        user = User.objects.create_user(username='viewer', password='viewerpass')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(user).access_token)
+        response = self.client.get(reverse('video-status', args=[self.video.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
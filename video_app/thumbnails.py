@@ -0,0 +1,110 @@
+import re
+import subprocess
+import numpy as np
+from .probe import probe_duration
+from .utils import THUMBNAIL_SAMPLE_COUNT, THUMBNAIL_SAMPLE_SIZE, THUMBNAIL_SEEK_SECONDS
+
+PTS_TIME_RE = re.compile(r'pts_time:\s*([\d.]+)')
+MIN_MEAN_LUMA = 24
+MAX_MEAN_LUMA = 232
+DUPLICATE_THRESHOLD = 2.0
+
+
+def build_sample_command(source, interval, count):
+    """
+    Build an ffmpeg command that samples evenly spaced keyframes as small grayscale images.
+
+    Only keyframes are decoded, at most one every interval seconds, and each one is
+    scaled to THUMBNAIL_SAMPLE_SIZE and written as raw 8-bit luma to stdout. The
+    showinfo filter reports the timestamp of every sampled frame on stderr.
+
+    Args:
+        source (str): The path to the video file.
+        interval (float): The minimum distance between two samples in seconds.
+        count (int): The maximum number of samples.
+
+    Returns:
+        list: The ffmpeg argument list.
+    """
+    width, height = THUMBNAIL_SAMPLE_SIZE
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.3f})'"
+    return [
+        'ffmpeg', '-v', 'info', '-skip_frame', 'nokey', '-i', source, '-an',
+        '-vf', f'{select},scale={width}:{height},format=gray,showinfo',
+        '-fps_mode', 'vfr', '-frames:v', str(count), '-f', 'rawvideo', '-',
+    ]
+
+
+def sample_frames(source, duration, count=THUMBNAIL_SAMPLE_COUNT):
+    """
+    Decode up to count low-resolution frames spread across the video in one pass.
+
+    Args:
+        source (str): The path to the video file.
+        duration (float): The duration of the video in seconds.
+        count (int): The number of frames to sample.
+
+    Returns:
+        tuple: An (N, height, width) uint8 array of luma frames and a list of their timestamps.
+    """
+    width, height = THUMBNAIL_SAMPLE_SIZE
+    interval = max(duration / (count + 1), 0.1)
+    result = subprocess.run(build_sample_command(source, interval, count), capture_output=True)
+    timestamps = [float(match) for match in PTS_TIME_RE.findall(result.stderr.decode(errors='ignore'))]
+    frame_count = min(len(result.stdout) // (width * height), len(timestamps))
+    frames = np.frombuffer(result.stdout, dtype=np.uint8, count=frame_count * width * height)
+    return frames.reshape(frame_count, height, width), timestamps[:frame_count]
+
+
+def score_frames(frames):
+    """
+    Score candidate thumbnail frames.
+
+    All measures are computed on the whole batch at once: mean luma (how close the
+    frame is to mid-gray), contrast (luma standard deviation) and edge energy (mean
+    absolute gradient). Frames that are nearly black or white, and frames that are
+    near-duplicates of the frame sampled before them, are ruled out.
+
+    Args:
+        frames (numpy.ndarray): An (N, height, width) array of luma frames.
+
+    Returns:
+        numpy.ndarray: One score per frame; -inf marks rejected frames.
+    """
+    frames = frames.astype(np.float32)
+    mean = frames.mean(axis=(1, 2))
+    contrast = frames.std(axis=(1, 2))
+    edges = (
+        np.abs(np.diff(frames, axis=1)).mean(axis=(1, 2))
+        + np.abs(np.diff(frames, axis=2)).mean(axis=(1, 2))
+    )
+    exposure = 1.0 - np.abs(mean - 128.0) / 128.0
+    scores = exposure + contrast / 64.0 + edges / 32.0
+    scores[(mean < MIN_MEAN_LUMA) | (mean > MAX_MEAN_LUMA)] = -np.inf
+    if len(frames) > 1:
+        change = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))
+        scores[1:][change < DUPLICATE_THRESHOLD] = -np.inf
+    return scores
+
+
+def select_thumbnail_time(source):
+    """
+    Pick the timestamp of the best-looking keyframe for the thumbnail.
+
+    Args:
+        source (str): The path to the video file.
+
+    Returns:
+        float: The timestamp in seconds; THUMBNAIL_SEEK_SECONDS if no frame qualifies.
+    """
+    duration = probe_duration(source)
+    if not duration:
+        return THUMBNAIL_SEEK_SECONDS
+    frames, timestamps = sample_frames(source, duration)
+    if not len(frames):
+        return THUMBNAIL_SEEK_SECONDS
+    scores = score_frames(frames)
+    best = int(np.argmax(scores))
+    if not np.isfinite(scores[best]):
+        return THUMBNAIL_SEEK_SECONDS
+    return timestamps[best]
@@ -0,0 +1,49 @@
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from .utils import ContentHasher
+
+
+class ContentHashMixin:
+    """
+    Compute the content hash of an uploaded file while its bytes stream in.
+
+    The finished file gets a content_hash attribute, so saving a Video with it, as the
+    admin does, reuses the finished outputs of a video with the same content without
+    reading the file back in the request.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.content_hasher = ContentHasher()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.hashes_file():
+            self.content_hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.content_hasher.hexdigest()
+        return file
+
+    def hashes_file(self):
+        """
+        Returns:
+            bool: Whether this handler keeps the file, and so has to hash it.
+        """
+        return True
+
+
+class ContentHashMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    """
+    Keep small uploads in memory, like MemoryFileUploadHandler, and hash them.
+    """
+
+    def hashes_file(self):
+        return self.activated
+
+
+class ContentHashTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    """
+    Stream large uploads to a temporary file, like TemporaryFileUploadHandler, and hash them.
+    """
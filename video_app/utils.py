@@ -1,3 +1,8 @@
+import hashlib
+import os
+from django.conf import settings
+
+
 def hls_480p_upload_to(instance, filename):
     """
     Uploads a HLS 480p video file.
@@ -49,3 +54,367 @@ def thumbnail_upload_to(instance, filename):
         str: The path for the uploaded thumbnail image.
     """
     return f'uploads/videos/thumbnails/{instance.id}/{filename}'
+
+
+def hls_master_upload_to(instance, filename):
+    """
+    Uploads the HLS master playlist of a video.
+
+    Args:
+        instance (Video): The video instance.
+        filename (str): The name of the file being uploaded.
+
+    Returns:
+        str: The path for the uploaded master playlist.
+    """
+    return f'uploads/videos/hls/master/{instance.id}/{filename}'
+
+
+RENDITIONS = {
+    '480p': {'width': 854, 'height': 480, 'bitrate': 1400, 'maxrate': 1500,
+             'profile': 'baseline', 'level': '3.0', 'codecs': 'avc1.42e01e'},
+    '720p': {'width': 1280, 'height': 720, 'bitrate': 2800, 'maxrate': 3000,
+             'profile': 'main', 'level': '3.1', 'codecs': 'avc1.4d401f'},
+    '1080p': {'width': 1920, 'height': 1080, 'bitrate': 5000, 'maxrate': 5350,
+              'profile': 'high', 'level': '4.0', 'codecs': 'avc1.640028'},
+}
+QUICK_RENDITIONS = ['480p']
+AUDIO_BITRATE = 128
+AUDIO_CODECS = 'mp4a.40.2'
+HLS_SEGMENT_SECONDS = 10
+KEYFRAME_INTERVAL_SECONDS = 2
+
+THUMBNAIL_WIDTHS = [320, 640, 1280]
+THUMBNAIL_FORMATS = ['webp', 'jpg']
+THUMBNAIL_DEFAULT_WIDTH = 640
+THUMBNAIL_SEEK_SECONDS = 1
+THUMBNAIL_SAMPLE_COUNT = 24
+THUMBNAIL_SAMPLE_SIZE = (160, 90)
+
+TRICKPLAY_INTERVAL_SECONDS = 10
+TRICKPLAY_TILE_WIDTH = 160
+TRICKPLAY_COLUMNS = 10
+TRICKPLAY_ROWS = 10
+
+
+def rendition_box(resolution, width, height):
+    """
+    Returns the bounding box of a rendition, turned upright for portrait sources.
+
+    Args:
+        resolution (str): The name of the rendition, e.g. '720p'.
+        width (int): The display width of the source.
+        height (int): The display height of the source.
+
+    Returns:
+        tuple: The (width, height) of the box.
+    """
+    rendition = RENDITIONS[resolution]
+    if height > width:
+        return rendition['height'], rendition['width']
+    return rendition['width'], rendition['height']
+
+
+def rendition_size(resolution, width=None, height=None):
+    """
+    Returns the frame size of a rendition for a source: the source scaled down to fit
+    the rendition's box with its aspect ratio kept, never scaled up.
+
+    Args:
+        resolution (str): The name of the rendition, e.g. '720p'.
+        width (int, optional): The display width of the source.
+        height (int, optional): The display height of the source.
+
+    Returns:
+        tuple: The (width, height) in even pixels; the nominal size if the source size is unknown.
+    """
+    if not width or not height:
+        return RENDITIONS[resolution]['width'], RENDITIONS[resolution]['height']
+    box_width, box_height = rendition_box(resolution, width, height)
+    scale = min(box_width / width, box_height / height, 1)
+    return max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2)
+
+
+def scaled_rendition(resolution, width=None, height=None):
+    """
+    Returns the encoding settings of a rendition with the frame size fitted to a source.
+
+    Args:
+        resolution (str): The name of the rendition, e.g. '720p'.
+        width (int, optional): The display width of the source.
+        height (int, optional): The display height of the source.
+
+    Returns:
+        dict: A copy of the rendition settings.
+    """
+    scaled_width, scaled_height = rendition_size(resolution, width, height)
+    return {**RENDITIONS[resolution], 'width': scaled_width, 'height': scaled_height}
+
+
+def build_ladder(width=None, height=None):
+    """
+    Returns the renditions worth encoding for a source: every rendition the source
+    fills in at least one dimension. A source smaller than every box still gets the
+    lowest rendition, at its own size.
+
+    Args:
+        width (int, optional): The display width of the source.
+        height (int, optional): The display height of the source.
+
+    Returns:
+        list: The names of the renditions, lowest first.
+    """
+    if not width or not height:
+        return list(RENDITIONS)
+    ladder = []
+    for resolution in RENDITIONS:
+        box_width, box_height = rendition_box(resolution, width, height)
+        if width >= box_width or height >= box_height:
+            ladder.append(resolution)
+    return ladder or list(RENDITIONS)[:1]
+
+
+def hls_target_dir(resolution, video_id):
+    """
+    Returns the directory holding the HLS playlist and segments of a rendition.
+
+    Args:
+        resolution (str): The rendition name, e.g. '720p'.
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The absolute path of the rendition directory.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', resolution, str(video_id))
+
+
+def trickplay_upload_to(instance, filename):
+    """
+    Uploads the trickplay WebVTT index of a video.
+
+    Args:
+        instance (Video): The video instance.
+        filename (str): The name of the file being uploaded.
+
+    Returns:
+        str: The path for the uploaded WebVTT index.
+    """
+    return f'uploads/videos/trickplay/{instance.id}/{filename}'
+
+
+def trickplay_target_dir(video_id):
+    """
+    Returns the directory holding the trickplay sprite sheets and WebVTT index of a video.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The absolute path of the trickplay directory.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'trickplay', str(video_id))
+
+
+def chunk_target_dir(video_id):
+    """
+    Returns the working directory of a chunked transcode: the source chunks and the
+    encoded chunks waiting to be stitched.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The absolute path of the chunk directory.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'chunks', str(video_id))
+
+
+def hls_master_dir(video_id):
+    """
+    Returns the directory holding the HLS master playlist of a video.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The absolute path of the master playlist directory.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'hls', 'master', str(video_id))
+
+
+def thumbnail_target_dir(video_id):
+    """
+    Returns the directory holding the thumbnails of a video.
+
+    Args:
+        video_id (int): The ID of the video.
+
+    Returns:
+        str: The absolute path of the thumbnail directory.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos', 'thumbnails', str(video_id))
+
+
+def thumbnail_variant_name(width, extension):
+    """
+    Returns the file name of one thumbnail size and format.
+
+    Args:
+        width (int): The thumbnail width in pixels.
+        extension (str): The image format extension, 'webp' or 'jpg'.
+
+    Returns:
+        str: The file name inside the thumbnail directory of the video.
+    """
+    return f'thumb_{width}.{extension}'
+
+
+def thumbnail_widths_for(width=None):
+    """
+    Returns the thumbnail widths worth rendering for a source. Thumbnails are never
+    scaled up, so sizes wider than the source are rendered at the source width, once.
+
+    Args:
+        width (int, optional): The display width of the source; unknown widths get every size.
+
+    Returns:
+        list: The real widths of the thumbnails in pixels, ascending and without duplicates.
+    """
+    widths = []
+    for nominal in THUMBNAIL_WIDTHS:
+        actual = min(nominal, width) if width else nominal
+        if actual not in widths:
+            widths.append(actual)
+    return widths
+
+
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+def write_chunk(path, offset, stream, length, hashers=()):
+    """
+    Stream a chunk from the request body into a file at the given offset.
+
+    Args:
+        path (str): The path of the file being uploaded.
+        offset (int): The byte offset the chunk starts at.
+        stream (file): The readable request body.
+        length (int): The announced length of the chunk.
+        hashers (list, optional): Hash objects updated with every byte written.
+
+    Returns:
+        int: The number of bytes written, which is less than length if the
+            client disconnected mid-chunk.
+    """
+    written = 0
+    with open(path, 'r+b') as target:
+        target.seek(offset)
+        while written < length:
+            block = stream.read(min(UPLOAD_READ_SIZE, length - written))
+            if not block:
+                break
+            target.write(block)
+            for hasher in hashers:
+                hasher.update(block)
+            written += len(block)
+    return written
+
+
+CONTENT_HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+class ContentHasher:
+    """
+    Incremental content hash of an upload.
+
+    The content hash chains fixed-size blocks, so it only depends on the bytes of the
+    file and not on how the client cut it into chunks, and its state is a single
+    digest that can be stored between requests. The bytes are fed in as they are
+    written; only the partial block a previous chunk left over is read back.
+
+    Args:
+        state (str, optional): The hex digest of the blocks hashed so far, or '' at the start.
+        hashed_length (int, optional): The number of bytes covered by state.
+    """
+
+    def __init__(self, state='', hashed_length=0):
+        self.digest = bytes.fromhex(state)
+        self.hashed_length = hashed_length
+        self.block = hashlib.sha256(self.digest)
+        self.block_length = 0
+
+    @property
+    def state(self):
+        """
+        str: The hex digest of the complete blocks hashed so far.
+        """
+        return self.digest.hex()
+
+    def resume(self, path, end):
+        """
+        Read back the bytes of the file between the complete blocks and end, i.e. the
+        partial block left over by earlier chunks.
+
+        Args:
+            path (str): The path of the file being uploaded.
+            end (int): The number of bytes received so far.
+        """
+        with open(path, 'rb') as source:
+            source.seek(self.hashed_length + self.block_length)
+            remaining = end - self.hashed_length - self.block_length
+            while remaining > 0:
+                data = source.read(min(UPLOAD_READ_SIZE, remaining))
+                if not data:
+                    break
+                self.update(data)
+                remaining -= len(data)
+
+    def update(self, data):
+        """
+        Hash the next bytes of the file.
+
+        Args:
+            data (bytes): The bytes following those hashed so far.
+        """
+        data = memoryview(data)
+        while data:
+            part = data[:CONTENT_HASH_BLOCK_SIZE - self.block_length]
+            self.block.update(part)
+            self.block_length += len(part)
+            data = data[len(part):]
+            if self.block_length == CONTENT_HASH_BLOCK_SIZE:
+                self.digest = self.block.digest()
+                self.hashed_length += CONTENT_HASH_BLOCK_SIZE
+                self.block = hashlib.sha256(self.digest)
+                self.block_length = 0
+
+    def hexdigest(self):
+        """
+        Complete the content hash with the last, partial block and the length of the
+        file, once every byte has been hashed.
+
+        Returns:
+            str: The hex content hash.
+        """
+        hasher = self.block.copy()
+        hasher.update(str(self.hashed_length + self.block_length).encode())
+        return hasher.hexdigest()
+
+
+def finish_content_hash(path, state, hashed_length, length):
+    """
+    Complete the content hash of a fully received file from a stored state by reading
+    the rest of it.
+
+    Args:
+        path (str): The path of the uploaded file.
+        state (str): The hex digest of the blocks hashed so far.
+        hashed_length (int): The number of bytes covered by state.
+        length (int): The size of the file.
+
+    Returns:
+        str: The hex content hash.
+    """
+    hasher = ContentHasher(state, hashed_length)
+    hasher.resume(path, length)
+    return hasher.hexdigest()